@@ -0,0 +1,110 @@
+"""
+Microbenchmark for the streaming filters in dacdaq.processing.filters.
+
+Times every filter per sample (one process() call per value, as the old
+acquisition loop did) and per block (process_block() on whole arrays),
+and compares both against the MovingAverageFilter baseline. Before timing,
+checks that both paths give the same output, on data with a few NaN
+samples mixed in as a failed instrument read would give.
+
+Run from the repository root:
+    python -m benchmarks.bench_filters [--samples N] [--block N]
+"""
+import argparse
+import time
+import numpy as np
+from dacdaq.processing.filters import (
+    BiquadFilter, ExponentialMovingAverageFilter, FIRFilter, MovingAverageFilter,
+    RunningMedianFilter, SavitzkyGolayFilter, SosFilter
+)
+
+class LegacyMovingAverage:
+    """The original MovingAverageFilter: np.mean over the window per sample."""
+    def __init__(self, window_size):
+        self.buffer = np.zeros(window_size)
+        self.pointer = 0
+
+    def process(self, new_value):
+        self.buffer[self.pointer] = new_value
+        self.pointer = (self.pointer + 1) % len(self.buffer)
+        return np.mean(self.buffer)
+
+    def process_block(self, values):
+        return np.array([self.process(v) for v in values])
+
+
+FILTERS = {
+    "moving_average(10)": lambda: MovingAverageFilter(10),
+    "moving_average(1000)": lambda: MovingAverageFilter(1000),
+    "legacy np.mean(1000)": lambda: LegacyMovingAverage(1000),
+    "ema(span=20)": lambda: ExponentialMovingAverageFilter(span=20),
+    "median(9)": lambda: RunningMedianFilter(9),
+    "median(101)": lambda: RunningMedianFilter(101),
+    "savgol(11, 2)": lambda: SavitzkyGolayFilter(11, 2),
+    "fir(31 taps)": lambda: FIRFilter(np.hanning(31) / np.hanning(31).sum()),
+    "lowpass biquad": lambda: BiquadFilter.lowpass(10.0, 1000.0),
+    "notch biquad": lambda: BiquadFilter.notch(60.0, 1000.0),
+    "sos (2 sections)": lambda: SosFilter([[1, 2, 1, 1, -1.5, 0.6], [1, 0, -1, 1, -0.2, 0.1]]),
+}
+
+
+def block_matches_process(make_filter, data, block_size):
+    """True if process_block() gives the same output as process() on data."""
+    f = make_filter()
+    per_sample = np.array([f.process(value) for value in data])
+    f = make_filter()
+    per_block = np.concatenate([
+        f.process_block(data[i:i + block_size]) for i in range(0, len(data), block_size)
+    ])
+    return np.allclose(per_sample, per_block, equal_nan=True)
+
+
+def time_per_sample(make_filter, data):
+    f = make_filter()
+    start = time.perf_counter()
+    for value in data:
+        f.process(value)
+    return (time.perf_counter() - start) / len(data)
+
+
+def time_per_block(make_filter, data, block_size):
+    f = make_filter()
+    start = time.perf_counter()
+    for i in range(0, len(data), block_size):
+        f.process_block(data[i:i + block_size])
+    return (time.perf_counter() - start) / len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", type=int, default=20_000,
+                        help="samples fed through each filter (default 20000)")
+    parser.add_argument("--block", type=int, default=1000,
+                        help="block size for process_block (default 1000)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    data = rng.normal(10.0, 0.2, args.samples)
+    with_nans = data.copy()
+    with_nans[rng.integers(0, args.samples, 3)] = np.nan
+
+    baseline = None
+    mismatches = []
+    print(f"{'filter':<22}{'process() us/sample':>22}{'block us/sample':>18}"
+          f"{'vs MA(10) per-sample':>22}{'paths agree':>13}")
+    for name, make_filter in FILTERS.items():
+        agree = block_matches_process(make_filter, with_nans, args.block)
+        if not agree:
+            mismatches.append(name)
+        per_sample = time_per_sample(make_filter, data)
+        per_block = time_per_block(make_filter, data, args.block)
+        if baseline is None:
+            baseline = per_sample
+        print(f"{name:<22}{per_sample * 1e6:>22.2f}{per_block * 1e6:>18.3f}"
+              f"{per_sample / baseline:>21.1f}x{'yes' if agree else 'NO':>13}")
+    if mismatches:
+        raise SystemExit(f"process() and process_block() disagree for: {', '.join(mismatches)}")
+
+
+if __name__ == "__main__":
+    main()
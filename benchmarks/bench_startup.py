@@ -0,0 +1,72 @@
+"""
+Startup-time benchmark: headless pipeline, GUI stack and config dialog.
+
+Each target is run in a fresh interpreter several times and the median
+time is reported, together with whether PyQt6 and any instrument driver
+(with its VISA stack) ended up imported. Opening the config dialog should
+list every instrument without importing a single driver. Use `python -X importtime -c "import dacdaq.cli"` to see where
+the remaining time goes.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--repeat N]
+"""
+import argparse
+import statistics
+import os
+import subprocess
+import sys
+
+TARGETS = {
+    "headless (dacdaq.cli + pipeline)": "import dacdaq.cli, dacdaq.core.pipeline",
+    "GUI (dacdaq.ui.app)": "import dacdaq.ui.app",
+    "config dialog (import + show)": (
+        "from PyQt6.QtWidgets import QApplication\n"
+        "app = QApplication([])\n"
+        "from dacdaq.ui.config_dialog import ConfigDialog\n"
+        "ConfigDialog().show()\n"
+        "app.processEvents()"
+    ),
+}
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "{statement}\n"
+    "drivers = [m for m in ('dacdaq.inputs.simulated', 'dacdaq.inputs.keithley2000', 'pyvisa')\n"
+    "           if m in sys.modules]\n"
+    "print(time.perf_counter() - start, 'PyQt6' in sys.modules, ','.join(drivers) or '-')\n"
+)
+
+
+def measure(statement, repeat):
+    times = []
+    qt_loaded = False
+    drivers = "-"
+    # The dialog target needs a Qt platform even on a headless machine
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(statement=statement)],
+            capture_output=True, text=True, check=True, env=env
+        )
+        seconds, qt, drivers = result.stdout.split()[-3:]
+        times.append(float(seconds))
+        qt_loaded = qt == "True"
+    return statistics.median(times), qt_loaded, drivers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="fresh interpreters per target (default 5)")
+    args = parser.parse_args()
+
+    print(f"{'target':<36}{'median time (ms)':>18}{'Qt loaded':>12}  drivers imported")
+    for name, statement in TARGETS.items():
+        seconds, qt_loaded, drivers = measure(statement, args.repeat)
+        print(f"{name:<36}{seconds * 1000:>18.1f}{str(qt_loaded):>12}  {drivers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark suite: throughput, latency and memory growth of the
+acquisition pipeline, every filter, the sinks and the plot update path.
+
+Everything is driven by the SyntheticInstrument, so runs are repeatable
+and not limited by hardware. Results are written to a JSON file (one per
+version, say) and can be compared against an earlier one:
+
+    python -m benchmarks.bench_suite --output bench-new.json --compare bench-old.json
+
+Sections:
+  pipeline  AcquisitionPipeline (the loop AcquisitionWorker runs) flat out
+            for throughput, then paced in real time for per-sample latency
+            (sample timestamp to plot buffer) and memory growth
+  filters   process_block() per block and process() per sample
+  sinks     CsvSink/BinarySink/CompressedSink write_block() throughput and
+            bytes per sample, and EventSink write_event()
+  plot      ring buffer -> history -> min/max decimation, and the real
+            window's refresh_plots() when PyQt6 is available
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--sections pipeline,filters] [--duration S]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+from benchmarks.bench_filters import FILTERS
+from dacdaq.core.pipeline import AcquisitionPipeline
+from dacdaq.core.history import HistoryStore
+from dacdaq.core.ring_buffer import SampleRingBuffer
+from dacdaq.inputs.synthetic import SyntheticInstrument
+from dacdaq.outputs.binary_sink import BinarySink
+from dacdaq.outputs.compressed_sink import CompressedSink
+from dacdaq.outputs.csv_sink import CsvSink
+from dacdaq.outputs.event_sink import EventSink
+from dacdaq.processing.decimation import minmax_indices
+
+SECTIONS = ("pipeline", "filters", "sinks", "plot")
+
+
+def percentiles(seconds):
+    """p50/p95/p99/max of a list of durations, in microseconds."""
+    if len(seconds) == 0:
+        return {}
+    us = np.asarray(seconds) * 1e6
+    p50, p95, p99 = np.percentile(us, [50, 95, 99])
+    return {"p50_us": p50, "p95_us": p95, "p99_us": p99, "max_us": us.max()}
+
+
+def timed_calls(call, items):
+    """Runs call(item) for each item; returns (total seconds, per-call seconds)."""
+    durations = np.empty(len(items))
+    clock = time.perf_counter
+    for i, item in enumerate(items):
+        start = clock()
+        call(item)
+        durations[i] = clock() - start
+    return durations.sum(), durations
+
+
+def memory_growth(run):
+    """Runs run() twice under tracemalloc; returns bytes still held after the second."""
+    run() # Warm-up: caches, lazily built state
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    run()
+    growth = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return int(growth)
+
+
+class LatencyProbe(SampleRingBuffer):
+    """A plot buffer that records how old each sample is when it arrives."""
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.latencies = []
+
+    def write(self, timestamps, raw, filtered):
+        now = time.time_ns()
+        self.latencies.append((now - np.asarray(timestamps)) / 1e9)
+        super().write(timestamps, raw, filtered)
+
+
+def run_pipeline(instrument_settings, duration, output_dir, plot_buffer=None, on_running=None):
+    config = {
+        "instrument_name": SyntheticInstrument.NAME,
+        "instrument_settings": instrument_settings,
+        "output_file": os.path.join(output_dir, "pipeline.csv"),
+        "comments": "benchmark",
+    }
+    pipeline = AcquisitionPipeline(SyntheticInstrument, config, plot_buffer=plot_buffer)
+    thread = threading.Thread(target=pipeline.run)
+    thread.start()
+    if on_running:
+        on_running(pipeline)
+    time.sleep(duration)
+    pipeline.stop()
+    thread.join()
+    return pipeline.get_stats()
+
+
+def bench_pipeline(args, output_dir):
+    results = {}
+    for block_size in (1, 100, 1000):
+        stats = run_pipeline(
+            {"rate": 1e6, "block_size": block_size, "realtime": False},
+            args.duration, output_dir
+        )
+        results[f"flat out, block {block_size}"] = {
+            "samples_per_s": stats["samples_per_s"],
+            "samples": stats["samples"],
+            "dropped_rows": stats["dropped_rows"],
+        }
+
+    # Paced like real hardware: latency is sample time -> plot buffer
+    memory = {}
+    def measure_memory(pipeline):
+        time.sleep(args.duration / 4) # Let buffers and queues reach steady state
+        memory["start"] = tracemalloc.get_traced_memory()[0]
+    probe = LatencyProbe()
+    rate = 10000.0
+    tracemalloc.start()
+    stats = run_pipeline(
+        {"rate": rate, "block_size": 100, "realtime": True},
+        args.duration, output_dir, plot_buffer=probe, on_running=measure_memory
+    )
+    memory["end"] = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    latencies = np.concatenate(probe.latencies) if probe.latencies else []
+    results[f"realtime {rate:g}/s, block 100"] = dict(
+        percentiles(latencies),
+        samples_per_s=stats["samples_per_s"],
+        memory_growth_bytes=memory["end"] - memory["start"],
+    )
+    return results
+
+
+def bench_filters(args, output_dir):
+    data = np.random.default_rng(0).normal(size=args.samples)
+    blocks = [data[i:i + args.block] for i in range(0, len(data), args.block)]
+    scalar_data = data[:min(len(data), 20000)]
+    results = {}
+    for name, make_filter in FILTERS.items():
+        f = make_filter()
+        total, per_block = timed_calls(f.process_block, blocks)
+        f = make_filter()
+        scalar_total, per_sample = timed_calls(f.process, scalar_data)
+        f = make_filter()
+        results[name] = {
+            "block_samples_per_s": len(data) / total,
+            "block_latency": percentiles(per_block),
+            "scalar_samples_per_s": len(scalar_data) / scalar_total,
+            "scalar_latency": percentiles(per_sample),
+            "memory_growth_bytes": memory_growth(lambda: [f.process_block(b) for b in blocks]),
+        }
+    return results
+
+
+def output_bytes(path):
+    """Size of an output file, or of everything in an output directory."""
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+SINKS = (
+    ("CsvSink", CsvSink, {}),
+    ("BinarySink", BinarySink, {}),
+    ("CompressedSink(zlib)", CompressedSink, {"compression": "zlib"}),
+    ("CompressedSink(lzma)", CompressedSink, {"compression": "lzma"}),
+)
+
+
+def bench_sinks(args, output_dir):
+    """
+    Sink throughput (including close(), where the compressed sinks finish
+    their last blocks) and output size. The data is what a DMM gives: a
+    slow, noisy signal at 1 kHz, read to 1 uV.
+    """
+    rng = np.random.default_rng(0)
+    timestamps = time.time_ns() + np.arange(args.samples, dtype=np.int64) * 1_000_000
+    raw = np.round(np.sin(np.arange(args.samples) / 5000) + rng.normal(0, 0.01, args.samples), 6)
+    filtered = np.round(np.convolve(raw, np.ones(10) / 10, mode="same"), 6)
+    starts = list(range(0, args.samples, args.block))
+    config = {"instrument_name": "benchmark", "comments": ""}
+
+    results = {}
+    for name, sink_class, kwargs in SINKS:
+        def write_all(path=os.path.join(output_dir, f"{name}.csv")):
+            sink = sink_class(path, config, auto_flush=False, **kwargs)
+            sink.open()
+            total, per_block = timed_calls(
+                lambda i: sink.write_block(timestamps[i:i + args.block],
+                                           raw[i:i + args.block],
+                                           filtered[i:i + args.block]),
+                starts
+            )
+            start = time.perf_counter()
+            sink.close()
+            return total + time.perf_counter() - start, per_block, output_bytes(sink.filepath)
+        total, per_block, size = write_all()
+        results[f"{name}.write_block"] = {
+            "samples_per_s": args.samples / total,
+            "block_latency": percentiles(per_block),
+            "bytes_per_sample": size / args.samples,
+            "memory_growth_bytes": memory_growth(write_all),
+        }
+    csv_size = results["CsvSink.write_block"]["bytes_per_sample"]
+    for name, _, _ in SINKS:
+        results[f"{name}.write_block"]["compression_vs_csv"] = (
+            csv_size / results[f"{name}.write_block"]["bytes_per_sample"]
+        )
+
+    n_events = 2000
+    def write_events():
+        sink = EventSink(os.path.join(output_dir, "events.csv"), config)
+        sink.open()
+        with contextlib.redirect_stdout(io.StringIO()): # It prints every event
+            total, per_event = timed_calls(sink.write_event, [f"event {i}" for i in range(n_events)])
+        sink.close()
+        return total, per_event
+    total, per_event = write_events()
+    results["EventSink.write_event"] = {
+        "events_per_s": n_events / total,
+        "event_latency": percentiles(per_event),
+        "memory_growth_bytes": memory_growth(write_events),
+    }
+    return results
+
+
+def bench_plot_headless(args):
+    """The GUI's per-frame data path without any drawing."""
+    ring = SampleRingBuffer()
+    history = HistoryStore()
+    rng = np.random.default_rng(0)
+    samples_per_frame = 1000
+    frames = max(1, args.samples // samples_per_frame)
+    block = rng.normal(size=samples_per_frame)
+    timestamps = np.arange(samples_per_frame, dtype=np.int64)
+
+    def frame(_):
+        ring.write(timestamps, block, block)
+        history.append(*ring.drain())
+        records = history.read(max(0, len(history) - 10000))
+        for field in ("raw", "filtered"):
+            visible = records[field]
+            indices = minmax_indices(visible, 800)
+            visible[indices]
+    total, per_frame = timed_calls(frame, range(frames))
+    history.clear()
+    results = {
+        "samples_per_s": frames * samples_per_frame / total,
+        "frame_latency": percentiles(per_frame),
+        "memory_growth_bytes": memory_growth(lambda: [frame(i) for i in range(frames)]),
+    }
+    history.close()
+    return results
+
+
+def bench_plot_window(args, output_dir):
+    """refresh_plots() of a real, offscreen DacDaqWindow fed at 10k samples/s."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt6.QtWidgets import QApplication
+        from dacdaq.ui.main_window import DacDaqWindow
+    except ImportError as e:
+        return {"skipped": str(e)}
+    app = QApplication.instance() or QApplication([])
+    window = DacDaqWindow({
+        "instrument_name": SyntheticInstrument.NAME,
+        "instrument_class": SyntheticInstrument,
+        "instrument_settings": {"rate": 10000.0, "block_size": 100},
+        "output_file": os.path.join(output_dir, "window.csv"),
+        "comments": "benchmark",
+    })
+    window.frame_timer.stop() # We call refresh_plots ourselves, timed
+    window.show()
+    period = 1.0 / window.plot_fps
+    durations = []
+    end = time.monotonic() + args.duration
+    while time.monotonic() < end:
+        app.processEvents()
+        start = time.perf_counter()
+        window.refresh_plots()
+        durations.append(time.perf_counter() - start)
+        time.sleep(max(0.0, period - durations[-1]))
+    window.stop_acquisition()
+    while window.acquisition_thread is not None:
+        app.processEvents()
+        time.sleep(0.01)
+    return dict(percentiles(durations), frames=len(durations),
+                dropped_samples=window.plot_buffer.dropped_samples)
+
+
+def bench_plot(args, output_dir):
+    results = {"headless data path": bench_plot_headless(args)}
+    if not args.no_qt:
+        results["DacDaqWindow.refresh_plots"] = bench_plot_window(args, output_dir)
+    return results
+
+
+BENCHMARKS = {
+    "pipeline": bench_pipeline,
+    "filters": bench_filters,
+    "sinks": bench_sinks,
+    "plot": bench_plot,
+}
+
+
+def flatten(results, prefix=""):
+    """{"a": {"b": 1}} -> {"a/b": 1}, for comparing numeric leaves."""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}/"))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(old_results, new_results):
+    """Prints the change of every metric present in both result files."""
+    old, new = flatten(old_results), flatten(new_results)
+    print(f"\n{'metric':<72}{'old':>14}{'new':>14}{'change':>9}")
+    for key in sorted(old.keys() & new.keys()):
+        change = f"{(new[key] / old[key] - 1) * 100:+.0f}%" if old[key] else "-"
+        print(f"{key:<72}{old[key]:>14.4g}{new[key]:>14.4g}{change:>9}")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Not JSON serializable: {type(value)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", default=",".join(SECTIONS),
+                        help=f"comma-separated subset of {', '.join(SECTIONS)}")
+    parser.add_argument("--duration", type=float, default=3.0,
+                        help="seconds per timed pipeline/window run (default 3)")
+    parser.add_argument("--samples", type=int, default=200000,
+                        help="samples per filter/sink/plot benchmark (default 200000)")
+    parser.add_argument("--block", type=int, default=1000,
+                        help="block size for filters and sinks (default 1000)")
+    parser.add_argument("--no-qt", action="store_true", help="skip the GUI window benchmark")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="JSON results file (default bench_results.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    sections = [s.strip() for s in args.sections.split(",") if s.strip()]
+    unknown = set(sections) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown sections: {', '.join(sorted(unknown))}")
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="dacdaq-bench-") as output_dir:
+        for section in sections:
+            print(f"Running {section} benchmarks...")
+            results[section] = BENCHMARKS[section](args, output_dir)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "arguments": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2, default=json_default)
+    print(f"Results written to {args.output}")
+
+    for key, value in sorted(flatten(results).items()):
+        print(f"  {key:<72}{value:>14.4g}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f)["results"], results)
+
+
+if __name__ == "__main__":
+    main()
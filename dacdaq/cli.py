@@ -0,0 +1,156 @@
+"""
+The `dacdaq` command line.
+
+    dacdaq run CONFIG.json   Headless acquisition from a saved config
+    dacdaq gui               The usual configuration dialog and main window
+    dacdaq view RUN          Browse a recorded run (.csv, .dqrun or .dqz)
+
+The run command never imports Qt, so it works on lab PCs without a
+display and starts noticeably faster than the GUI.
+"""
+import argparse
+import json
+import signal
+import sys
+import threading
+import time
+
+def load_config(path):
+    """
+    Loads a config saved by the configuration dialog and resolves the
+    instrument name to its class.
+    """
+    from dacdaq.inputs import AVAILABLE_INSTRUMENTS
+
+    with open(path, 'r') as f:
+        config = json.load(f)
+    if not config.get("instruments"):
+        name = config.get("instrument_name", "")
+        if name not in AVAILABLE_INSTRUMENTS:
+            raise ValueError(
+                f"Unknown instrument '{name}'. Available: {', '.join(AVAILABLE_INSTRUMENTS)}"
+            )
+        config["instrument_class"] = AVAILABLE_INSTRUMENTS[name]
+    return config
+
+
+def format_stats(stats):
+    text = (
+        f"{stats['samples']} samples in {stats['elapsed_s']:.1f} s "
+        f"({stats['samples_per_s']:.1f} samples/s, {stats['blocks']} blocks), "
+        f"process queue {stats['process_queue_depth']}, "
+        f"writer queue {stats['writer_queue_depth']}, "
+        f"{stats['dropped_rows']} rows dropped"
+    )
+    if "missed_deadlines" in stats:
+        text += f", {stats['missed_deadlines']} deadlines missed"
+    return text
+
+
+def run_headless(args):
+    # Imported here so `dacdaq --help` stays instant
+    from dacdaq.core.pipeline import AcquisitionPipeline
+
+    try:
+        config = load_config(args.config)
+    except Exception as e:
+        print(f"Error loading configuration: {e}")
+        return 2
+    if args.output:
+        config["output_file"] = args.output
+    if args.profile:
+        config["profile"] = True
+    if args.rate:
+        config["sample_rate"] = args.rate
+
+    errors = []
+    def on_error(message):
+        errors.append(message)
+        print(f"ERROR: {message}")
+
+    pipeline = AcquisitionPipeline(
+        config.get("instrument_class"), config, on_error=on_error
+    )
+
+    # Signal handlers run on the main thread, so acquisition gets its own
+    def request_stop(signum, frame):
+        print(f"\nReceived {signal.Signals(signum).name}, stopping...")
+        pipeline.stop()
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    thread = threading.Thread(target=pipeline.run, name="acquisition")
+    thread.start()
+    started = time.monotonic()
+    last_samples, last_time = 0, started
+    timed_out = False
+    next_report = started + args.stats_interval
+    while thread.is_alive():
+        # Wake for whichever comes first: the next report or the end of --duration
+        wake = next_report
+        if args.duration and not timed_out:
+            wake = min(wake, started + args.duration)
+        thread.join(timeout=max(0.0, wake - time.monotonic()))
+        now = time.monotonic()
+        if args.duration and not timed_out and now - started >= args.duration:
+            timed_out = True
+            pipeline.stop()
+        if thread.is_alive() and now >= next_report:
+            next_report += args.stats_interval
+            stats = pipeline.get_stats()
+            recent = (stats["samples"] - last_samples) / max(now - last_time, 1e-9)
+            last_samples, last_time = stats["samples"], now
+            print(f"{format_stats(stats)}; last {recent:.1f} samples/s")
+
+    print(f"Finished: {format_stats(pipeline.get_stats())}")
+    return 1 if errors else 0
+
+
+def run_gui(args):
+    from dacdaq.ui.app import main
+    main()
+    return 0
+
+
+def run_viewer(args):
+    from PyQt6.QtWidgets import QApplication
+    from dacdaq.ui.run_viewer import RunViewerWindow
+
+    app = QApplication(sys.argv[:1])
+    window = RunViewerWindow(args.run, rebuild=args.rebuild)
+    window.show()
+    return app.exec()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="dacdaq", description="DacDAQ data acquisition")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="acquire headless from a saved config")
+    run_parser.add_argument("config", help="config JSON saved from the configuration dialog")
+    run_parser.add_argument("--output", help="override the config's output file")
+    run_parser.add_argument("--duration", type=float, default=None,
+                            help="stop after this many seconds (default: until Ctrl-C)")
+    run_parser.add_argument("--stats-interval", type=float, default=5.0,
+                            help="seconds between throughput reports (default 5)")
+    run_parser.add_argument("--rate", type=float, default=None,
+                            help="target sample rate in samples/s (overrides sample_rate)")
+    run_parser.add_argument("--profile", action="store_true",
+                            help="capture cProfile and tracemalloc output for the run")
+    run_parser.set_defaults(handler=run_headless)
+
+    gui_parser = subparsers.add_parser("gui", help="open the graphical application")
+    gui_parser.set_defaults(handler=run_gui)
+
+    view_parser = subparsers.add_parser("view", help="browse a recorded run")
+    view_parser.add_argument("run", help="CSV file, .dqrun or .dqz directory, or a run manifest")
+    view_parser.add_argument("--rebuild", action="store_true",
+                             help="rebuild the cached level-of-detail index")
+    view_parser.set_defaults(handler=run_viewer)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import datetime
+import time
+import numpy as np
+
+class RunClock:
+    """
+    Timestamps for a run: time.monotonic_ns() shifted to nanoseconds
+    since the epoch by an offset measured once, when the run starts.
+
+    Readings taken from this clock can't jump when NTP or the user
+    changes the system time mid-run, and are cheap to take (one
+    monotonic_ns() call and an add). Samples, events and sink headers
+    from the same run all use the same RunClock, so they line up exactly.
+    """
+    ANCHOR_TRIES = 5
+
+    def __init__(self):
+        self.offset_ns = 0
+        self.anchor()
+
+    def anchor(self):
+        """
+        Measures the wall-clock offset. Takes the tightest of a few
+        monotonic/wall/monotonic triples, so a preemption between the
+        calls doesn't skew it.
+        """
+        best_gap = None
+        for _ in range(self.ANCHOR_TRIES):
+            before = time.monotonic_ns()
+            wall = time.time_ns()
+            after = time.monotonic_ns()
+            if best_gap is None or after - before < best_gap:
+                best_gap = after - before
+                self.offset_ns = wall - (before + after) // 2
+
+    def now_ns(self):
+        """Now, in nanoseconds since the epoch."""
+        return time.monotonic_ns() + self.offset_ns
+
+    def now_iso(self):
+        """Now, as a local-time ISO string."""
+        return str(format_iso(self.now_ns()))
+
+
+# Used by code that isn't given a run's clock, e.g. single-value writes
+default_clock = RunClock()
+
+
+def _utc_offset_ns(epoch_ns):
+    seconds = int(epoch_ns) // 1_000_000_000
+    offset = datetime.datetime.fromtimestamp(seconds).astimezone().utcoffset()
+    return int(offset.total_seconds()) * 1_000_000_000
+
+
+def to_local_datetime64(epoch_ns):
+    """
+    Converts int64 nanoseconds since the epoch to naive local-time
+    datetime64[ns], as written in the CSV files. Works on whole arrays.
+    """
+    ns = np.asarray(epoch_ns, dtype=np.int64)
+    if ns.size == 0:
+        return ns.astype("datetime64[ns]")
+    # NumPy works in UTC, so shift by the local UTC offset, per element
+    # only when it changes (DST) inside the array
+    first, last = _utc_offset_ns(ns.flat[0]), _utc_offset_ns(ns.flat[-1])
+    if first == last:
+        local = ns + first
+    else:
+        local = ns + np.vectorize(_utc_offset_ns, otypes=[np.int64])(ns)
+    return local.astype("datetime64[ns]")
+
+
+def format_iso(epoch_ns):
+    """
+    Formats int64 nanoseconds since the epoch as local-time ISO strings
+    with microsecond resolution, e.g. '2024-05-01T14:03:07.123456'.
+    Works on a whole array at once; a scalar gives a 0-d array.
+    """
+    return np.datetime_as_string(to_local_datetime64(epoch_ns), unit="us")
+
+
+def _local_offset_ns(iso_string):
+    offset = datetime.datetime.fromisoformat(str(iso_string)).astimezone().utcoffset()
+    return int(offset.total_seconds()) * 1_000_000_000
+
+
+def parse_iso(iso_strings):
+    """
+    The inverse of format_iso: local-time ISO strings (with or without
+    fractional seconds) to int64 nanoseconds since the epoch, parsed in
+    bulk.
+    """
+    iso_strings = np.asarray(iso_strings)
+    local = iso_strings.astype("datetime64[ns]").astype(np.int64)
+    if local.size == 0:
+        return local
+    first, last = _local_offset_ns(iso_strings[0]), _local_offset_ns(iso_strings[-1])
+    if first == last:
+        return local - first
+    return local - np.array([_local_offset_ns(t) for t in iso_strings], dtype=np.int64)
@@ -0,0 +1,244 @@
+import bisect
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+from dacdaq.outputs.binary_sink import record_dtype
+from dacdaq.processing.pyramid import level_dtype, records_to_bins, reduce_bins
+
+class HistoryStore:
+    """
+    Every sample of a run, as (timestamp, raw, filtered) records in
+    fixed-size chunks, so the plot can browse the whole run while
+    acquisition continues.
+
+    Records use the BinarySink layout for the run's channels (int64
+    nanosecond timestamps, one float64 raw/filtered value per channel).
+    Chunks hold chunk_size records each and are never resized, so
+    appending never copies old data. Once the chunks in memory take more
+    than memory_budget bytes, the oldest full ones are written to a
+    temporary directory and replaced by read-only memmaps; reads don't
+    notice the difference. The temporary files are deleted by close().
+
+    As samples arrive they are also summarised into MinMaxPyramid-style
+    bins of summary_factor samples, and coarser levels of summary_factor
+    times as many up to one bin per chunk, so summary() can draw any
+    range at screen resolution without reading the samples. The bins
+    stay in memory; they take a few percent of the space of the records.
+
+    Samples are addressed by their index in the run (0 for the first
+    sample appended) or by timestamp. Timestamps must not go backwards.
+    """
+    def __init__(self, chunk_size=65536, memory_budget=256 * 2**20, channels=None,
+                 spill_dir=None, summary_factor=64):
+        self.chunk_size = max(1, int(chunk_size))
+        self.memory_budget = int(memory_budget)
+        self.dtype = record_dtype(channels)
+        self.summary_factor = max(2, int(summary_factor))
+        if self.chunk_size % self.summary_factor:
+            raise ValueError("chunk_size must be a multiple of summary_factor")
+        # Samples per bin at each summary level; the last is a whole chunk
+        self.bin_sizes = []
+        size = self.summary_factor
+        while size < self.chunk_size and self.chunk_size % size == 0:
+            self.bin_sizes.append(size)
+            size *= self.summary_factor
+        self.bin_sizes.append(self.chunk_size)
+        self.summary_dtype = level_dtype(self.dtype)
+        self.spill_dir = spill_dir # Parent of our temporary directory
+        self._spill_path = None
+
+        self._lock = threading.Lock()
+        self._chunks = [] # Structured arrays; the last one is being filled
+        self._first_times = [] # First timestamp of each chunk, for time lookups
+        self._in_memory = 0 # Chunks not yet spilled
+        self._fill = 0 # Records in the last chunk
+        # Per level, each chunk's bins. The finest level is filled in as
+        # bins complete; the others are added once a chunk is full.
+        self._summaries = [[] for _ in self.bin_sizes]
+        self.spilled_chunks = 0
+
+    def __len__(self):
+        if not self._chunks:
+            return 0
+        return (len(self._chunks) - 1) * self.chunk_size + self._fill
+
+    @property
+    def memory_bytes(self):
+        """Bytes held in RAM (chunks are allocated whole)."""
+        return self._in_memory * self.chunk_size * self.dtype.itemsize
+
+    @property
+    def spilled_bytes(self):
+        return self.spilled_chunks * self.chunk_size * self.dtype.itemsize
+
+    def append(self, timestamps, raw, filtered):
+        """Appends a block of samples."""
+        n = len(raw)
+        if n == 0:
+            return
+        timestamps = np.asarray(timestamps)
+        raw = np.asarray(raw)
+        filtered = np.asarray(filtered)
+        with self._lock:
+            done = 0
+            while done < n:
+                if not self._chunks or self._fill == self.chunk_size:
+                    self._new_chunk(int(timestamps[done]))
+                chunk = self._chunks[-1]
+                k = min(n - done, self.chunk_size - self._fill)
+                target = chunk[self._fill:self._fill + k]
+                target["timestamp"] = timestamps[done:done + k]
+                target["raw"] = raw[done:done + k]
+                target["filtered"] = filtered[done:done + k]
+                self._fill += k
+                self._summarize(self._fill - k)
+                done += k
+
+    def _summarize(self, old_fill):
+        """Adds the summary bins completed since old_fill. Caller holds the lock."""
+        size = self.bin_sizes[0]
+        done, now = old_fill // size, self._fill // size
+        if now > done:
+            records = self._chunks[-1][done * size:now * size]
+            self._summaries[0][-1][done:now] = reduce_bins(
+                records_to_bins(records, self.summary_dtype), size, self.summary_dtype
+            )
+        if self._fill == self.chunk_size:
+            bins = self._summaries[0][-1]
+            for level in range(1, len(self.bin_sizes)):
+                factor = self.bin_sizes[level] // self.bin_sizes[level - 1]
+                bins = reduce_bins(bins, factor, self.summary_dtype)
+                self._summaries[level].append(bins)
+
+    def _new_chunk(self, first_time):
+        """Starts a chunk, spilling old ones if that goes over budget. Caller holds the lock."""
+        self._chunks.append(np.zeros(self.chunk_size, dtype=self.dtype))
+        self._summaries[0].append(
+            np.empty(self.chunk_size // self.bin_sizes[0], dtype=self.summary_dtype)
+        )
+        self._first_times.append(first_time)
+        self._fill = 0
+        self._in_memory += 1
+        while self.memory_bytes > self.memory_budget and self._in_memory > 1:
+            self._spill(len(self._chunks) - self._in_memory)
+
+    def _spill(self, index):
+        """Moves a full chunk to a memory-mapped file. Caller holds the lock."""
+        if self._spill_path is None:
+            self._spill_path = tempfile.mkdtemp(prefix="dacdaq-history-", dir=self.spill_dir)
+        path = os.path.join(self._spill_path, f"chunk_{index:06d}.bin")
+        self._chunks[index].tofile(path)
+        self._chunks[index] = np.memmap(path, dtype=self.dtype, mode='r',
+                                        shape=(self.chunk_size,))
+        self._in_memory -= 1
+        self.spilled_chunks += 1
+
+    def read(self, start=0, stop=None):
+        """
+        Returns records start..stop as a structured array. A range inside
+        one chunk comes back as a view; copy it to keep it past clear().
+        """
+        with self._lock:
+            total = len(self)
+            stop = total if stop is None else min(int(stop), total)
+            start = max(0, min(int(start), stop))
+            if start == stop:
+                return np.empty(0, dtype=self.dtype)
+            first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+            parts = []
+            for i in range(first, last + 1):
+                offset = i * self.chunk_size
+                parts.append(self._chunks[i][max(start - offset, 0):min(stop - offset, self.chunk_size)])
+            if len(parts) == 1:
+                return parts[0]
+            return np.concatenate(parts)
+
+    def _chunk_summary(self, level, i):
+        """
+        Chunk i's bins at a summary level. For the chunk being filled
+        these are worked out from its complete finest bins plus a bin for
+        the samples after them. Caller holds the lock.
+        """
+        complete = i < len(self._chunks) - 1 or self._fill == self.chunk_size
+        if complete:
+            return self._summaries[level][i]
+        size = self.bin_sizes[0]
+        done = self._fill // size
+        bins = self._summaries[0][i][:done]
+        if self._fill > done * size:
+            tail = records_to_bins(self._chunks[i][done * size:self._fill], self.summary_dtype)
+            bins = np.concatenate((bins, reduce_bins(tail, len(tail), self.summary_dtype)))
+        for k in range(1, level + 1):
+            factor = self.bin_sizes[k] // self.bin_sizes[k - 1]
+            bins = reduce_bins(bins, factor, self.summary_dtype)
+        return bins
+
+    def summary(self, start, stop, n_bins):
+        """
+        Samples start..stop summarised in about n_bins bins of
+        summary_dtype (first timestamp, count, min/max/mean of raw and
+        filtered), without reading the samples themselves. Takes the
+        coarsest level with at least n_bins bins over the range and
+        combines those further. Returns (positions, bins), positions
+        being the index of each bin's first sample.
+
+        Worth it once the range is over summary_factor * n_bins samples;
+        below that the finest level has fewer than n_bins bins.
+        """
+        n_bins = max(1, int(n_bins))
+        with self._lock:
+            total = len(self)
+            stop = total if stop is None else min(int(stop), total)
+            start = max(0, min(int(start), stop))
+            if start == stop:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.summary_dtype)
+            level = 0
+            while (level + 1 < len(self.bin_sizes)
+                   and (stop - start) // self.bin_sizes[level + 1] >= n_bins):
+                level += 1
+            size = self.bin_sizes[level]
+            first, last = start // self.chunk_size, (stop - 1) // self.chunk_size
+            bins = np.concatenate([self._chunk_summary(level, i) for i in range(first, last + 1)])
+            base = first * self.chunk_size
+            lo, hi = (start - base) // size, -(-(stop - base) // size)
+            bins = bins[lo:hi]
+        positions = base + (lo + np.arange(len(bins), dtype=np.int64)) * size
+        factor = len(bins) // n_bins
+        if factor > 1:
+            bins = reduce_bins(bins, factor, self.summary_dtype)
+            positions = positions[::factor]
+        return positions, bins
+
+    def index_at(self, timestamp_ns):
+        """Index of the first sample at or after timestamp_ns (len() if none)."""
+        with self._lock:
+            # The last chunk starting before timestamp_ns holds the answer,
+            # or it is the first sample of the next chunk
+            i = bisect.bisect_left(self._first_times, int(timestamp_ns)) - 1
+            if i < 0:
+                return 0
+            fill = self._fill if i == len(self._chunks) - 1 else self.chunk_size
+            times = self._chunks[i]["timestamp"][:fill]
+            return i * self.chunk_size + int(np.searchsorted(times, timestamp_ns, side='left'))
+
+    def read_time(self, start_ns, stop_ns):
+        """Returns the records with start_ns <= timestamp < stop_ns."""
+        return self.read(self.index_at(start_ns), self.index_at(stop_ns))
+
+    def clear(self):
+        """Forgets every sample and deletes the spill files."""
+        with self._lock:
+            self._chunks = []
+            self._first_times = []
+            self._summaries = [[] for _ in self.bin_sizes]
+            self._in_memory = 0
+            self._fill = 0
+            self.spilled_chunks = 0
+            if self._spill_path is not None:
+                shutil.rmtree(self._spill_path, ignore_errors=True)
+                self._spill_path = None
+
+    def close(self):
+        self.clear()
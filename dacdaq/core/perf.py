@@ -0,0 +1,224 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import tracemalloc
+
+class StageTimer:
+    """
+    Running statistics and a log2 histogram of one stage's durations,
+    recorded in integer nanoseconds from time.perf_counter_ns().
+
+    Bucket i counts durations in [2**(i-1), 2**i) ns, so recording is a
+    bit_length() and a list increment; cheap enough to call several times
+    per loop. Percentiles are estimated from the histogram.
+    """
+    N_BUCKETS = 48 # Up to 2**47 ns, about 39 hours
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.buckets = [0] * self.N_BUCKETS
+
+    def record(self, ns):
+        self.count += 1
+        self.total_ns += ns
+        if self.min_ns is None or ns < self.min_ns:
+            self.min_ns = ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+        self.buckets[min(ns.bit_length(), self.N_BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        """
+        The q-th percentile in ns, interpolated linearly inside its bucket
+        and clamped to the observed min/max.
+        """
+        if self.count == 0:
+            return 0
+        target = self.count * q / 100.0
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if n and seen + n >= target:
+                lower = (1 << (i - 1)) if i else 0
+                estimate = lower + (target - seen) / n * ((1 << i) - lower)
+                return min(max(estimate, self.min_ns), self.max_ns)
+            seen += n
+        return self.max_ns
+
+    def snapshot(self):
+        """The statistics as a plain dict, in microseconds."""
+        return {
+            "count": self.count,
+            "mean_us": self.total_ns / self.count / 1e3 if self.count else 0.0,
+            "min_us": (self.min_ns or 0) / 1e3,
+            "p50_us": self.percentile(50) / 1e3,
+            "p99_us": self.percentile(99) / 1e3,
+            "max_us": self.max_ns / 1e3,
+            "total_s": self.total_ns / 1e9,
+            "histogram_ns": {f"<{1 << i}": n for i, n in enumerate(self.buckets) if n},
+        }
+
+
+class PerfStats:
+    """
+    Per-stage timings for the acquisition loop, plus the effective sample
+    rate and loop jitter (spread of the time between loop iterations).
+
+    The read, queue and loop stages are written by the acquisition thread
+    and the rest by the processing thread; each timer has one writer.
+    The GUI reads them unlocked: the counters are plain ints, so a
+    snapshot taken mid-iteration is at worst one iteration stale.
+    """
+    STAGES = ("read", "queue", "filter", "write", "plot", "loop")
+    RATE_WINDOW_NS = 1_000_000_000 # Effective rate is measured over ~1 s
+
+    def __init__(self):
+        self.stages = {stage: StageTimer() for stage in self.STAGES}
+        self.period = StageTimer() # Start-to-start time between iterations
+        self._last_loop_start = None
+        # Welford running variance of the loop period, for jitter
+        self._period_mean = 0.0
+        self._period_m2 = 0.0
+        self.samples = 0
+        self.sample_rate = 0.0
+        self._rate_start = None
+        self._rate_samples = 0
+
+    def loop_started(self, now_ns):
+        if self._last_loop_start is not None:
+            period = now_ns - self._last_loop_start
+            self.period.record(period)
+            delta = period - self._period_mean
+            self._period_mean += delta / self.period.count
+            self._period_m2 += delta * (period - self._period_mean)
+        self._last_loop_start = now_ns
+
+    def record(self, stage, ns):
+        self.stages[stage].record(ns)
+
+    def add_samples(self, n, now_ns):
+        self.samples += n
+        if self._rate_start is None:
+            self._rate_start = now_ns
+        self._rate_samples += n
+        elapsed = now_ns - self._rate_start
+        if elapsed >= self.RATE_WINDOW_NS:
+            self.sample_rate = self._rate_samples * 1e9 / elapsed
+            self._rate_start = now_ns
+            self._rate_samples = 0
+
+    def pause(self):
+        """Call when the loop pauses, so the idle time isn't counted as jitter."""
+        self._last_loop_start = None
+        self._rate_start = None
+        self._rate_samples = 0
+        self.sample_rate = 0.0
+
+    @property
+    def jitter_us(self):
+        """Standard deviation of the loop period, in microseconds."""
+        if self.period.count < 2:
+            return 0.0
+        return (self._period_m2 / (self.period.count - 1)) ** 0.5 / 1e3
+
+    def snapshot(self):
+        return {
+            "samples": self.samples,
+            "sample_rate": self.sample_rate,
+            "loop_period_mean_us": self._period_mean / 1e3,
+            "loop_jitter_us": self.jitter_us,
+            "loop_period": self.period.snapshot(),
+            "stages": {name: timer.snapshot() for name, timer in self.stages.items()},
+        }
+
+    def summary(self):
+        """A few lines of text for the GUI's stats panel."""
+        lines = [
+            f"Sample rate: {self.sample_rate:,.1f} /s   "
+            f"Loop period: {self._period_mean / 1e3:,.1f} us   "
+            f"Jitter: {self.jitter_us:,.1f} us",
+            f"{'stage':<8}{'count':>10}{'mean us':>11}{'p50 us':>11}{'p99 us':>11}{'max us':>11}{'total s':>10}",
+        ]
+        for name, timer in self.stages.items():
+            s = timer.snapshot()
+            lines.append(
+                f"{name:<8}{s['count']:>10}{s['mean_us']:>11.1f}{s['p50_us']:>11.1f}"
+                f"{s['p99_us']:>11.1f}{s['max_us']:>11.1f}{s['total_s']:>10.2f}"
+            )
+        return "\n".join(lines)
+
+
+class RunProfiler:
+    """
+    Opt-in cProfile and tracemalloc capture of an acquisition run.
+
+    A cProfile.Profile only sees the thread that enables it, so the
+    thread that calls start() gets self.profile and every other pipeline
+    thread gets its own from stage_profile(), which it enables and
+    disables itself. Results are saved next to the output file as
+    <name>.prof for the start() thread, <name>.<stage>.prof for each
+    stage (load with pstats or snakeviz) and <name>.tracemalloc.txt.
+    """
+    def __init__(self, base_filepath, top=25):
+        self.base_filepath = base_filepath
+        self.top = top
+        self.profile = cProfile.Profile()
+        self.stage_profiles = {}
+        self.start_snapshot = None
+
+    def stage_profile(self, stage):
+        """A new profile for the thread running stage, saved as <name>.<stage>.prof."""
+        profile = cProfile.Profile()
+        self.stage_profiles[stage] = profile
+        return profile
+
+    def start(self):
+        tracemalloc.start()
+        self.start_snapshot = tracemalloc.take_snapshot()
+        self.profile.enable()
+
+    def stop(self):
+        """
+        Stops capturing and writes the results. Returns their file paths.
+        Call it once the stage threads have finished.
+        """
+        self.profile.disable()
+        end_snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiles = {f"{self.base_filepath}.prof": self.profile}
+        for stage, profile in self.stage_profiles.items():
+            profiles[f"{self.base_filepath}.{stage}.prof"] = profile
+        for path, profile in profiles.items():
+            profile.dump_stats(path)
+
+        memory_path = f"{self.base_filepath}.tracemalloc.txt"
+        with open(memory_path, 'w') as f:
+            f.write(f"Traced memory at end: {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB\n\n")
+            f.write(f"Top {self.top} allocation sites by growth over the run:\n")
+            for stat in end_snapshot.compare_to(self.start_snapshot, "lineno")[:self.top]:
+                f.write(f"{stat}\n")
+            for path, profile in profiles.items():
+                f.write(f"\nTop functions by cumulative time in {os.path.basename(path)}:\n")
+                text = io.StringIO()
+                pstats.Stats(profile, stream=text).sort_stats("cumulative").print_stats(self.top)
+                f.write(text.getvalue())
+        print(f"Profile written to {', '.join(profiles)} and {memory_path}")
+        return [*profiles, memory_path]
+
+
+def write_stats_sidecar(base_filepath, stats):
+    """Writes run statistics to <name>.stats.json. Returns the path."""
+    path = f"{base_filepath}.stats.json"
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    print(f"Run statistics written to {path}")
+    return path
@@ -0,0 +1,454 @@
+import functools
+import threading
+import time
+from dacdaq.core.clock import RunClock
+from dacdaq.core.perf import PerfStats, RunProfiler, write_stats_sidecar
+from dacdaq.core.scheduler import DeadlineScheduler
+from dacdaq.core.shared_ring import SharedSampleRing
+from dacdaq.core.sources import create_source
+from dacdaq.core.stages import BoundedQueue, ProcessingStage
+from dacdaq.outputs.async_writer import AsyncSinkWriter
+from dacdaq.outputs.binary_sink import BinarySink
+from dacdaq.outputs.compressed_sink import CompressedSink
+from dacdaq.outputs.csv_sink import CsvSink
+from dacdaq.outputs.event_sink import EventSink, events_path_for
+from dacdaq.outputs.publisher import LivePublisher
+from dacdaq.outputs.rotation import RotatingSink
+from dacdaq.processing.filters import DEFAULT_FILTERS, build_filter_chain
+
+# Sink classes selectable through the "output_formats" config key. Extra
+# keyword arguments for each come from "<format>_settings", e.g.
+# "compressed_settings": {"compression": "lzma", "block_records": 65536}
+SINK_CLASSES = {
+    "csv": CsvSink,
+    "binary": BinarySink,
+    "compressed": CompressedSink,
+}
+
+
+class AcquisitionPipeline:
+    """
+    The instrument -> filter -> sink acquisition loop.
+
+    This has no Qt dependency, so it runs the same under the GUI's
+    AcquisitionWorker and the headless `dacdaq run` command. Problems are
+    reported through the on_error and on_warning callbacks, which may be
+    called from any of the pipeline's threads.
+
+    The work is split into stages joined by BoundedQueues, so a slow stage
+    never lowers the sampling rate directly:
+      - the thread running run() only reads the instrument and queues
+        the raw blocks on process_queue
+      - a ProcessingStage thread filters them and fans them out
+      - each sink is written by its own AsyncSinkWriter thread
+      - the GUI drains plot_buffer, which overwrites its oldest samples
+        rather than ever blocking
+    Queue sizes and overflow policies come from the "queue_settings"
+    config key for process_queue (e.g. {"max_blocks": 1024, "overflow":
+    "block", "put_timeout": 0.05}) and "writer_settings" for the sinks.
+    process_queue drops its oldest blocks by default, so a stalled disk
+    can never hold up the instrument thread; waiting has to be asked for
+    with "overflow": "block". Every queue's depth and drop counts are in
+    get_stats(), and dropped samples are reported as warnings.
+
+    Each stage is timed into self.perf. At the end of a run the
+    statistics are written to <output>.stats.json, and with the "profile"
+    config key set the loop also runs under cProfile and tracemalloc.
+
+    With "sample_rate" set (samples per second) reads are paced by a
+    DeadlineScheduler; otherwise the loop reads as fast as the instrument
+    returns. stop(), pause() and resume() wake the loop immediately.
+
+    Every run gets its own RunClock, anchored to wall-clock time when the
+    run opens. Instruments timestamp their readings from it as int64
+    nanoseconds, and the sinks and event log share it, so samples and
+    event comments line up exactly.
+
+    With "rotation_settings" set (e.g. {"max_bytes": 500_000_000,
+    "max_seconds": 3600}) the CSV file and event log are written as
+    segments listed in a manifest; see RotatingSink. Binary and
+    compressed runs are already split into chunks and aren't rotated.
+
+    With "publish_settings" set (e.g. {"address": "127.0.0.1:5760"}) the
+    filtered samples and event comments are also served live to other
+    processes by a LivePublisher, which never blocks the pipeline. With
+    "shared_memory_settings" set (e.g. {"name": "dacdaq", "capacity":
+    1048576}) they are also written to a SharedSampleRing that local
+    processes can read without copying.
+    """
+    def __init__(self, instrument_class, config, plot_buffer=None,
+                 on_error=None, on_warning=None):
+        self.InstrumentClass = instrument_class
+        self.config = config
+        self.plot_buffer = plot_buffer # SampleRingBuffer drained by the GUI
+        self.on_error = on_error or (lambda message: print(f"ERROR: {message}"))
+        self.on_warning = on_warning or (lambda message: print(f"WARNING: {message}"))
+        self.source = None # One instrument, or several merged on time
+        self.clock = None # The run's RunClock, set when the run opens
+        self.data_sinks = []
+        self.event_sink = None
+        self.publisher = None # LivePublisher, with "publish_settings"
+        self.shared_ring = None # SharedSampleRing, with "shared_memory_settings"
+        self.profiler = None # RunProfiler, with "profile"
+
+        # Guards the flags below; notified whenever they change
+        self._state = threading.Condition()
+        self._is_running = True
+        self._is_paused = False
+
+        self.scheduler = None
+        if config.get("sample_rate"):
+            self.scheduler = DeadlineScheduler(
+                config["sample_rate"], **config.get("scheduler_settings", {})
+            )
+        self._reported_misses = 0
+
+        self.processor = build_filter_chain(config.get("filters", DEFAULT_FILTERS))
+        self.process_queue = BoundedQueue(
+            on_overflow=self.on_processing_overflow,
+            **{"max_blocks": 1024, "overflow": "drop_oldest", **config.get("queue_settings", {})}
+        )
+        self.processing = None # ProcessingStage, started once the sinks are open
+        self._last_warning_time = 0.0
+
+        # Throughput statistics
+        self.perf = PerfStats()
+        self.samples = 0
+        self.blocks = 0
+        self.start_time = None
+        self.stop_time = None
+
+    def _open(self):
+        """Connects the instrument(s) and opens every sink. Returns True on success."""
+        self.clock = RunClock()
+
+        # 1. Connect to the instrument(s)
+        self.source = create_source(self.InstrumentClass, self.config, self.clock)
+        if not self.source.open():
+            self.on_error(f"Failed to connect to {self.source.get_name()}")
+            return False
+
+        # 2. Open data sinks, each written from its own thread
+        sink_config = dict(self.config, channels=self.source.labels,
+                           start_time=self.clock.now_iso())
+        if self.source.labels:
+            sink_config["instrument_name"] = self.source.get_name()
+        output_file = self.config["output_file"]
+        for output_format in self.config.get("output_formats", ["csv"]):
+            sink_class = SINK_CLASSES[output_format]
+            make_sink = functools.partial(
+                sink_class, output_file, sink_config, auto_flush=False, clock=self.clock,
+                **self.config.get(f"{output_format}_settings", {})
+            )
+            sink = AsyncSinkWriter(
+                self._rotated(make_sink, output_file) if sink_class is CsvSink else make_sink(),
+                on_backpressure=self.on_backpressure,
+                profile=self._stage_profile(f"writer-{output_format}"),
+                **self.config.get("writer_settings", {})
+            )
+            if not sink.open():
+                self.on_error(f"Failed to open output file: {sink.filepath}")
+                return False
+            self.data_sinks.append(sink)
+
+        # 3. Open event sink
+        self.event_sink = self._rotated(
+            functools.partial(EventSink, output_file, sink_config, clock=self.clock),
+            events_path_for(output_file)
+        )
+        if not self.event_sink.open():
+            self.on_error("Failed to open event file.")
+            return False
+
+        # 4. Serve the live data to other processes
+        sinks = list(self.data_sinks)
+        if self.config.get("publish_settings"):
+            self.publisher = LivePublisher(sink_config, clock=self.clock,
+                                           **self.config["publish_settings"])
+            if not self.publisher.open():
+                self.on_error(f"Failed to publish live data on {self.publisher.address}")
+                return False
+            sinks.append(self.publisher) # Not through a writer thread: it never blocks
+        if self.config.get("shared_memory_settings"):
+            try:
+                self.shared_ring = SharedSampleRing.create(
+                    channels=self.source.labels,
+                    metadata={key: sink_config.get(key) for key in ("instrument_name", "start_time")},
+                    **self.config["shared_memory_settings"]
+                )
+            except (OSError, ValueError) as e:
+                self.on_error(f"Failed to create shared memory ring: {e}")
+                return False
+            sinks.append(self.shared_ring)
+
+        # 5. Start filtering and fanning out on its own thread
+        self.processing = ProcessingStage(
+            self.process_queue, self.processor, sinks,
+            plot_buffer=self.plot_buffer, perf=self.perf,
+            profile=self._stage_profile("processing")
+        )
+        self.processing.start()
+        return True
+
+    def _stage_profile(self, stage):
+        """The profile for a stage's thread, or None when not profiling."""
+        return self.profiler.stage_profile(stage) if self.profiler else None
+
+    def _rotated(self, make_sink, filepath):
+        """make_sink()'s sink, split into segments if "rotation_settings" asks for it."""
+        settings = self.config.get("rotation_settings")
+        if not settings:
+            return make_sink()
+        return RotatingSink(make_sink, filepath, clock=self.clock, **settings)
+
+    def run(self):
+        """
+        Runs acquisition until stop() is called or an error occurs.
+        Blocks the calling thread. Returns True if the run ended cleanly.
+        """
+        ok = False
+        profiler = None
+        perf = self.perf
+        clock = time.perf_counter_ns
+        try:
+            if self.config.get("profile"):
+                # Created first so the stages opened below can profile their threads
+                self.profiler = RunProfiler(self.base_filepath)
+            if not self._open():
+                return False
+
+            if self.profiler:
+                profiler = self.profiler
+                profiler.start()
+
+            print("Acquisition thread started...")
+            self.start_time = time.monotonic()
+            scheduler = self.scheduler
+            if scheduler:
+                scheduler.reset()
+            while True:
+                with self._state:
+                    if self._is_paused and self._is_running:
+                        self.source.pause()
+                        perf.pause()
+                        self._state.wait_for(lambda: not self._is_paused or not self._is_running)
+                        if self._is_running:
+                            self.source.resume()
+                            if scheduler:
+                                scheduler.reset()
+                    if not self._is_running:
+                        break
+
+                if scheduler and scheduler.wait(self._wait_for_request):
+                    continue # Woken by stop/pause
+
+                t_start = clock()
+                perf.loop_started(t_start)
+                # Work on whole blocks; instruments that only implement
+                # read_voltage() still deliver blocks of one. With several
+                # instruments each block has one column per instrument.
+                timestamps, raw_block = self.source.read()
+                t_read = clock()
+                perf.record("read", t_read - t_start)
+                if scheduler:
+                    scheduler.completed(t_start, len(raw_block))
+                    if scheduler.missed_deadlines > self._reported_misses:
+                        self.on_deadline_missed()
+                if len(raw_block) == 0:
+                    continue
+
+                # Filtering, disk and plotting happen on the other stages
+                if self.processing.error is not None:
+                    raise RuntimeError(f"Processing failed: {self.processing.error}")
+                self.process_queue.put((timestamps, raw_block), len(raw_block))
+                t_end = clock()
+                perf.record("queue", t_end - t_read)
+                perf.record("loop", t_end - t_start)
+                perf.add_samples(len(raw_block), t_end)
+
+                self.samples += len(raw_block)
+                self.blocks += 1
+
+            print("Acquisition loop finished.")
+            ok = True
+
+        except Exception as e:
+            self.on_error(f"Error in acquisition thread: {e}")
+
+        finally:
+            self.stop_time = time.monotonic()
+            if self.source:
+                self.source.close()
+            # Let the processing stage finish what was read before the sinks close
+            self.process_queue.close()
+            if self.processing:
+                self.processing.join()
+                if self.processing.error is not None and ok:
+                    self.on_error(f"Error in processing thread: {self.processing.error}")
+                    ok = False
+            if self.process_queue.dropped_rows:
+                # The throttled warnings may not have shown the final count
+                self.on_warning(
+                    f"{self.process_queue.dropped_rows} samples dropped in "
+                    f"{self.process_queue.dropped_blocks} blocks because processing fell behind"
+                )
+            for sink in self.data_sinks:
+                sink.close()
+            if self.event_sink:
+                self.event_sink.close()
+            if self.publisher:
+                self.publisher.close()
+            if self.shared_ring:
+                self.shared_ring.close()
+            if profiler:
+                # Once the processing and writer threads have finished
+                profiler.stop()
+            if self.start_time is not None:
+                try:
+                    write_stats_sidecar(self.base_filepath, self.get_stats(detailed=True))
+                except Exception as e:
+                    print(f"Error writing run statistics: {e}")
+        return ok
+
+    @property
+    def base_filepath(self):
+        """The output file without its extension, for the sidecar files."""
+        return self.config["output_file"].rsplit('.', 1)[0]
+
+    def _wait_for_request(self, timeout):
+        """Sleeps up to timeout seconds; returns True early on stop or pause."""
+        with self._state:
+            return self._state.wait_for(
+                lambda: self._is_paused or not self._is_running, timeout
+            )
+
+    def stop(self):
+        with self._state:
+            self._is_running = False
+            self._is_paused = False
+            self._state.notify_all()
+        print("Requesting thread stop...")
+
+    def pause(self):
+        with self._state:
+            self._is_paused = True
+            self._state.notify_all()
+        print("Requesting thread pause...")
+
+    def resume(self):
+        with self._state:
+            self._is_paused = False
+            self._state.notify_all()
+        print("Requesting thread resume...")
+
+    def _warn_throttled(self, message):
+        """Passes message to on_warning at most once a second."""
+        now = time.monotonic()
+        if now - self._last_warning_time < 1.0:
+            return False
+        self._last_warning_time = now
+        self.on_warning(message)
+        return True
+
+    def on_deadline_missed(self):
+        """Reports missed sampling deadlines, at most once a second."""
+        scheduler = self.scheduler
+        if self._warn_throttled(
+            f"Can't keep up with {scheduler.rate:g} samples/s: "
+            f"{scheduler.missed_deadlines} deadlines missed, "
+            f"{scheduler.resyncs} resyncs, worst start "
+            f"{scheduler.lateness.max_ns / 1e6:.1f} ms late"
+        ):
+            self._reported_misses = scheduler.missed_deadlines
+
+    def on_processing_overflow(self, event, queue):
+        """
+        Called on the acquisition thread when process_queue is full.
+        Reported at most once a second; the total is reported again when
+        the run ends.
+        """
+        self._warn_throttled(
+            f"Processing falling behind ({event}): "
+            f"{queue.full_events} stalls, {queue.dropped_rows} samples dropped"
+        )
+
+    def on_backpressure(self, event, writer):
+        """
+        Called on the processing thread by AsyncSinkWriter when its queue
+        is full. Reported at most once a second so a stuck disk can't
+        flood the GUI.
+        """
+        self._warn_throttled(
+            f"Disk writer falling behind ({event}): "
+            f"{writer.backpressure_events} stalls, "
+            f"{writer.dropped_rows} rows dropped"
+        )
+
+    def add_event_comment(self, comment):
+        """
+        Thread-safe method to write a comment to the event log.
+        This is called from the main GUI thread. The file and the live
+        stream get the same timestamp.
+        """
+        now = self.clock.now_ns()
+        if self.event_sink:
+            # The event sink's write method is simple and fast,
+            # so we can call it directly.
+            self.event_sink.write_event(comment, timestamp_ns=now)
+        if self.publisher:
+            self.publisher.write_event(now, comment)
+
+    def get_stats(self, detailed=False):
+        """
+        Returns a dict of throughput statistics for the run so far; with
+        detailed=True, also the per-stage timings from self.perf.
+        """
+        elapsed = 0.0
+        if self.start_time is not None:
+            elapsed = (self.stop_time or time.monotonic()) - self.start_time
+        stats = {
+            "samples": self.samples,
+            "blocks": self.blocks,
+            "elapsed_s": elapsed,
+            "samples_per_s": self.samples / elapsed if elapsed > 0 else 0.0,
+            "process_queue_depth": self.process_queue.depth,
+            "writer_queue_depth": sum(sink.queue_depth for sink in self.data_sinks),
+            "dropped_rows": self.process_queue.dropped_rows
+                            + sum(sink.dropped_rows for sink in self.data_sinks),
+        }
+        if self.scheduler:
+            stats["missed_deadlines"] = self.scheduler.missed_deadlines
+        if detailed:
+            stats.update(self.perf.snapshot())
+            stats["queues"] = self.queue_snapshot()
+            if self.plot_buffer is not None:
+                stats["plot_dropped_samples"] = self.plot_buffer.dropped_samples
+            if self.scheduler:
+                stats["scheduler"] = self.scheduler.snapshot()
+            if self.publisher:
+                stats["publisher"] = self.publisher.snapshot()
+        return stats
+
+    def queue_snapshot(self):
+        """Depth and drop counts of every queue between stages, by name."""
+        queues = {"process": self.process_queue.snapshot()}
+        for output_format, sink in zip(self.config.get("output_formats", ["csv"]),
+                                       self.data_sinks):
+            queues[output_format] = sink.queue.snapshot()
+        return queues
+
+    def perf_summary(self):
+        """Text summary of the stage timings, queues and pacing, for the GUI."""
+        summary = self.perf.summary()
+        summary += "\nQueues: " + "   ".join(
+            f"{name} {q['depth']}/{q['max_blocks']} (peak {q['max_depth']}, "
+            f"{q['dropped_rows']} dropped)"
+            for name, q in self.queue_snapshot().items()
+        )
+        if self.scheduler:
+            s = self.scheduler
+            summary += (
+                f"\nTarget rate: {s.rate:g} /s   Missed deadlines: {s.missed_deadlines}   "
+                f"Resyncs: {s.resyncs}   Start lateness p99: {s.lateness.percentile(99) / 1e3:,.1f} us"
+            )
+        return summary
@@ -0,0 +1,77 @@
+import threading
+import numpy as np
+
+class SampleRingBuffer:
+    """
+    A fixed-size ring of (timestamp, raw, filtered) samples shared between
+    the acquisition thread and the GUI.
+
+    The worker writes whole blocks; the GUI drains everything new once per
+    frame. If the GUI falls more than `capacity` samples behind, the oldest
+    unread samples are overwritten and counted in `dropped_samples`.
+
+    With n_channels set, raw and filtered hold one column per channel.
+    """
+    def __init__(self, capacity=65536, n_channels=None):
+        self.capacity = int(capacity)
+        value_shape = (self.capacity,) if n_channels is None else (self.capacity, n_channels)
+        self.timestamps = np.zeros(self.capacity, dtype=np.int64) # ns since the epoch
+        self.raw = np.zeros(value_shape)
+        self.filtered = np.zeros(value_shape)
+
+        self._lock = threading.Lock()
+        self._written = 0 # Total samples ever written
+        self._read = 0 # Total samples ever drained
+        self.dropped_samples = 0
+
+    def write(self, timestamps, raw, filtered):
+        """Appends a block of samples. Called from the acquisition thread."""
+        total = len(raw)
+        if total == 0:
+            return
+        # A block larger than the ring only keeps its newest samples
+        timestamps = np.asarray(timestamps)[-self.capacity:]
+        raw = np.asarray(raw)[-self.capacity:]
+        filtered = np.asarray(filtered)[-self.capacity:]
+        n = len(raw)
+
+        with self._lock:
+            start = (self._written + total - n) % self.capacity
+            first = min(n, self.capacity - start)
+            for target, source in ((self.timestamps, timestamps),
+                                   (self.raw, raw),
+                                   (self.filtered, filtered)):
+                target[start:start + first] = source[:first]
+                target[:n - first] = source[first:]
+            self._written += total
+
+            # Unread samples we just overwrote are lost
+            overrun = self._written - self._read - self.capacity
+            if overrun > 0:
+                self.dropped_samples += overrun
+                self._read += overrun
+
+    def drain(self):
+        """
+        Returns copies of all samples written since the last drain, as
+        (timestamps, raw, filtered). Called from the GUI thread.
+        """
+        with self._lock:
+            n = self._written - self._read
+            indices = (self._read + np.arange(n)) % self.capacity
+            self._read = self._written
+            return (self.timestamps[indices],
+                    self.raw[indices],
+                    self.filtered[indices])
+
+    @property
+    def depth(self):
+        """Number of samples waiting to be drained."""
+        with self._lock:
+            return self._written - self._read
+
+    def clear(self):
+        """Discards anything not yet drained and resets the counters."""
+        with self._lock:
+            self._read = self._written
+            self.dropped_samples = 0
@@ -0,0 +1,72 @@
+import time
+from dacdaq.core.perf import StageTimer
+
+class DeadlineScheduler:
+    """
+    Paces reads to a target sample rate against absolute deadlines.
+
+    Each read is given a deadline; the next one is that deadline plus
+    (samples read) / rate, not "now + period", so sleep overshoot and
+    read-time variation don't accumulate into drift. A read that starts
+    after its deadline counts as a missed deadline; the following reads
+    then run back to back to catch up. Once more than max_lag seconds
+    behind, the schedule restarts from now instead (a resync), so a
+    stall doesn't trigger a burst of catch-up reads.
+
+    Waiting is split into an interruptible sleep, so stop and pause
+    still take effect immediately, and a short busy-wait for the last
+    spin_us microseconds, which OS timers can't hit reliably.
+    """
+    def __init__(self, rate, max_lag=0.1, spin_us=200):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.period_ns = 1e9 / self.rate # Per sample
+        self.max_lag_ns = max_lag * 1e9
+        self.spin_ns = spin_us * 1000
+        self.deadline = None
+        self.missed_deadlines = 0
+        self.resyncs = 0
+        self.lateness = StageTimer() # How late each read started
+
+    def reset(self):
+        """Restarts the schedule from now, e.g. after a pause."""
+        self.deadline = time.perf_counter_ns()
+
+    def wait(self, sleep):
+        """
+        Waits for the next deadline. sleep(seconds) should block for up
+        to that long and return True if woken early by a stop/pause
+        request. Returns True if interrupted, False on the deadline.
+        """
+        if self.deadline is None:
+            self.reset()
+        clock = time.perf_counter_ns
+        remaining = self.deadline - clock()
+        if remaining > self.spin_ns:
+            if sleep((remaining - self.spin_ns) / 1e9):
+                return True
+        while clock() < self.deadline:
+            pass
+        return False
+
+    def completed(self, start_ns, n_samples):
+        """Schedules the next read after one that started at start_ns and returned n_samples."""
+        late = start_ns - self.deadline
+        self.lateness.record(int(max(0, late)))
+        # An empty read still waits one sample period before trying again
+        self.deadline += max(1, n_samples) * self.period_ns
+        behind = time.perf_counter_ns() - self.deadline
+        if behind > 0:
+            self.missed_deadlines += 1
+            if behind > self.max_lag_ns:
+                self.resyncs += 1
+                self.deadline = time.perf_counter_ns()
+
+    def snapshot(self):
+        return {
+            "target_rate": self.rate,
+            "missed_deadlines": self.missed_deadlines,
+            "resyncs": self.resyncs,
+            "lateness": self.lateness.snapshot(),
+        }
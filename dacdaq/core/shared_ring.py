@@ -0,0 +1,222 @@
+import json
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+
+MAGIC = 0x31524D4851414344 # "DCAQHMR1"
+VERSION = 1
+HEADER_DTYPE = np.dtype([
+    ("magic", "<i8"),
+    ("version", "<i8"),
+    ("capacity", "<i8"),
+    ("n_channels", "<i8"), # 0 for a single-channel run
+    ("claimed", "<i8"),    # Samples written once the block being written is done
+    ("written", "<i8"),    # Samples completely written
+    ("state", "<i8"),
+    ("metadata_bytes", "<i8"),
+])
+HEADER_BYTES = 64
+METADATA_BYTES = 4096 # JSON: channels, instrument name, start time
+RUNNING, CLOSED = 1, 2
+
+
+def _attach(name):
+    """Opens an existing segment without this process taking ownership of it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False) # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        # Otherwise the resource tracker unlinks it when this process exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _is_running(shm):
+    """True if shm holds a ring whose run hasn't closed it."""
+    if shm.size < HEADER_BYTES:
+        return False
+    header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+    try:
+        return (int(header["magic"]) == MAGIC and int(header["version"]) == VERSION
+                and int(header["state"]) == RUNNING)
+    finally:
+        del header # Release the view so shm can be closed
+
+
+class SharedSampleRing:
+    """
+    A ring of the newest (timestamp, raw, filtered) samples in a named
+    multiprocessing.shared_memory segment, so Python processes on this PC
+    can read the live data with no copying and no serialisation.
+
+    The acquisition writes with create() and write_block(); readers
+    attach(name) and call latest(n) or since(cursor), which return NumPy
+    views straight into the segment. Every sample is stored twice,
+    capacity apart, so the newest samples are always one contiguous
+    slice.
+
+    There are no locks between processes. Two counters make torn reads
+    detectable instead: the writer raises `claimed` before it overwrites
+    any slots and `written` once the block is complete. A view returned
+    for samples from start on is only trustworthy while overwritten(start)
+    is 0, so check it after using (or copying) the data; since() also
+    reports samples that were overwritten before they were read.
+    """
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.name = shm.name
+        self.owner = owner
+        self._header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        if self._header["magic"] != MAGIC or self._header["version"] != VERSION:
+            raise ValueError(f"{shm.name} is not a DacDAQ sample ring")
+        self.capacity = int(self._header["capacity"])
+        n_channels = int(self._header["n_channels"])
+        size = int(self._header["metadata_bytes"])
+        self.metadata = json.loads(bytes(shm.buf[HEADER_BYTES:HEADER_BYTES + size]) or b"{}")
+        self.channels = self.metadata.get("channels")
+
+        slots = 2 * self.capacity
+        value_shape = (slots,) if n_channels == 0 else (slots, n_channels)
+        offset = HEADER_BYTES + METADATA_BYTES
+        self._timestamps = np.ndarray(slots, dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self._timestamps.nbytes
+        self._raw = np.ndarray(value_shape, dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self._raw.nbytes
+        self._filtered = np.ndarray(value_shape, dtype=np.float64, buffer=shm.buf, offset=offset)
+        if not owner:
+            for array in (self._timestamps, self._raw, self._filtered):
+                array.flags.writeable = False
+
+    @staticmethod
+    def nbytes(capacity, n_channels=0):
+        """Size of the shared memory segment for a ring of capacity samples."""
+        return HEADER_BYTES + METADATA_BYTES + 2 * capacity * 8 * (1 + 2 * max(n_channels, 1))
+
+    @classmethod
+    def create(cls, name="dacdaq", capacity=1 << 20, channels=None, metadata=None):
+        """
+        Creates the ring for writing. A segment of the same name is only
+        replaced if it isn't a ring or its run has closed it; one still
+        marked running raises FileExistsError, so a second acquisition
+        can't cut off the first one's readers. (A run that crashed leaves
+        its ring marked running: remove it by hand, e.g. from /dev/shm.)
+        """
+        n_channels = len(channels) if channels else 0
+        size = cls.nbytes(capacity, n_channels)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            existing = _attach(name)
+            try:
+                running = _is_running(existing)
+                if not running:
+                    existing.unlink()
+            finally:
+                existing.close()
+            if running:
+                raise FileExistsError(f"Shared memory ring '{name}' is in use by a running acquisition")
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        metadata = json.dumps(dict(metadata or {}, channels=channels)).encode()
+        if len(metadata) > METADATA_BYTES:
+            raise ValueError("Ring metadata too large")
+        shm.buf[HEADER_BYTES:HEADER_BYTES + len(metadata)] = metadata
+        header = np.ndarray((), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header[()] = (MAGIC, VERSION, capacity, n_channels, 0, 0, RUNNING, len(metadata))
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name="dacdaq"):
+        """Opens the ring of a running acquisition for reading."""
+        return cls(_attach(name), owner=False)
+
+    @property
+    def written(self):
+        """Samples written since the ring was created."""
+        return int(self._header["written"])
+
+    @property
+    def running(self):
+        """False once the acquisition has closed the ring."""
+        return int(self._header["state"]) == RUNNING
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """Appends a block of samples, overwriting the oldest."""
+        total = len(timestamps)
+        if total == 0:
+            return
+        cap = self.capacity
+        # A block larger than the ring only keeps its newest samples
+        timestamps = np.asarray(timestamps)[-cap:]
+        raw_data = np.asarray(raw_data)[-cap:]
+        filtered_data = np.asarray(filtered_data)[-cap:]
+        n = len(timestamps)
+
+        written = int(self._header["written"])
+        self._header["claimed"] = written + total # Before any slot changes
+        pos = (written + total - n) % cap
+        first = min(n, cap - pos)
+        for target, source in ((self._timestamps, timestamps),
+                               (self._raw, raw_data),
+                               (self._filtered, filtered_data)):
+            for offset in (0, cap):
+                target[offset + pos:offset + pos + first] = source[:first]
+                target[offset:offset + n - first] = source[first:]
+        self._header["written"] = written + total
+
+    def _window(self, written, n):
+        end = written % self.capacity + self.capacity
+        return (self._timestamps[end - n:end],
+                self._raw[end - n:end],
+                self._filtered[end - n:end])
+
+    def latest(self, n):
+        """
+        The newest n samples (or fewer, if not that many have been
+        written) as (start, timestamps, raw, filtered): views into
+        shared memory, start being the number of the first sample.
+        """
+        written = self.written
+        n = max(0, min(int(n), written, self.capacity))
+        return (written - n,) + self._window(written, n)
+
+    def since(self, cursor):
+        """
+        The samples written since sample number cursor (e.g. the previous
+        call's start plus the number of samples it returned), as (start,
+        timestamps, raw, filtered, lost). lost counts samples after
+        cursor that were overwritten before this call and so are missing.
+        """
+        written = self.written
+        n = max(0, min(written - cursor, self.capacity))
+        start = written - n
+        return (start,) + self._window(written, n) + (max(0, start - cursor),)
+
+    def overwritten(self, start):
+        """
+        How many samples from sample number start on have been, or are
+        being, overwritten. Views from latest() or since() that began at
+        start are intact while this is 0.
+        """
+        return max(0, int(self._header["claimed"]) - self.capacity - start)
+
+    def close(self):
+        """
+        Detaches from the ring. The writer marks it closed and removes the
+        segment; readers that still have it open keep their mapping. Any
+        views taken from the ring must be released first.
+        """
+        if self.shm is None:
+            return
+        if self.owner:
+            self._header["state"] = CLOSED
+        del self._header, self._timestamps, self._raw, self._filtered
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
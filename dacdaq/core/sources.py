@@ -0,0 +1,309 @@
+import threading
+import time
+import numpy as np
+from dacdaq.core.clock import default_clock
+from dacdaq.inputs import AVAILABLE_INSTRUMENTS
+
+class InstrumentSource:
+    """
+    Reads blocks from a single instrument on the calling thread.
+    Values are 1-D, one per sample, unless the instrument declares
+    channels, in which case they have a column per channel.
+    """
+    def __init__(self, instrument, clock=default_clock):
+        self.instrument = instrument
+        self.instrument.clock = clock
+        self.labels = instrument_labels(instrument) # None for one unnamed channel
+
+    def get_name(self):
+        return self.instrument.get_name()
+
+    def open(self):
+        return self.instrument.connect_instrument()
+
+    def read(self):
+        """Returns (timestamps, values) for whatever the instrument has ready."""
+        return self.instrument.read_available()
+
+    def pause(self):
+        pass
+
+    def resume(self):
+        pass
+
+    def close(self):
+        self.instrument.close()
+
+
+class TimeAlignedMerger:
+    """
+    Merges sample streams from several instruments into one table on the
+    timestamps of a reference stream (the first instrument). Timestamps
+    are int64 nanoseconds from clock, which the instruments must share.
+
+    A reference row is released once every other stream has a sample at
+    or after its time, so its neighbours on both sides are known. Rows
+    older than max_lag seconds are released anyway, so a slow or stalled
+    instrument can't hold up the run. Each other stream is joined with
+    either:
+      - "nearest": the closest sample in time (NaN if further away than
+        tolerance seconds, when given)
+      - "interpolate": linear interpolation between neighbouring samples,
+        holding the last value past the end of a stream
+
+    widths gives the number of channels (columns) of each stream, 1 for
+    all of them by default. Every channel of a stream is joined at once.
+    """
+    METHODS = ("nearest", "interpolate")
+
+    def __init__(self, n_streams, method="nearest", max_lag=2.0, tolerance=None,
+                 clock=default_clock, widths=None):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown merge method: {method}")
+        self.n_streams = n_streams
+        self.widths = list(widths) if widths else [1] * n_streams
+        self.n_columns = sum(self.widths)
+        self.method = method
+        self.max_lag_ns = round(float(max_lag) * 1e9)
+        self.tolerance_ns = None if tolerance is None else round(float(tolerance) * 1e9)
+        self.clock = clock
+        self.times = [np.empty(0, dtype=np.int64) for _ in range(n_streams)]
+        self.values = [np.empty((0, width)) for width in self.widths]
+        self.condition = threading.Condition()
+
+    def add(self, stream, timestamps, values):
+        """Adds a block from one stream. Called from the poller threads."""
+        if len(values) == 0:
+            return
+        values = np.asarray(values, dtype=np.float64).reshape(len(values), -1)
+        with self.condition:
+            self.times[stream] = np.concatenate((self.times[stream], timestamps))
+            self.values[stream] = np.concatenate((self.values[stream], values))
+            self.condition.notify_all()
+
+    def _align(self, t, times, values):
+        """values (one row per entry of times) joined onto the times t."""
+        if len(times) == 0:
+            return np.full((len(t), values.shape[1]), np.nan)
+        if self.method == "interpolate":
+            # np.interp is 1-D only; weigh the neighbouring rows instead.
+            # Integer differences keep nanosecond resolution.
+            right = np.searchsorted(times, t, side='right')
+            left = np.clip(right - 1, 0, len(times) - 1)
+            right = np.clip(right, 0, len(times) - 1)
+            span = times[right] - times[left]
+            weight = np.divide(t - times[left], span, out=np.zeros(len(t)), where=span > 0)
+            aligned = values[left] + weight[:, None] * (values[right] - values[left])
+            aligned[t < times[0]] = np.nan
+            return aligned
+
+        right = np.clip(np.searchsorted(times, t), 0, len(times) - 1)
+        left = np.clip(right - 1, 0, len(times) - 1)
+        use_left = np.abs(t - times[left]) <= np.abs(times[right] - t)
+        nearest = np.where(use_left, left, right)
+        aligned = values[nearest]
+        if self.tolerance_ns is not None:
+            close = np.abs(times[nearest] - t) <= self.tolerance_ns
+            aligned = np.where(close[:, None], aligned, np.nan)
+        return aligned
+
+    def pop(self, timeout=0.1):
+        """
+        Waits up to timeout seconds for new data, then returns every
+        reference row that can be released as (timestamps, values), with
+        values shaped (n, n_columns): each stream's channels in turn.
+        """
+        with self.condition:
+            t, merged = self._release()
+            if len(t) == 0:
+                self.condition.wait(timeout)
+                t, merged = self._release()
+            return t, merged
+
+    def _release(self):
+        """Joins and removes the releasable reference rows. Caller holds the lock."""
+        ref_times = self.times[0]
+        if len(ref_times) == 0:
+            return ref_times, np.empty((0, self.n_columns))
+        # Ints throughout: a float cutoff would round away the nanoseconds
+        if self.n_streams > 1 and all(len(t) for t in self.times[1:]):
+            ready_until = min(int(t[-1]) for t in self.times[1:])
+        elif self.n_streams > 1:
+            ready_until = None
+        else:
+            ready_until = int(ref_times[-1])
+        cutoff = self.clock.now_ns() - self.max_lag_ns
+        if ready_until is not None:
+            cutoff = max(cutoff, ready_until)
+        n = int(np.searchsorted(ref_times, cutoff, side='right'))
+        if n == 0:
+            return ref_times[:0], np.empty((0, self.n_columns))
+
+        t = ref_times[:n]
+        merged = np.empty((n, self.n_columns))
+        bounds = np.cumsum([0] + self.widths)
+        merged[:, :bounds[1]] = self.values[0][:n]
+        for j in range(1, self.n_streams):
+            merged[:, bounds[j]:bounds[j + 1]] = self._align(t, self.times[j], self.values[j])
+
+        # Drop what has been used, keeping one sample of each other
+        # stream before the next reference row for the next join
+        self.times[0] = ref_times[n:]
+        self.values[0] = self.values[0][n:]
+        for j in range(1, self.n_streams):
+            keep = max(0, int(np.searchsorted(self.times[j], t[-1], side='right')) - 1)
+            self.times[j] = self.times[j][keep:]
+            self.values[j] = self.values[j][keep:]
+        return t, merged
+
+
+class InstrumentPoller(threading.Thread):
+    """
+    Reads one instrument on its own thread at its own rate and feeds the
+    blocks into a TimeAlignedMerger. rate is in reads per second; None
+    reads as fast as the instrument returns.
+    """
+    def __init__(self, instrument, stream, merger, rate=None):
+        super().__init__(name=f"poller-{instrument.get_name()}", daemon=True)
+        self.instrument = instrument
+        self.stream = stream
+        self.merger = merger
+        self.period = 1.0 / rate if rate else 0.0
+        self.stop_event = threading.Event()
+        self.run_event = threading.Event() # Cleared while paused
+        self.run_event.set()
+        self.error = None
+
+    def run(self):
+        next_read = time.monotonic()
+        try:
+            while not self.stop_event.is_set():
+                if not self.run_event.wait(0.1):
+                    next_read = time.monotonic()
+                    continue
+                timestamps, values = self.instrument.read_available()
+                self.merger.add(self.stream, timestamps, values)
+                if self.period:
+                    next_read += self.period
+                    self.stop_event.wait(max(0.0, next_read - time.monotonic()))
+        except Exception as e:
+            print(f"Error polling {self.instrument.get_name()}: {e}")
+            self.error = e
+
+
+class MultiInstrumentSource:
+    """
+    Runs several instruments concurrently, each on its own poller thread,
+    and delivers their readings as one timestamp-aligned table with one
+    column per instrument, or per channel of instruments that have them.
+
+    Built from the "instruments" config list, e.g.
+        [{"name": "Keithley 2000 (VISA)", "label": "Sample", "rate": null},
+         {"name": "Simulated Instrument (Random)", "label": "Thermometer",
+          "rate": 1.0, "settings": {}}]
+    The first instrument is the timing reference.
+    """
+    def __init__(self, specs, method="nearest", max_lag=2.0, tolerance=None,
+                 clock=default_clock):
+        self.specs = specs
+        self.instruments = [
+            AVAILABLE_INSTRUMENTS[spec["name"]](**spec.get("settings", {}))
+            for spec in specs
+        ]
+        for instrument in self.instruments:
+            instrument.clock = clock
+        self.labels = _merged_labels(specs, self.instruments)
+        widths = [len(instrument.channels or [None]) for instrument in self.instruments]
+        self.merger = TimeAlignedMerger(len(specs), method, max_lag, tolerance, clock, widths)
+        self.pollers = []
+
+    def get_name(self):
+        return ", ".join(instrument.get_name() for instrument in self.instruments)
+
+    def open(self):
+        """Connects every instrument, then starts the pollers."""
+        for instrument in self.instruments:
+            if not instrument.connect_instrument():
+                print(f"Failed to connect to {instrument.get_name()}")
+                return False
+        self.pollers = [
+            InstrumentPoller(instrument, i, self.merger, spec.get("rate"))
+            for i, (instrument, spec) in enumerate(zip(self.instruments, self.specs))
+        ]
+        for poller in self.pollers:
+            poller.start()
+        return True
+
+    def read(self):
+        """Returns the next aligned (timestamps, values) block."""
+        for poller in self.pollers:
+            if poller.error is not None:
+                raise IOError(f"{poller.instrument.get_name()} failed: {poller.error}")
+        return self.merger.pop()
+
+    def pause(self):
+        for poller in self.pollers:
+            poller.run_event.clear()
+
+    def resume(self):
+        for poller in self.pollers:
+            poller.run_event.set()
+
+    def close(self):
+        for poller in self.pollers:
+            poller.stop_event.set()
+            poller.run_event.set()
+        for poller in self.pollers:
+            poller.join()
+        for instrument in self.instruments:
+            instrument.close()
+
+
+def instrument_labels(instrument):
+    """An instrument's channel names, or None for one unnamed channel."""
+    return list(instrument.channels) if instrument.channels else None
+
+
+def _merged_labels(specs, instruments):
+    """One label per instrument, or "label channel" for each channel of one with channels."""
+    labels = []
+    for spec, instrument in zip(specs, instruments):
+        label = spec.get("label", spec["name"])
+        if instrument.channels:
+            labels += [f"{label} {channel}" for channel in instrument.channels]
+        else:
+            labels.append(label)
+    return labels
+
+
+def channel_labels(config):
+    """
+    Column labels for a run: one per entry of the "instruments" config
+    list (or per channel of those instruments that have channels), the
+    channel names of a single instrument_class that declares them, or
+    None for a classic single-channel run. The instruments are created
+    from their settings to ask, but not connected.
+    """
+    specs = config.get("instruments")
+    if specs:
+        instruments = [AVAILABLE_INSTRUMENTS[spec["name"]](**spec.get("settings", {}))
+                       for spec in specs]
+        return _merged_labels(specs, instruments)
+    instrument_class = config.get("instrument_class")
+    if instrument_class is None:
+        return None
+    return instrument_labels(instrument_class(**config.get("instrument_settings", {})))
+
+
+def create_source(instrument_class, config, clock=default_clock):
+    """
+    Builds the data source for a run: every instrument in the
+    "instruments" config list if there is one, otherwise a single
+    instrument_class using the optional "instrument_settings". Every
+    instrument timestamps its readings from clock.
+    """
+    specs = config.get("instruments")
+    if specs:
+        return MultiInstrumentSource(specs, clock=clock, **config.get("merge_settings", {}))
+    settings = config.get("instrument_settings", {})
+    return InstrumentSource(instrument_class(**settings), clock)
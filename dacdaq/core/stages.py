@@ -0,0 +1,196 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+
+class BoundedQueue:
+    """
+    A bounded FIFO of blocks between two pipeline stages.
+
+    What put() does when the queue is full is set by overflow:
+      - "block": wait for space, for up to put_timeout seconds (None
+        waits indefinitely), then drop the new block
+      - "drop_newest": drop the new block straight away
+      - "drop_oldest": drop the oldest queued block to make room
+    Every full queue is counted in full_events and every lost block in
+    dropped_blocks/dropped_rows. on_overflow(event, queue) is called on
+    the putting thread with "backpressure" when put() has to wait and
+    "queue_full" when a block is dropped.
+
+    close() wakes the consumer, which gets whatever is still queued and
+    then an empty batch with finished set.
+    """
+    OVERFLOW_POLICIES = ("block", "drop_newest", "drop_oldest")
+
+    def __init__(self, max_blocks=256, overflow="block", put_timeout=None,
+                 on_overflow=None):
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.max_blocks = max(1, int(max_blocks))
+        self.overflow = overflow
+        self.put_timeout = put_timeout
+        self.on_overflow = on_overflow
+
+        self._items = deque() # (rows, block) pairs
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._closed = False
+
+        self.max_depth = 0 # High-water mark
+        self.full_events = 0
+        self.dropped_blocks = 0
+        self.dropped_rows = 0
+
+    @property
+    def depth(self):
+        """Blocks waiting to be taken."""
+        return len(self._items)
+
+    @property
+    def finished(self):
+        """True once closed and drained."""
+        with self._lock:
+            return self._closed and not self._items
+
+    def put(self, block, rows=1):
+        """Queues a block of rows. Returns False if it was dropped."""
+        event = None
+        with self._lock:
+            if self._closed:
+                raise ValueError("put() on a closed queue")
+            if len(self._items) >= self.max_blocks:
+                self.full_events += 1
+                if self.overflow == "drop_oldest":
+                    old_rows, _ = self._items.popleft()
+                    self._drop(old_rows)
+                    event = "queue_full"
+                elif self.overflow == "drop_newest":
+                    self._drop(rows)
+                    block = None
+                    event = "queue_full"
+                else:
+                    self._report("backpressure")
+                    if not self._not_full.wait_for(
+                        lambda: len(self._items) < self.max_blocks or self._closed,
+                        self.put_timeout
+                    ) or self._closed:
+                        self._drop(rows)
+                        block = None
+                        event = "queue_full"
+            if block is not None:
+                self._items.append((rows, block))
+                self.max_depth = max(self.max_depth, len(self._items))
+                self._not_empty.notify()
+            if event:
+                self._report(event)
+        return block is not None
+
+    def _drop(self, rows):
+        self.dropped_blocks += 1
+        self.dropped_rows += rows
+
+    def _report(self, event):
+        # Called with the lock held; the callback must not touch the queue
+        if self.on_overflow:
+            self.on_overflow(event, self)
+
+    def get_batch(self, timeout=None):
+        """
+        Waits up to timeout seconds for a block, then takes everything
+        queued. Returns a list of blocks, empty on timeout or once closed
+        and drained.
+        """
+        with self._lock:
+            self._not_empty.wait_for(lambda: self._items or self._closed, timeout)
+            batch = [block for _, block in self._items]
+            self._items.clear()
+            self._not_full.notify_all()
+            return batch
+
+    def close(self):
+        """No more puts; lets the consumer finish what is queued."""
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+
+    def snapshot(self):
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "max_blocks": self.max_blocks,
+            "overflow": self.overflow,
+            "full_events": self.full_events,
+            "dropped_blocks": self.dropped_blocks,
+            "dropped_rows": self.dropped_rows,
+        }
+
+
+def concatenate_blocks(blocks):
+    """Joins a batch of (timestamps, raw) blocks into one."""
+    if len(blocks) == 1:
+        return blocks[0]
+    return (np.concatenate([b[0] for b in blocks]),
+            np.concatenate([b[1] for b in blocks]))
+
+
+class ProcessingStage(threading.Thread):
+    """
+    The middle of the pipeline: takes raw (timestamps, values) blocks off
+    in_queue, runs them through the filter chain and hands the results to
+    every sink and to the plot buffer.
+
+    Runs on its own thread, so filtering and the fan-out never hold up
+    the instrument reads. Whatever has queued up since the last pass is
+    filtered as one block. The "filter", "write" and "plot" stages of
+    perf are timed here, and with profile (a cProfile.Profile) the whole
+    thread runs under it. Exits once in_queue is closed and drained; an
+    exception is kept in self.error.
+    """
+    def __init__(self, in_queue, processor, sinks, plot_buffer=None, perf=None,
+                 profile=None):
+        super().__init__(name="processing", daemon=True)
+        self.in_queue = in_queue
+        self.processor = processor
+        self.sinks = sinks
+        self.plot_buffer = plot_buffer
+        self.perf = perf
+        self.profile = profile
+        self.error = None
+
+    def run(self):
+        clock = time.perf_counter_ns
+        perf = self.perf
+        if self.profile:
+            self.profile.enable()
+        try:
+            while True:
+                batch = self.in_queue.get_batch(timeout=0.1)
+                if not batch:
+                    if self.in_queue.finished:
+                        break
+                    continue
+                timestamps, raw_block = concatenate_blocks(batch)
+
+                t_start = clock()
+                filtered_block = self.processor.process_block(raw_block)
+                t_filter = clock()
+                for sink in self.sinks:
+                    sink.write_block(timestamps, raw_block, filtered_block)
+                t_write = clock()
+                if self.plot_buffer is not None:
+                    self.plot_buffer.write(timestamps, raw_block, filtered_block)
+                t_end = clock()
+
+                if perf:
+                    perf.record("filter", t_filter - t_start)
+                    perf.record("write", t_write - t_filter)
+                    perf.record("plot", t_end - t_write)
+        except Exception as e:
+            print(f"Error in processing thread: {e}")
+            self.error = e
+            self.in_queue.close() # Wakes a reader blocked on a full queue
+        finally:
+            if self.profile:
+                self.profile.disable()
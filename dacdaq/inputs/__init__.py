@@ -0,0 +1,8 @@
+from .catalog import BUILTIN_INSTRUMENTS
+from .registry import InstrumentRegistry
+
+# Name -> instrument class. Listing the names imports no drivers; looking
+# one up imports just that driver (and e.g. pyvisa only for the Keithley).
+AVAILABLE_INSTRUMENTS = InstrumentRegistry()
+for _entry in BUILTIN_INSTRUMENTS:
+    AVAILABLE_INSTRUMENTS.add_entry(_entry)
@@ -1,12 +1,29 @@
-from PyQt6.QtCore import QObject
+import numpy as np
+from dacdaq.core.clock import default_clock
 
-class BaseInstrument(QObject):
+class BaseInstrument:
     """
     An abstract base class for all instruments.
-    It inherits from QObject so it can be moved to a thread.
+    Instruments are plain objects with no Qt dependency, so they can be
+    used from the GUI worker thread or the headless command line alike.
+
+    Subclasses describe themselves with class attributes, so the plugin
+    registry can list them without creating instances.
+
+    An instrument that measures several channels declares them in
+    self.channels, a list of names, set from its settings in __init__ so
+    a run can lay out its files and plots before connecting. Its values
+    then have one column per channel, shaped (n, len(channels)); with
+    channels None they are 1-D, one value per sample.
     """
+    NAME = "Base Instrument"
+    CAPABILITIES = () # e.g. ("burst", "block_read")
+    channels = None # Channel names, or None for one unnamed channel
+    # Timestamps come from this RunClock; the pipeline sets its own run clock
+    clock = default_clock
+
     def __init__(self):
-        super().__init__()
+        pass
     
     def connect_instrument(self):
         """Connect to the hardware. Returns True on success."""
@@ -16,10 +33,49 @@ class BaseInstrument(QObject):
         """Read a single value from the instrument."""
         raise NotImplementedError
 
+    def read_scan(self):
+        """
+        Read every channel once, as one float64 value per channel.
+        Multi-channel instruments implement this (or read_block()).
+        """
+        raise NotImplementedError
+
+    def read_block(self, n):
+        """
+        Read n values from the instrument.
+        Returns (timestamps, values): timestamps as int64 nanoseconds
+        since the epoch from self.clock, taken as each reading returns,
+        and values as float64, shaped (n, len(channels)) when the
+        instrument has channels.
+
+        The default calls read_voltage() (or read_scan()) n times, so
+        plugins that only implement the single-reading method keep
+        working. Instruments that can buffer readings should override this.
+        """
+        timestamps = np.empty(n, dtype=np.int64)
+        if self.channels:
+            values = np.empty((n, len(self.channels)), dtype=np.float64)
+            read = self.read_scan
+        else:
+            values = np.empty(n, dtype=np.float64)
+            read = self.read_voltage
+        now_ns = self.clock.now_ns
+        for i in range(n):
+            values[i] = read()
+            timestamps[i] = now_ns()
+        return timestamps, values
+
+    def read_available(self):
+        """
+        Read whatever the instrument has ready, as (timestamps, values).
+        The default reads a single value.
+        """
+        return self.read_block(1)
+
     def close(self):
         """Disconnect from the hardware."""
         raise NotImplementedError
 
     def get_name(self):
         """Return a human-readable name for the instrument."""
-        return "Base Instrument"
\ No newline at end of file
+        return self.NAME
@@ -0,0 +1,23 @@
+from .registry import InstrumentEntry
+
+# The built-in instruments: the one place their display names,
+# capabilities and descriptions are written down. Each driver class takes
+# its NAME and CAPABILITIES from its entry here, and the registry lists
+# these entries without importing any driver.
+SIMULATED = InstrumentEntry(
+    "Simulated Instrument (Random)", "dacdaq.inputs.simulated:SimulatedInstrument",
+    capabilities=("simulated", "block_read"),
+    description="Random-walk test signal at 20 samples/s",
+)
+KEITHLEY_2000 = InstrumentEntry(
+    "Keithley 2000 (VISA)", "dacdaq.inputs.keithley2000:Keithley2000",
+    capabilities=("visa", "burst", "binary_transfer", "nplc", "scan"),
+    description="Keithley 2000 multimeter over GPIB/serial/USB",
+)
+SYNTHETIC = InstrumentEntry(
+    "Synthetic Instrument (Configurable Rate)", "dacdaq.inputs.synthetic:SyntheticInstrument",
+    capabilities=("simulated", "block_read", "deterministic"),
+    description="Seeded sine + noise at any rate, optionally without sleeping",
+)
+
+BUILTIN_INSTRUMENTS = (SIMULATED, KEITHLEY_2000, SYNTHETIC)
@@ -1,5 +1,6 @@
-import pyvisa
+import numpy as np
 from .base import BaseInstrument
+from .catalog import KEITHLEY_2000
 
 # NOTE: You may need to install a "backend" for pyvisa, e.g.:
 # pip install pyvisa-py (for serial/USB) or NI-VISA (for GPIB)
@@ -11,30 +12,88 @@ class Keithley2000(BaseInstrument):
     
     Change the VISA_ADDRESS to match your instrument's connection.
     Find it using the 'NI MAX' tool or similar.
+
+    With burst_size > 0 the meter runs in burst mode: each call fills
+    the internal :TRACE buffer with burst_size readings and pulls the
+    whole buffer back as binary floats in a single transfer, instead
+    of one :READ? round trip per reading.
+
+    With scan_channels set (e.g. [1, 2, 3]) the meter scans those
+    channels of a Model 2000-SCAN card using its internal scan list, so a
+    whole scan (or burst_size // len(scan_channels) scans) comes back in
+    one binary transfer rather than one query per channel. The channels
+    are named by channel_names, or "CH1", "CH2", ... by default.
     """
+    NAME = KEITHLEY_2000.name
+    CAPABILITIES = KEITHLEY_2000.capabilities
+
     # Example: 'GPIB0::16::INSTR' or 'ASRL/dev/ttyUSB0::INSTR'
     VISA_ADDRESS = "GPIB0::16::INSTR" 
 
-    def __init__(self):
+    # The :TRACE buffer holds at most 1024 readings
+    MAX_BUFFER_SIZE = 1024
+
+    # Settings used by fast=True. Together with a fixed range these let
+    # the meter run close to its rated ~2000 readings per second.
+    FAST_NPLC = 0.01
+
+    # The Model 2000-SCAN card has 10 channels
+    MAX_SCAN_CHANNELS = 10
+
+    def __init__(self, visa_address=None, nplc=1.0, burst_size=0,
+                 voltage_range=None, autozero=True, display=True, fast=False,
+                 scan_channels=None, channel_names=None):
         super().__init__()
         self.rm = None
         self.instrument = None
-    
-    def get_name(self):
-        return "Keithley 2000 (VISA)"
 
+        self.visa_address = visa_address or self.VISA_ADDRESS
+        self.nplc = float(nplc)
+        self.burst_size = min(int(burst_size), self.MAX_BUFFER_SIZE)
+        self.voltage_range = voltage_range # None means autorange
+        self.autozero = autozero
+        self.display = display
+        if fast:
+            self.nplc = self.FAST_NPLC
+            self.autozero = False
+            self.display = False
+
+        self.scan_channels = [int(c) for c in scan_channels] if scan_channels else None
+        if self.scan_channels:
+            invalid = [c for c in self.scan_channels if not 1 <= c <= self.MAX_SCAN_CHANNELS]
+            if invalid:
+                raise ValueError(f"Scanner channels must be 1-{self.MAX_SCAN_CHANNELS}: {invalid}")
+            if channel_names and len(channel_names) != len(self.scan_channels):
+                raise ValueError("channel_names needs one name per scan channel")
+            self.channels = list(channel_names or (f"CH{c}" for c in self.scan_channels))
+            # Whole scans only, at least one per buffer fill
+            n = len(self.scan_channels)
+            self.buffer_size = max(1, self.burst_size // n) * n
+        else:
+            self.buffer_size = self.burst_size # Readings per buffer fill, 0 for none
+
+        # Readings from the last burst not yet handed out by read_block()
+        self._pending_times = np.empty(0, dtype=np.int64)
+        self._pending_values = np.empty((0, len(self.channels)) if self.channels else 0)
+    
     def connect_instrument(self):
         """Tries to connect to the instrument at the specified VISA address."""
-        print(f"Connecting to {self.get_name()} at {self.VISA_ADDRESS}...")
+        print(f"Connecting to {self.get_name()} at {self.visa_address}...")
         try:
+            # Imported here so pyvisa only loads when a Keithley is used
+            import pyvisa
             self.rm = pyvisa.ResourceManager()
-            self.instrument = self.rm.open_resource(self.VISA_ADDRESS)
+            self.instrument = self.rm.open_resource(self.visa_address)
             self.instrument.timeout = 5000 # 5 second timeout
             
             # Reset and configure the instrument
             self.instrument.write("*RST") # Reset
             self.instrument.write(":SENSE:FUNCTION 'VOLT:DC'") # Set to DC Voltage
-            self.instrument.write(":SENSE:VOLTAGE:DC:RANGE:AUTO ON") # Autoranging
+            self._configure_measurement()
+            if self.scan_channels:
+                self._configure_scan()
+            if self.buffer_size > 0:
+                self._configure_burst()
             
             # Ask for its ID and print it
             identity = self.instrument.query("*IDN?")
@@ -45,11 +104,81 @@ class Keithley2000(BaseInstrument):
             print(f"ERROR connecting to Keithley: {e}")
             return False
 
+    def _configure_measurement(self):
+        """Applies the integration time, range, autozero and display settings."""
+        inst = self.instrument
+        inst.write(f":SENSE:VOLTAGE:DC:NPLCYCLES {self.nplc}")
+        if self.voltage_range is None:
+            inst.write(":SENSE:VOLTAGE:DC:RANGE:AUTO ON") # Autoranging
+        else:
+            inst.write(f":SENSE:VOLTAGE:DC:RANGE {self.voltage_range}")
+        inst.write(f":SYSTEM:AZERO:STATE {'ON' if self.autozero else 'OFF'}")
+        inst.write(f":DISPLAY:ENABLE {'ON' if self.display else 'OFF'}")
+
+    def _configure_scan(self):
+        """
+        Makes every reading step to the next channel of the internal scan
+        list, wrapping around, so buffer_size readings are whole scans.
+        """
+        channel_list = ",".join(str(c) for c in self.scan_channels)
+        self.instrument.write(f":ROUTE:SCAN:INTERNAL (@{channel_list})")
+        self.instrument.write(":ROUTE:SCAN:LSELECT INTERNAL")
+
+    def _configure_burst(self):
+        """
+        Sets up one trigger that takes buffer_size samples into the
+        :TRACE buffer, returned as little-endian binary floats.
+        """
+        inst = self.instrument
+        n = self.buffer_size
+        inst.write(":INITIATE:CONTINUOUS OFF")
+        inst.write(":TRIGGER:SOURCE IMMEDIATE")
+        inst.write(":TRIGGER:COUNT 1")
+        inst.write(f":SAMPLE:COUNT {n}")
+        inst.write(":TRACE:CLEAR")
+        inst.write(f":TRACE:POINTS {n}")
+        inst.write(":TRACE:FEED SENSE")
+        inst.write(":FORMAT:ELEMENTS READING")
+        inst.write(":FORMAT:DATA SREAL")
+        inst.write(":FORMAT:BORDER SWAPPED")
+
+        # A burst takes roughly n * NPLC / line frequency; leave plenty of
+        # headroom so slow integration times don't hit the VISA timeout.
+        burst_seconds = n * self.nplc / 50.0
+        self.instrument.timeout = int(5000 + 2000 * burst_seconds)
+
+    def _read_burst(self):
+        """
+        Fills the :TRACE buffer once and transfers it in one binary read.
+        Returns (timestamps, values), with timestamps spread evenly over
+        the time the burst took. When scanning, values has a row per scan
+        and a column per channel.
+        """
+        inst = self.instrument
+        start = self.clock.now_ns()
+        inst.write(":TRACE:CLEAR")
+        inst.write(":TRACE:FEED:CONTROL NEXT")
+        inst.write(":INITIATE")
+        inst.query("*OPC?") # Returns once the buffer is full
+        end = self.clock.now_ns()
+        values = inst.query_binary_values(
+            ":TRACE:DATA?", datatype='f', is_big_endian=False, container=np.array
+        ).astype(np.float64)
+        if self.scan_channels:
+            width = len(self.scan_channels)
+            values = values[:len(values) // width * width].reshape(-1, width)
+        n = len(values)
+        timestamps = start + (end - start) * np.arange(1, n + 1, dtype=np.int64) // max(n, 1)
+        return timestamps, values
+
     def read_voltage(self):
         """
         Asks the instrument to take one reading.
         This is a "blocking" call, which is why it's in a thread.
+        When scanning, this is the first channel's reading.
         """
+        if self.buffer_size > 0:
+            return float(self.read_block(1)[1].flat[0])
         try:
             # :READ? is a common SCPI command to trigger and return one reading
             voltage_str = self.instrument.query(":READ?")
@@ -59,10 +188,58 @@ class Keithley2000(BaseInstrument):
             # Return a "Not a Number" to signal an error
             return float('nan') 
 
+    def read_scan(self):
+        """Takes one scan, returning a reading per channel."""
+        return self.read_block(1)[1][0]
+
+    def read_block(self, n):
+        """
+        Returns exactly n readings. In burst mode these come from as many
+        buffer transfers as needed; leftovers are kept for the next call.
+        """
+        if self.buffer_size <= 0:
+            return super().read_block(n)
+
+        times = [self._pending_times]
+        values = [self._pending_values]
+        have = len(self._pending_values)
+        while have < n:
+            try:
+                burst_times, burst_values = self._read_burst()
+            except Exception as e:
+                print(f"Error reading burst: {e}")
+                burst_times = np.full(n - have, self.clock.now_ns(), dtype=np.int64)
+                burst_values = np.full((n - have,) + self._pending_values.shape[1:], np.nan)
+            times.append(burst_times)
+            values.append(burst_values)
+            have += len(burst_values)
+
+        all_times = np.concatenate(times)
+        all_values = np.concatenate(values)
+        self._pending_times = all_times[n:]
+        self._pending_values = all_values[n:]
+        return all_times[:n], all_values[:n]
+
+    def read_available(self):
+        """In burst or scan mode, returns one full buffer per call."""
+        if self.buffer_size <= 0:
+            return super().read_available()
+        if len(self._pending_values):
+            return self.read_block(len(self._pending_values))
+        return self.read_block(self.buffer_size // (len(self.channels) if self.channels else 1))
+
     def close(self):
         """Closes the VISA connection."""
         if self.instrument:
+            try:
+                # Leave the front panel usable for the next person
+                if self.scan_channels:
+                    self.instrument.write(":ROUTE:SCAN:LSELECT NONE")
+                self.instrument.write(":FORMAT:DATA ASCII")
+                self.instrument.write(":DISPLAY:ENABLE ON")
+            except Exception as e:
+                print(f"Error restoring Keithley settings: {e}")
             self.instrument.close()
         if self.rm:
             self.rm.close()
-        print(f"Disconnected from {self.get_name()}.")
\ No newline at end of file
+        print(f"Disconnected from {self.get_name()}.")
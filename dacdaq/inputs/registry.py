@@ -0,0 +1,119 @@
+import importlib
+from collections.abc import Mapping
+from importlib.metadata import entry_points
+
+# Third-party drivers register themselves under this entry point group,
+# with the instrument's display name as the entry point name, e.g. in
+# pyproject.toml:
+#   [tool.poetry.plugins."dacdaq.instruments"]
+#   "My Meter" = "my_package.meter:MyMeter"
+ENTRY_POINT_GROUP = "dacdaq.instruments"
+
+
+class InstrumentEntry:
+    """
+    One available instrument: its display name and where its class lives.
+    The driver module is only imported when load() is first called.
+    """
+    def __init__(self, name, target, capabilities=None, description=""):
+        self.name = name
+        self.target = target # "package.module:ClassName"
+        self._capabilities = tuple(capabilities) if capabilities is not None else None
+        self.description = description
+        self._class = None
+
+    def load(self):
+        """
+        Imports the driver module and returns the instrument class,
+        checking that its NAME (and CAPABILITIES, when declared here)
+        match this entry.
+        """
+        if self._class is None:
+            module_name, class_name = self.target.split(":")
+            cls = getattr(importlib.import_module(module_name), class_name)
+            if getattr(cls, "NAME", None) != self.name:
+                raise ValueError(
+                    f"{self.target} is registered as '{self.name}' "
+                    f"but its NAME is '{getattr(cls, 'NAME', None)}'"
+                )
+            capabilities = tuple(getattr(cls, "CAPABILITIES", ()))
+            if self._capabilities is not None and capabilities != self._capabilities:
+                raise ValueError(
+                    f"{self.target} declares capabilities {capabilities}, "
+                    f"registered as {self._capabilities}"
+                )
+            self._class = cls
+        return self._class
+
+    @property
+    def capabilities(self):
+        """
+        Declared capabilities. Plugins that didn't declare any up front
+        are loaded to read their class-level CAPABILITIES.
+        """
+        if self._capabilities is None:
+            self._capabilities = tuple(getattr(self.load(), "CAPABILITIES", ()))
+        return self._capabilities
+
+    @property
+    def declared_capabilities(self):
+        """Capabilities known without importing the driver, or None."""
+        return self._capabilities
+
+
+class InstrumentRegistry(Mapping):
+    """
+    Maps instrument display names to instrument classes.
+
+    Listing names, capabilities and descriptions never imports a driver;
+    registry[name] imports only the driver for that instrument. Built-in
+    instruments are listed in dacdaq.inputs.catalog; plugins are
+    discovered from the dacdaq.instruments entry point group on first use.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._entry_points_loaded = False
+
+    def add(self, name, target, capabilities=None, description=""):
+        """Registers an instrument by import path, without importing it."""
+        self.add_entry(InstrumentEntry(name, target, capabilities, description))
+
+    def add_entry(self, entry):
+        """Registers an InstrumentEntry, e.g. one from dacdaq.inputs.catalog."""
+        self._entries[entry.name] = entry
+
+    def register(self, instrument_class):
+        """Registers an already-imported class under its NAME."""
+        entry = InstrumentEntry(
+            instrument_class.NAME,
+            f"{instrument_class.__module__}:{instrument_class.__qualname__}",
+            getattr(instrument_class, "CAPABILITIES", ()),
+            (instrument_class.__doc__ or "").strip().split("\n")[0],
+        )
+        entry._class = instrument_class
+        self._entries[entry.name] = entry
+        return instrument_class
+
+    def _load_entry_points(self):
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for ep in entry_points(group=ENTRY_POINT_GROUP):
+            if ep.name not in self._entries:
+                self.add(ep.name, ep.value)
+
+    def entry(self, name):
+        """Returns the InstrumentEntry for a name, without importing anything."""
+        self._load_entry_points()
+        return self._entries[name]
+
+    def __getitem__(self, name):
+        return self.entry(name).load()
+
+    def __iter__(self):
+        self._load_entry_points()
+        return iter(self._entries)
+
+    def __len__(self):
+        self._load_entry_points()
+        return len(self._entries)
@@ -1,29 +1,44 @@
 import time
 import numpy as np
 from .base import BaseInstrument
+from .catalog import SIMULATED
 
 class SimulatedInstrument(BaseInstrument):
     """
     Our simulated instrument, now adhering to the BaseInstrument interface.
     """
+    NAME = SIMULATED.name
+    CAPABILITIES = SIMULATED.capabilities
+    SAMPLE_PERIOD = 0.05 # 50ms simulated hardware read time
+
     def __init__(self):
         super().__init__()
         self.baseline = 10.0
     
-    def get_name(self):
-        return "Simulated Instrument (Random)"
-
     def connect_instrument(self):
         print("Simulated Instrument Connected.")
         return True # Always succeeds
 
     def read_voltage(self):
         """Simulates a 50ms hardware read time."""
-        time.sleep(0.05) 
+        time.sleep(self.SAMPLE_PERIOD) 
         noise = np.random.normal(0.0, 0.2)
         drift = np.sin(np.pi * np.random.random()) * 0.1
         self.baseline += drift
         return self.baseline + noise
 
+    def read_block(self, n):
+        """Simulates n back-to-back reads in one go."""
+        start = self.clock.now_ns()
+        time.sleep(self.SAMPLE_PERIOD * n)
+        noise = np.random.normal(0.0, 0.2, n)
+        drift = np.cumsum(np.sin(np.pi * np.random.random(n)) * 0.1)
+        values = self.baseline + drift + noise
+        if n > 0:
+            self.baseline += drift[-1]
+        period_ns = round(self.SAMPLE_PERIOD * 1e9)
+        timestamps = start + period_ns * np.arange(1, n + 1, dtype=np.int64)
+        return timestamps, values
+
     def close(self):
-        print("Simulated Instrument Disconnected.")
\ No newline at end of file
+        print("Simulated Instrument Disconnected.")
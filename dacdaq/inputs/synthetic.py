@@ -0,0 +1,86 @@
+import time
+import numpy as np
+from .base import BaseInstrument
+from .catalog import SYNTHETIC
+
+class SyntheticInstrument(BaseInstrument):
+    """
+    A deterministic signal generator for benchmarks and tests: a sine
+    wave plus seeded Gaussian noise, at any sample rate.
+
+    Samples are spaced 1/rate apart starting at connect time. With
+    realtime=True each read waits until its samples are due, like real
+    hardware; with realtime=False it never sleeps and produces samples as
+    fast as the pipeline can take them. mode="block" returns block_size
+    samples per read, mode="scalar" one at a time. The same seed always
+    gives the same values, whatever the mode and block size.
+
+    With channels set to a list of names every sample has one value per
+    channel, each channel's sine shifted in phase by 1/len(channels) of a
+    cycle from the previous one.
+    """
+    NAME = SYNTHETIC.name
+    CAPABILITIES = SYNTHETIC.capabilities
+    MODES = ("block", "scalar")
+
+    def __init__(self, rate=1000.0, seed=0, mode="block", block_size=100,
+                 realtime=True, amplitude=1.0, frequency=1.0, noise=0.1, offset=0.0,
+                 channels=None):
+        super().__init__()
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        self.rate = float(rate)
+        self.seed = seed
+        self.mode = mode
+        self.block_size = max(1, int(block_size))
+        self.realtime = realtime
+        self.amplitude = amplitude
+        self.frequency = frequency
+        self.noise = noise
+        self.offset = offset
+        self.channels = list(channels) if channels else None
+        self.rng = None
+        self.start_ns = None
+        self.index = 0 # Samples produced so far
+
+    def connect_instrument(self):
+        self.rng = np.random.default_rng(self.seed)
+        self.start_ns = self.clock.now_ns()
+        self.index = 0
+        print(f"Synthetic Instrument Connected ({self.rate:g} samples/s, {self.mode} mode).")
+        return True
+
+    def _generate(self, n):
+        t = (self.index + np.arange(n)) / self.rate
+        self.index += n
+        timestamps = self.start_ns + np.round(t * 1e9).astype(np.int64)
+        if self.realtime:
+            # Wait until the last of these samples would have been measured
+            delay = (timestamps[-1] - self.clock.now_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        phase = 2 * np.pi * self.frequency * t
+        if self.channels:
+            k = len(self.channels)
+            phase = phase[:, None] + 2 * np.pi * np.arange(k) / k
+        values = self.offset + self.amplitude * np.sin(phase)
+        values += self.rng.normal(0.0, self.noise, values.shape)
+        return timestamps, values
+
+    def read_voltage(self):
+        return float(self._generate(1)[1].flat[0])
+
+    def read_scan(self):
+        return self._generate(1)[1][0]
+
+    def read_block(self, n):
+        if n <= 0:
+            shape = (0, len(self.channels)) if self.channels else 0
+            return np.empty(0, dtype=np.int64), np.empty(shape)
+        return self._generate(n)
+
+    def read_available(self):
+        return self.read_block(self.block_size if self.mode == "block" else 1)
+
+    def close(self):
+        print("Synthetic Instrument Disconnected.")
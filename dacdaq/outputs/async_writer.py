@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+import numpy as np
+from dacdaq.core.stages import BoundedQueue
+
+class AsyncSinkWriter:
+    """
+    Runs a sink's writes on a dedicated writer thread, so a slow disk
+    never stalls the acquisition thread.
+
+    Blocks are handed over through a bounded queue and written in batches.
+    The sink is flushed after `flush_rows` rows or `flush_interval`
+    seconds, whichever comes first. With `fsync_interval` set, the file
+    is also fsync'd that often, so at most that much data is lost if the
+    PC crashes.
+
+    What happens when the queue is full is set by `overflow` (see
+    BoundedQueue). The default, "block", waits up to `put_timeout`
+    seconds (a backpressure event) and then drops the block (a queue-full
+    event). Both are counted and reported through `on_backpressure`.
+
+    With `profile` (a cProfile.Profile), the writer thread runs under it.
+    """
+    def __init__(self, sink, max_queue_blocks=256, flush_rows=1000,
+                 flush_interval=1.0, fsync_interval=None, put_timeout=0.5,
+                 overflow="block", on_backpressure=None, profile=None):
+        self.sink = sink
+        self.flush_rows = int(flush_rows)
+        self.flush_interval = float(flush_interval)
+        self.fsync_interval = fsync_interval
+        self.on_backpressure = on_backpressure
+        self.profile = profile
+
+        self._queue = BoundedQueue(
+            max_queue_blocks, overflow,
+            None if put_timeout is None else float(put_timeout),
+            on_overflow=lambda event, queue: self._report(event)
+        )
+        self._thread = None
+        self._error = None
+
+    @property
+    def filepath(self):
+        return self.sink.filepath
+
+    @property
+    def queue(self):
+        return self._queue
+
+    @property
+    def queue_depth(self):
+        return self._queue.depth
+
+    @property
+    def backpressure_events(self):
+        return self._queue.full_events
+
+    @property
+    def dropped_blocks(self):
+        return self._queue.dropped_blocks
+
+    @property
+    def dropped_rows(self):
+        return self._queue.dropped_rows
+
+    def open(self):
+        """Opens the sink and starts the writer thread."""
+        if not self.sink.open():
+            return False
+        self._thread = threading.Thread(
+            target=self._run, name=f"writer-{os.path.basename(self.filepath)}",
+            daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """Queues a block for writing. Called from the processing thread."""
+        if self._error is not None:
+            raise IOError(f"Writer for {self.filepath} failed: {self._error}")
+        block = (np.asarray(timestamps), np.asarray(raw_data), np.asarray(filtered_data))
+        self._queue.put(block, len(block[1]))
+
+    def _report(self, event):
+        if self.on_backpressure:
+            self.on_backpressure(event, self)
+
+    def _run(self):
+        """Writer thread, under self.profile if there is one."""
+        if self.profile:
+            self.profile.enable()
+        try:
+            self._write_until_closed()
+        finally:
+            if self.profile:
+                self.profile.disable()
+
+    def _write_until_closed(self):
+        """Batch up queued blocks, write, flush by policy."""
+        last_flush = last_fsync = time.monotonic()
+        unflushed_rows = 0
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            # Everything that is waiting, once there is anything
+            batch = self._queue.get_batch(timeout)
+            stopping = not batch and self._queue.finished
+
+            try:
+                if batch:
+                    self.sink.write_block(
+                        np.concatenate([b[0] for b in batch]),
+                        np.concatenate([b[1] for b in batch]),
+                        np.concatenate([b[2] for b in batch]),
+                    )
+                    unflushed_rows += sum(len(b[1]) for b in batch)
+
+                now = time.monotonic()
+                if (unflushed_rows >= self.flush_rows
+                        or now - last_flush >= self.flush_interval or stopping):
+                    fsync = (self.fsync_interval is not None
+                             and now - last_fsync >= self.fsync_interval)
+                    self.sink.flush(fsync=fsync)
+                    last_flush = now
+                    if fsync:
+                        last_fsync = now
+                    unflushed_rows = 0
+            except Exception as e:
+                print(f"Error in writer thread for {self.filepath}: {e}")
+                self._error = e
+                self._queue.close() # Wakes a writer blocked on a full queue
+                return
+
+    def close(self):
+        """Writes out everything still queued, then closes the sink."""
+        if self._thread:
+            self._queue.close()
+            self._thread.join()
+            self._thread = None
+        self.sink.close()
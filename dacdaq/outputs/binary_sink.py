@@ -0,0 +1,312 @@
+import csv
+import glob
+import json
+import os
+import numpy as np
+from dacdaq.core.clock import default_clock, parse_iso
+from .csv_sink import CsvSink
+
+# One fixed-width record per sample: int64 nanoseconds since the epoch,
+# then the raw and filtered voltages.
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<i8"),
+    ("raw", "<f8"),
+    ("filtered", "<f8"),
+])
+
+
+def record_dtype(channels=None):
+    """
+    The record layout for a run. Multi-channel runs store raw and
+    filtered as one float64 per channel.
+    """
+    if not channels:
+        return RECORD_DTYPE
+    n = len(channels)
+    return np.dtype([("timestamp", "<i8"), ("raw", "<f8", (n,)), ("filtered", "<f8", (n,))])
+
+
+def header_dtype(header):
+    """The record dtype stored in a run header."""
+    # JSON turns the (name, type, shape) tuples into lists
+    return np.dtype([
+        tuple(tuple(part) if isinstance(part, list) else part for part in field)
+        for field in header["dtype"]
+    ])
+FORMAT_VERSION = 1
+HEADER_NAME = "header.json"
+
+
+def run_path_for(filepath):
+    """The .dqrun directory that goes with an output file name."""
+    return f"{filepath.rsplit('.', 1)[0]}.dqrun"
+
+
+def write_header_atomic(run_path, header):
+    """
+    Writes header.json into run_path. Written then renamed, so a crash
+    never leaves a half-written header.
+    """
+    path = os.path.join(run_path, HEADER_NAME)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(header, f, indent=4)
+    os.replace(f"{path}.tmp", path)
+
+
+class BinarySink:
+    """
+    Writes acquired data as fixed-width binary records, in a .dqrun
+    directory next to the CSV file name.
+
+    The directory holds a small header.json with the run metadata and
+    chunk_000000.bin, chunk_000001.bin, ... each holding up to
+    chunk_records records with no per-file header, so they can be
+    memory-mapped directly (see BinaryRun).
+    """
+    def __init__(self, filepath, config_details, chunk_records=1_000_000, auto_flush=True,
+                 clock=default_clock):
+        self.run_path = run_path_for(filepath)
+        self.filepath = self.run_path
+        self.config_details = config_details
+        self.chunk_records = int(chunk_records)
+        self.auto_flush = auto_flush
+        self.clock = clock
+        self.channels = config_details.get("channels")
+        self.dtype = record_dtype(self.channels)
+        self.header = None
+        self.file_handle = None
+        self.chunk_index = 0
+        self.chunk_fill = 0
+        self.records = 0
+
+    def open(self):
+        """Creates the run directory and writes the header."""
+        try:
+            os.makedirs(self.run_path, exist_ok=True)
+            for old_chunk in glob.glob(os.path.join(self.run_path, "chunk_*.bin")):
+                os.remove(old_chunk)
+
+            self.header = {
+                "format_version": FORMAT_VERSION,
+                "dtype": self.dtype.descr,
+                "channels": self.channels,
+                "chunk_records": self.chunk_records,
+                "instrument_name": self.config_details.get("instrument_name", "Unknown"),
+                "comments": self.config_details.get("comments", ""),
+                "start_time": self.config_details.get("start_time") or self.clock.now_iso(),
+                "records": 0,
+            }
+            write_header_atomic(self.run_path, self.header)
+            self.chunk_index = 0
+            self.chunk_fill = 0
+            self.records = 0
+            self._open_chunk()
+            print(f"Opened binary sink: {self.run_path}")
+            return True
+        except Exception as e:
+            print(f"Error opening BinarySink: {e}")
+            return False
+
+    def _open_chunk(self):
+        name = f"chunk_{self.chunk_index:06d}.bin"
+        self.file_handle = open(os.path.join(self.run_path, name), 'wb')
+
+    def write(self, raw_data, filtered_data):
+        """Writes a single sample, timestamped now."""
+        self.write_block([self.clock.now_ns()], [raw_data], [filtered_data])
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """
+        Appends one record per sample. Timestamps are int64 nanoseconds
+        since the epoch, as returned by BaseInstrument.read_block().
+        """
+        if not self.file_handle:
+            return
+        records = np.empty(len(raw_data), dtype=self.dtype)
+        records["timestamp"] = timestamps
+        records["raw"] = raw_data
+        records["filtered"] = filtered_data
+
+        while len(records):
+            if self.chunk_fill == self.chunk_records:
+                self.file_handle.close()
+                self.chunk_index += 1
+                self.chunk_fill = 0
+                self._open_chunk()
+            n = min(len(records), self.chunk_records - self.chunk_fill)
+            records[:n].tofile(self.file_handle)
+            self.chunk_fill += n
+            self.records += n
+            records = records[n:]
+        if self.auto_flush:
+            self.file_handle.flush()
+
+    def flush(self, fsync=False):
+        """Flushes buffered records, optionally forcing them onto the disk."""
+        if self.file_handle:
+            self.file_handle.flush()
+            if fsync:
+                os.fsync(self.file_handle.fileno())
+
+    def close(self):
+        """Closes the current chunk and records the final count in the header."""
+        if self.file_handle:
+            print(f"Closing binary sink: {self.run_path}")
+            self.file_handle.close()
+            self.file_handle = None
+            self.header["records"] = self.records
+            self.header["end_time"] = self.clock.now_iso()
+            write_header_atomic(self.run_path, self.header)
+
+
+class BinaryRun:
+    """
+    Read-only access to a .dqrun directory written by BinarySink.
+
+    Each chunk is exposed as a memory-mapped structured array, so nothing
+    is parsed or loaded until it is used. Record counts come from the
+    chunk file sizes, so runs that were never closed cleanly still open.
+    """
+    def __init__(self, run_path):
+        self.run_path = run_path
+        self.source_path = run_path # What was opened; see runs.open_run()
+        with open(os.path.join(run_path, HEADER_NAME)) as f:
+            self.header = json.load(f)
+        self.dtype = header_dtype(self.header)
+        self.channels = self.header.get("channels")
+
+        self.chunks = []
+        for path in sorted(glob.glob(os.path.join(run_path, "chunk_*.bin"))):
+            n = os.path.getsize(path) // self.dtype.itemsize
+            if n > 0:
+                self.chunks.append(np.memmap(path, dtype=self.dtype, mode='r', shape=(n,)))
+        self._offsets = np.cumsum([0] + [len(c) for c in self.chunks])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def read(self, start=0, stop=None):
+        """
+        Returns records start..stop as a structured array. A range inside
+        one chunk is returned as a memmap slice without copying.
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(0, min(start, stop))
+        parts = []
+        for chunk, offset in zip(self.chunks, self._offsets):
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, len(chunk))
+            if lo < hi:
+                parts.append(chunk[lo:hi])
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    @property
+    def records(self):
+        """The whole run as one structured array."""
+        return self.read()
+
+    @property
+    def timestamps(self):
+        """Timestamps as datetime64[ns]."""
+        return self.records["timestamp"].view("datetime64[ns]")
+
+    @property
+    def raw(self):
+        return self.records["raw"]
+
+    @property
+    def filtered(self):
+        return self.records["filtered"]
+
+
+def read_csv_header(csv_path):
+    """
+    Reads the '#' comment block at the top of a CsvSink file.
+    Returns (metadata dict, number of lines before the first data row).
+    """
+    comments = []
+    metadata = {}
+    with open(csv_path, newline='') as f:
+        for line_number, row in enumerate(csv.reader(f)):
+            if row and row[0].startswith("Timestamp"):
+                metadata["comments"] = "\n".join(comments)
+                metadata["columns"] = row
+                if len(row) > 3:
+                    metadata["channels"] = [name.rsplit(" Raw (V)", 1)[0] for name in row[1::2]]
+                return metadata, line_number + 1
+            if not row or not row[0].startswith("#"):
+                continue
+            text = row[0][2:] if row[0].startswith("# ") else row[0][1:]
+            if text.startswith("Instrument: "):
+                metadata["instrument_name"] = text[len("Instrument: "):]
+            elif text.startswith("Start Time: "):
+                metadata["start_time"] = text[len("Start Time: "):]
+            else:
+                comments.append(text)
+    raise ValueError(f"No data header found in {csv_path}")
+
+
+def iter_csv_blocks(csv_path, block_rows=100_000):
+    """
+    Reads the data rows of a CsvSink file in blocks of up to block_rows.
+    Yields (metadata, timestamps, raw, filtered), with timestamps as int64
+    nanoseconds and one raw/filtered column per channel for
+    multi-channel runs.
+
+    Rows are split by pandas' C parser and the ISO timestamps converted
+    a whole block at a time, so no Python code runs per row.
+    """
+    import pandas as pd # Only needed here; slow to import
+
+    metadata, skip = read_csv_header(csv_path)
+    columns = metadata["columns"]
+    reader = pd.read_csv(
+        csv_path, skiprows=skip, header=None, names=columns, chunksize=block_rows,
+        dtype={name: (str if i == 0 else np.float64) for i, name in enumerate(columns)},
+        skip_blank_lines=True, engine="c", float_precision="round_trip",
+    )
+    with reader:
+        for chunk in reader:
+            values = chunk.iloc[:, 1:].to_numpy(dtype=np.float64)
+            raw, filtered = values[:, 0::2], values[:, 1::2]
+            if not metadata.get("channels"):
+                raw, filtered = raw[:, 0], filtered[:, 0]
+            yield metadata, parse_iso(chunk.iloc[:, 0].to_numpy(dtype=str)), raw, filtered
+
+
+def csv_to_binary(csv_path, run_path=None, chunk_records=1_000_000, block_rows=100_000):
+    """
+    Converts a CsvSink file to a .dqrun directory, reading the CSV in
+    blocks of block_rows rows. run_path defaults to the CSV file name
+    with a .dqrun extension. Returns the run directory path.
+    """
+    metadata, _ = read_csv_header(csv_path)
+    sink = BinarySink(run_path or csv_path, metadata, chunk_records=chunk_records,
+                      auto_flush=False)
+    if not sink.open():
+        raise IOError(f"Could not create {sink.run_path}")
+    try:
+        for _, timestamps, raw, filtered in iter_csv_blocks(csv_path, block_rows):
+            sink.write_block(timestamps, raw, filtered)
+    finally:
+        sink.close()
+    return sink.run_path
+
+
+def binary_to_csv(run_path, csv_path, block_rows=100_000):
+    """Writes a .dqrun directory back out in the CsvSink layout."""
+    run = BinaryRun(run_path)
+    sink = CsvSink(csv_path, run.header, auto_flush=False)
+    if not sink.open():
+        raise IOError(f"Could not create {csv_path}")
+    try:
+        for start in range(0, len(run), block_rows):
+            block = run.read(start, start + block_rows)
+            sink.write_block(block["timestamp"], block["raw"], block["filtered"])
+    finally:
+        sink.close()
+    return csv_path
@@ -0,0 +1,358 @@
+import collections
+import json
+import lzma
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from dacdaq.core.clock import default_clock
+from .binary_sink import HEADER_NAME, header_dtype, record_dtype, write_header_atomic
+
+FORMAT_VERSION = 1
+BLOCKS_NAME = "blocks.bin"
+INDEX_NAME = "index.npy"
+
+# Each block in blocks.bin is this frame followed by its compressed bytes:
+# compressed size, record count, first and last timestamp.
+FRAME = struct.Struct("<qqqq")
+
+# One row per block, saved as index.npy when the sink closes
+INDEX_DTYPE = np.dtype([
+    ("offset", "<i8"), # Of the block's frame in blocks.bin
+    ("size", "<i8"),
+    ("records", "<i8"),
+    ("first_timestamp", "<i8"),
+    ("last_timestamp", "<i8"),
+])
+
+# name: (compress(data, level), decompress(data), default level)
+CODECS = {
+    "zlib": (lambda data, level: zlib.compress(data, level), zlib.decompress, 6),
+    "lzma": (lambda data, level: lzma.compress(data, preset=level), lzma.decompress, 1),
+}
+
+
+def compressed_path_for(filepath):
+    """The .dqz directory that goes with an output file name."""
+    return f"{filepath.rsplit('.', 1)[0]}.dqz"
+
+
+def encode_block(records, codec, level):
+    """
+    Compresses a block of records. Timestamps are stored as differences
+    from the previous one and the bytes are shuffled (all first bytes,
+    then all second bytes, ...), which makes evenly spaced timestamps
+    and slowly changing voltages compress several times better.
+    Returns (payload, records, first timestamp, last timestamp).
+    """
+    n = len(records)
+    timestamps = records["timestamp"]
+    encoded = records.copy()
+    encoded["timestamp"][1:] = np.diff(timestamps)
+    shuffled = encoded.view(np.uint8).reshape(n, records.dtype.itemsize).T
+    payload = CODECS[codec][0](shuffled.tobytes(), level)
+    return payload, n, int(timestamps[0]), int(timestamps[-1])
+
+
+def decode_block(payload, n, dtype, codec):
+    """Reverses encode_block()."""
+    shuffled = np.frombuffer(CODECS[codec][1](payload), dtype=np.uint8)
+    records = shuffled.reshape(dtype.itemsize, n).T.copy().view(dtype).reshape(n)
+    records["timestamp"] = np.cumsum(records["timestamp"])
+    return records
+
+
+class CompressedSink:
+    """
+    Writes acquired data as compressed blocks of binary records, in a
+    .dqz directory next to the CSV file name.
+
+    Records (see record_dtype) are gathered into blocks of
+    block_records, and each full block is compressed with zlib or lzma
+    on a small pool of worker threads (both release the GIL while
+    compressing), then appended to blocks.bin in order. Each block is
+    framed with its size, record count and time range, and index.npy
+    lists every block's offset, so CompressedRun can read any record or
+    time range by decompressing only the blocks it touches. If the run
+    is never closed the index is rebuilt from the frames.
+
+    A block is also cut short once its first record is max_block_seconds
+    old, and by flush(fsync=True), so at slow sample rates records don't
+    sit in memory for hours waiting for the block to fill. Short blocks
+    compress a little less well but read back the same.
+    """
+    def __init__(self, filepath, config_details, block_records=65536, compression="zlib",
+                 level=None, workers=2, max_block_seconds=60.0, auto_flush=True,
+                 clock=default_clock):
+        if compression not in CODECS:
+            raise ValueError(f"Unknown compression: {compression}")
+        self.run_path = compressed_path_for(filepath)
+        self.filepath = self.run_path
+        self.config_details = config_details
+        self.block_records = int(block_records)
+        self.compression = compression
+        self.level = CODECS[compression][2] if level is None else int(level)
+        self.workers = max(1, int(workers))
+        self.max_block_seconds = None if max_block_seconds is None else float(max_block_seconds)
+        self.auto_flush = auto_flush
+        self.clock = clock
+        self.channels = config_details.get("channels")
+        self.dtype = record_dtype(self.channels)
+        self.header = None
+        self.file_handle = None
+        self.pool = None
+        self.pending = collections.deque() # Futures of blocks being compressed, in order
+        self.buffer = None
+        self.fill = 0
+        self.block_started = None # time.monotonic() of the current block's first record
+        self.index = []
+        self.offset = 0
+        self.records = 0
+
+    def open(self):
+        """Creates the run directory, writes the header and starts the compressor threads."""
+        try:
+            os.makedirs(self.run_path, exist_ok=True)
+            for name in (BLOCKS_NAME, INDEX_NAME):
+                if os.path.exists(os.path.join(self.run_path, name)):
+                    os.remove(os.path.join(self.run_path, name))
+
+            self.header = {
+                "format_version": FORMAT_VERSION,
+                "dtype": self.dtype.descr,
+                "channels": self.channels,
+                "compression": self.compression,
+                "level": self.level,
+                "block_records": self.block_records,
+                "instrument_name": self.config_details.get("instrument_name", "Unknown"),
+                "comments": self.config_details.get("comments", ""),
+                "start_time": self.config_details.get("start_time") or self.clock.now_iso(),
+                "records": 0,
+            }
+            write_header_atomic(self.run_path, self.header)
+            self.file_handle = open(os.path.join(self.run_path, BLOCKS_NAME), 'wb')
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="compress")
+            self.pending.clear()
+            self.buffer = np.empty(self.block_records, dtype=self.dtype)
+            self.fill = 0
+            self.index = []
+            self.offset = 0
+            self.records = 0
+            print(f"Opened compressed sink: {self.run_path}")
+            return True
+        except Exception as e:
+            print(f"Error opening CompressedSink: {e}")
+            return False
+
+    def write(self, raw_data, filtered_data):
+        """Writes a single sample, timestamped now."""
+        self.write_block([self.clock.now_ns()], [raw_data], [filtered_data])
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """
+        Adds one record per sample to the current block, handing full
+        blocks to the compressor threads. Timestamps are int64
+        nanoseconds since the epoch.
+        """
+        if not self.file_handle:
+            return
+        timestamps = np.asarray(timestamps)
+        raw_data = np.asarray(raw_data)
+        filtered_data = np.asarray(filtered_data)
+        start = 0
+        while start < len(timestamps):
+            if self.fill == 0:
+                self.block_started = time.monotonic()
+            n = min(len(timestamps) - start, self.block_records - self.fill)
+            block = self.buffer[self.fill:self.fill + n]
+            block["timestamp"] = timestamps[start:start + n]
+            block["raw"] = raw_data[start:start + n]
+            block["filtered"] = filtered_data[start:start + n]
+            self.fill += n
+            start += n
+            if self.fill == self.block_records:
+                self._submit()
+        self._submit_if_old()
+        self._write_compressed(wait=False)
+
+    def _submit_if_old(self):
+        """Submits the current block early once it is max_block_seconds old."""
+        if (self.fill and self.max_block_seconds is not None
+                and time.monotonic() - self.block_started >= self.max_block_seconds):
+            self._submit()
+
+    def _submit(self):
+        """Hands the current block to the compressor threads and starts a new one."""
+        if self.fill == 0:
+            return
+        self.pending.append(self.pool.submit(
+            encode_block, self.buffer[:self.fill], self.compression, self.level
+        ))
+        self.buffer = np.empty(self.block_records, dtype=self.dtype)
+        self.fill = 0
+        # Don't let compression fall more than a couple of blocks per thread behind
+        while len(self.pending) > 2 * self.workers:
+            self._write_next()
+
+    def _write_next(self):
+        """Appends the oldest compressed block, waiting for it if needed."""
+        payload, n, first, last = self.pending.popleft().result()
+        self.file_handle.write(FRAME.pack(len(payload), n, first, last))
+        self.file_handle.write(payload)
+        self.index.append((self.offset, len(payload), n, first, last))
+        self.offset += FRAME.size + len(payload)
+        self.records += n
+
+    def _write_compressed(self, wait):
+        """Appends the blocks that are done compressing, or all of them with wait=True."""
+        while self.pending and (wait or self.pending[0].done()):
+            self._write_next()
+        if self.auto_flush:
+            self.file_handle.flush()
+
+    def flush(self, fsync=False):
+        """
+        Flushes the compressed blocks written so far. With fsync=True the
+        unfinished block is compressed and written too, and everything is
+        forced onto the disk.
+        """
+        if self.file_handle:
+            if fsync:
+                self._submit()
+            else:
+                self._submit_if_old()
+            self._write_compressed(wait=fsync)
+            self.file_handle.flush()
+            if fsync:
+                os.fsync(self.file_handle.fileno())
+
+    def close(self):
+        """Compresses the last block, then writes the index and the final header."""
+        if self.file_handle:
+            print(f"Closing compressed sink: {self.run_path}")
+            self._submit()
+            self._write_compressed(wait=True)
+            self.pool.shutdown()
+            self.file_handle.close()
+            self.file_handle = None
+            index_path = os.path.join(self.run_path, INDEX_NAME)
+            with open(f"{index_path}.tmp", 'wb') as f:
+                np.save(f, np.array(self.index, dtype=INDEX_DTYPE))
+            os.replace(f"{index_path}.tmp", index_path)
+            self.header["records"] = self.records
+            self.header["blocks"] = len(self.index)
+            self.header["compressed_bytes"] = self.offset
+            self.header["end_time"] = self.clock.now_iso()
+            write_header_atomic(self.run_path, self.header)
+
+
+def scan_blocks(blocks_path):
+    """
+    Rebuilds the block index of a blocks.bin from its frames, for runs
+    that were never closed. A block cut short by a crash is left out.
+    """
+    index = []
+    size = os.path.getsize(blocks_path)
+    offset = 0
+    with open(blocks_path, 'rb') as f:
+        while offset + FRAME.size <= size:
+            frame = FRAME.unpack(f.read(FRAME.size))
+            if offset + FRAME.size + frame[0] > size:
+                break
+            index.append((offset,) + frame)
+            offset += FRAME.size + frame[0]
+            f.seek(offset)
+    return np.array(index, dtype=INDEX_DTYPE)
+
+
+class CompressedRun:
+    """
+    Read-only access to a .dqz directory written by CompressedSink, with
+    the same interface as BinaryRun.
+
+    blocks.bin is memory-mapped and a block is only decompressed when a
+    read needs it; the most recently used block is kept decoded, so
+    reading a run in order decompresses every block once.
+    """
+    def __init__(self, run_path):
+        self.run_path = run_path
+        self.source_path = run_path # What was opened; see runs.open_run()
+        with open(os.path.join(run_path, HEADER_NAME)) as f:
+            self.header = json.load(f)
+        self.dtype = header_dtype(self.header)
+        self.channels = self.header.get("channels")
+        self.compression = self.header["compression"]
+
+        blocks_path = os.path.join(run_path, BLOCKS_NAME)
+        index_path = os.path.join(run_path, INDEX_NAME)
+        if os.path.exists(index_path):
+            self.index = np.load(index_path)
+        else:
+            self.index = scan_blocks(blocks_path)
+        size = os.path.getsize(blocks_path)
+        self._data = np.memmap(blocks_path, dtype=np.uint8, mode='r') if size else None
+        self._offsets = np.concatenate(([0], np.cumsum(self.index["records"])))
+        self._cached = (None, None) # (block number, records)
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    @property
+    def compressed_bytes(self):
+        return int(self.index["size"].sum() + FRAME.size * len(self.index))
+
+    def block(self, k):
+        """The records of block k, decompressed."""
+        if self._cached[0] != k:
+            entry = self.index[k]
+            start = int(entry["offset"]) + FRAME.size
+            payload = self._data[start:start + int(entry["size"])]
+            self._cached = (k, decode_block(payload, int(entry["records"]), self.dtype,
+                                            self.compression))
+        return self._cached[1]
+
+    def read(self, start=0, stop=None):
+        """Returns records start..stop, decompressing only the blocks they are in."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(0, min(start, stop))
+        if start == stop:
+            return np.empty(0, dtype=self.dtype)
+        first = int(np.searchsorted(self._offsets, start, side='right')) - 1
+        last = int(np.searchsorted(self._offsets, stop, side='left'))
+        parts = []
+        for k in range(first, last):
+            offset = self._offsets[k]
+            parts.append(self.block(k)[max(start - offset, 0):stop - offset])
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def read_time(self, start_ns, stop_ns):
+        """Returns the records with start_ns <= timestamp <= stop_ns."""
+        first = int(np.searchsorted(self.index["last_timestamp"], start_ns, side='left'))
+        last = int(np.searchsorted(self.index["first_timestamp"], stop_ns, side='right'))
+        if first >= last:
+            return np.empty(0, dtype=self.dtype)
+        records = self.read(int(self._offsets[first]), int(self._offsets[last]))
+        times = records["timestamp"]
+        lo = int(np.searchsorted(times, start_ns, side='left'))
+        hi = int(np.searchsorted(times, stop_ns, side='right'))
+        return records[lo:hi]
+
+    @property
+    def records(self):
+        """The whole run as one structured array."""
+        return self.read()
+
+    @property
+    def timestamps(self):
+        """Timestamps as datetime64[ns]."""
+        return self.records["timestamp"].view("datetime64[ns]")
+
+    @property
+    def raw(self):
+        return self.records["raw"]
+
+    @property
+    def filtered(self):
+        return self.records["filtered"]
@@ -1,14 +1,32 @@
 import csv
-import datetime
+import os
+import numpy as np
+from dacdaq.core.clock import default_clock, format_iso
+
+def column_names(channels=None):
+    """
+    The CSV header row. A single-channel run keeps the classic three
+    columns; a multi-channel run gets a raw/filtered pair per channel.
+    """
+    if not channels:
+        return ["Timestamp", "Voltage_Raw (V)", "Voltage_Filtered (V)"]
+    names = ["Timestamp"]
+    for channel in channels:
+        names += [f"{channel} Raw (V)", f"{channel} Filtered (V)"]
+    return names
+
 
 class CsvSink:
     """
     Handles writing acquired data to a CSV file.
     NOW saves both raw and processed data.
     """
-    def __init__(self, filepath, config_details):
+    def __init__(self, filepath, config_details, auto_flush=True, clock=default_clock):
         self.filepath = filepath
         self.config_details = config_details
+        # AsyncSinkWriter turns this off and flushes on its own schedule
+        self.auto_flush = auto_flush
+        self.clock = clock # For write(), which isn't given a timestamp
         self.file_handle = None
         self.writer = None
 
@@ -25,13 +43,12 @@ class CsvSink:
             # Write metadata
             writer = self.writer
             writer.writerow([f"# Instrument: {self.config_details.get('instrument_name', 'Unknown')}"])
-            writer.writerow([f"# Start Time: {datetime.datetime.now().isoformat()}"])
+            start_time = self.config_details.get("start_time") or self.clock.now_iso()
+            writer.writerow([f"# Start Time: {start_time}"])
             writer.writerow([""]) # Spacer
             
-            # --- MODIFIED ---
-            # Write new data header
-            writer.writerow(["Timestamp", "Voltage_Raw (V)", "Voltage_Filtered (V)"])
-            # --- END MODIFIED ---
+            # Write data header
+            writer.writerow(column_names(self.config_details.get("channels")))
 
             self.file_handle.flush()
             print(f"Opened data sink: {self.filepath}")
@@ -44,11 +61,38 @@ class CsvSink:
     def write(self, raw_data, filtered_data):
         """Writes a single row of data."""
         if self.writer:
-            timestamp = datetime.datetime.now().isoformat()
+            timestamp = self.clock.now_iso()
             self.writer.writerow([timestamp, raw_data, filtered_data])
             self.file_handle.flush() # Ensure data is written
     # --- END MODIFIED ---
 
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """
+        Writes one row per sample for whole arrays of data.
+        Timestamps are int64 nanoseconds since the epoch, as returned by
+        BaseInstrument.read_block(), formatted here in one go.
+        """
+        if self.writer:
+            iso_times = format_iso(timestamps).tolist()
+            # Raw and filtered side by side for each channel
+            raw_data = np.asarray(raw_data)
+            n = len(raw_data)
+            table = np.empty((n, 2 * (raw_data.size // max(n, 1))))
+            table[:, 0::2] = raw_data.reshape(n, -1)
+            table[:, 1::2] = np.asarray(filtered_data).reshape(n, -1)
+            self.writer.writerows(
+                [timestamp] + row for timestamp, row in zip(iso_times, table.tolist())
+            )
+            if self.auto_flush:
+                self.file_handle.flush() # One flush per block
+
+    def flush(self, fsync=False):
+        """Flushes buffered rows, optionally forcing them onto the disk."""
+        if self.file_handle:
+            self.file_handle.flush()
+            if fsync:
+                os.fsync(self.file_handle.fileno())
+
     def close(self):
         """Closes the file handle."""
         if self.file_handle:
@@ -1,15 +1,23 @@
 import csv
-import datetime
+import os
+import numpy as np
+from dacdaq.core.clock import default_clock, format_iso, parse_iso
+
+def events_path_for(filepath):
+    """The .events.csv file that goes with an output file name."""
+    return f"{filepath.rsplit('.', 1)[0]}.events.csv"
+
 
 class EventSink:
     """
     Handles writing timestamped user events (comments) to a .events.csv file.
+    Events are stamped from clock, the same RunClock as the samples.
     """
-    def __init__(self, filepath, config_details):
+    def __init__(self, filepath, config_details, clock=default_clock):
         # We'll automatically append '.events' to the main log file name
-        base_filepath = filepath.rsplit('.', 1)[0]
-        self.filepath = f"{base_filepath}.events.csv"
+        self.filepath = events_path_for(filepath)
         self.config_details = config_details
+        self.clock = clock
         self.file_handle = None
         self.writer = None
 
@@ -26,7 +34,8 @@ class EventSink:
             # Write metadata
             writer = self.writer
             writer.writerow([f"# Instrument: {self.config_details.get('instrument_name', 'Unknown')}"])
-            writer.writerow([f"# Start Time: {datetime.datetime.now().isoformat()}"])
+            start_time = self.config_details.get("start_time") or self.clock.now_iso()
+            writer.writerow([f"# Start Time: {start_time}"])
             writer.writerow([""]) # Spacer
             
             # Write data header
@@ -38,20 +47,52 @@ class EventSink:
             print(f"Error opening EventSink: {e}")
             return False
 
-    def write_event(self, comment):
-        """Writes a new timestamped event to the file."""
+    def write_event(self, comment, timestamp_ns=None):
+        """
+        Writes a new timestamped event to the file, stamped now unless
+        timestamp_ns (nanoseconds since the epoch) is given.
+        """
         if self.writer:
-            timestamp = datetime.datetime.now().isoformat()
+            if timestamp_ns is None:
+                timestamp_ns = self.clock.now_ns()
+            timestamp = str(format_iso(timestamp_ns))
             # Sanitize comment to remove newlines
             clean_comment = comment.replace('\n', ' ').replace('\r', ' ')
             self.writer.writerow([timestamp, clean_comment])
             self.file_handle.flush()
             print(f"Logged event: {clean_comment}")
 
+    def flush(self, fsync=False):
+        """Events are flushed as they are written; this can force them onto the disk."""
+        if self.file_handle:
+            self.file_handle.flush()
+            if fsync:
+                os.fsync(self.file_handle.fileno())
+
     def close(self):
         """Closes the file handle."""
         if self.file_handle:
             print(f"Closing event sink: {self.filepath}")
             self.file_handle.close()
             self.file_handle = None
-            self.writer = None
\ No newline at end of file
+            self.writer = None
+
+
+def read_events(events_path):
+    """
+    Reads an EventSink file. Returns (timestamps, comments): int64
+    nanoseconds since the epoch and the matching comment strings.
+    """
+    times, comments = [], []
+    with open(events_path, newline='') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if row and row[0] == "Timestamp":
+                break
+        for row in reader:
+            if len(row) >= 2:
+                times.append(row[0])
+                comments.append(row[1])
+    if not times:
+        return np.empty(0, dtype=np.int64), []
+    return parse_iso(times), comments
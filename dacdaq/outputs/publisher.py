@@ -0,0 +1,328 @@
+import collections
+import json
+import os
+import selectors
+import socket
+import struct
+import threading
+import numpy as np
+from dacdaq.core.clock import default_clock
+from .binary_sink import header_dtype, record_dtype
+
+# Every frame is this header (frame kind, payload bytes) and its payload
+FRAME = struct.Struct("<BI")
+HELLO = 1   # JSON metadata, the first frame on every connection
+SAMPLES = 2 # Records of the dtype given in the hello frame
+EVENT = 3   # int64 nanosecond timestamp, then the comment as UTF-8
+EVENT_TIME = struct.Struct("<q")
+
+
+def parse_address(address):
+    """'host:port' is a TCP address, 'unix:/path/to/socket' a Unix domain socket."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+class _Subscriber:
+    """A connected client and the frames still to be sent to it."""
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.frames = collections.deque()
+        self.buffered = 0 # Bytes in frames
+        self.sent = 0 # Bytes of frames[0] already sent
+        self.events = selectors.EVENT_READ
+        self.dropped = False
+        self.slow = False # Dropped for falling too far behind
+
+
+class LivePublisher:
+    """
+    Serves the live samples and event comments to other processes, over
+    TCP or a Unix domain socket (see parse_address), for any number of
+    subscribers. LiveSubscriber is the matching client.
+
+    write_block() and write_event() only pack one frame and queue it for
+    each subscriber, so they never wait on the network; a server thread
+    does the sending. A subscriber that falls more than max_buffer_bytes
+    behind is disconnected rather than allowed to hold up the others or
+    use unbounded memory. With no subscribers, publishing costs nothing.
+    """
+    def __init__(self, config_details, address="127.0.0.1:5760", max_buffer_bytes=16 << 20,
+                 clock=default_clock):
+        self.config_details = config_details
+        self.address = address
+        self.max_buffer_bytes = int(max_buffer_bytes)
+        self.clock = clock
+        self.channels = config_details.get("channels")
+        self.dtype = record_dtype(self.channels)
+        self.subscribers = []
+        self.frames_sent = 0
+        self.dropped_subscribers = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._wake_r = self._wake_w = None
+        self._hello = None # Sent to each new subscriber
+        self._thread = None
+        self._stopping = False
+
+    def open(self):
+        """Starts listening. Returns True on success."""
+        try:
+            family, sockaddr = parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(sockaddr):
+                os.remove(sockaddr) # Left over from an earlier run
+            self._listener = socket.socket(family, socket.SOCK_STREAM)
+            if family == socket.AF_INET:
+                self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind(sockaddr)
+            self._listener.listen()
+            self._listener.setblocking(False)
+            self._wake_r, self._wake_w = socket.socketpair()
+            self._wake_r.setblocking(False)
+            self._wake_w.setblocking(False)
+            self._hello = self._frame(HELLO, json.dumps({
+                "dtype": self.dtype.descr,
+                "channels": self.channels,
+                "instrument_name": self.config_details.get("instrument_name", "Unknown"),
+                "start_time": self.config_details.get("start_time") or self.clock.now_iso(),
+            }).encode())
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="publisher", daemon=True)
+            self._thread.start()
+            print(f"Publishing live data on {self.address}")
+            return True
+        except Exception as e:
+            print(f"Error opening LivePublisher: {e}")
+            return False
+
+    @staticmethod
+    def _frame(kind, payload):
+        return FRAME.pack(kind, len(payload)) + payload
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """Queues one frame of records for every subscriber."""
+        if not self.subscribers:
+            return
+        records = np.empty(len(timestamps), dtype=self.dtype)
+        records["timestamp"] = timestamps
+        records["raw"] = raw_data
+        records["filtered"] = filtered_data
+        self._publish(self._frame(SAMPLES, records.tobytes()))
+
+    def write_event(self, timestamp_ns, comment):
+        """Queues an event comment for every subscriber."""
+        if self.subscribers:
+            self._publish(self._frame(EVENT, EVENT_TIME.pack(timestamp_ns) + comment.encode()))
+
+    def _publish(self, frame):
+        with self._lock:
+            for subscriber in self.subscribers:
+                if subscriber.dropped:
+                    continue
+                if subscriber.buffered + len(frame) > self.max_buffer_bytes:
+                    subscriber.slow = subscriber.dropped = True # The server thread disconnects it
+                    continue
+                subscriber.frames.append(frame)
+                subscriber.buffered += len(frame)
+        self._wake()
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass # Already awake
+
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        selector.register(self._listener, selectors.EVENT_READ)
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        try:
+            while not self._stopping:
+                for key, mask in selector.select(timeout=0.5):
+                    if key.fileobj is self._listener:
+                        self._accept(selector)
+                    elif key.fileobj is self._wake_r:
+                        try:
+                            while self._wake_r.recv(4096):
+                                pass
+                        except BlockingIOError:
+                            pass
+                    else:
+                        subscriber = key.data
+                        if mask & selectors.EVENT_READ and not self._readable(subscriber):
+                            subscriber.dropped = True
+                        if mask & selectors.EVENT_WRITE and not subscriber.dropped:
+                            self._send(subscriber)
+                self._update(selector)
+        finally:
+            selector.close()
+
+    def _accept(self, selector):
+        try:
+            sock, address = self._listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        subscriber = _Subscriber(sock, address)
+        subscriber.frames.append(self._hello)
+        subscriber.buffered = len(self._hello)
+        selector.register(sock, subscriber.events, subscriber)
+        with self._lock:
+            self.subscribers = self.subscribers + [subscriber]
+        print(f"Live data subscriber connected: {address or self.address}")
+
+    @staticmethod
+    def _readable(subscriber):
+        """Subscribers don't send anything; reading only tells us they hung up."""
+        try:
+            return bool(subscriber.sock.recv(4096))
+        except BlockingIOError:
+            return True
+        except OSError:
+            return False
+
+    def _send(self, subscriber):
+        """Sends queued frames until the socket would block."""
+        frames = subscriber.frames
+        try:
+            while frames:
+                frame = frames[0]
+                subscriber.sent += subscriber.sock.send(memoryview(frame)[subscriber.sent:])
+                if subscriber.sent < len(frame):
+                    break
+                frames.popleft()
+                subscriber.sent = 0
+                self.frames_sent += 1
+                with self._lock:
+                    subscriber.buffered -= len(frame)
+        except BlockingIOError:
+            pass
+        except OSError:
+            subscriber.dropped = True
+
+    def _update(self, selector):
+        """Disconnects dropped subscribers and watches the others for writability."""
+        for subscriber in self.subscribers:
+            if subscriber.dropped:
+                self._disconnect(selector, subscriber)
+                continue
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if subscriber.frames else 0)
+            if events != subscriber.events:
+                subscriber.events = events
+                selector.modify(subscriber.sock, events, subscriber)
+
+    def _disconnect(self, selector, subscriber):
+        with self._lock:
+            self.subscribers = [s for s in self.subscribers if s is not subscriber]
+        if subscriber.slow:
+            self.dropped_subscribers += 1
+            print(f"Disconnected slow live data subscriber: {subscriber.address or self.address}")
+        selector.unregister(subscriber.sock)
+        subscriber.sock.close()
+
+    def snapshot(self):
+        return {
+            "subscribers": len(self.subscribers),
+            "frames_sent": self.frames_sent,
+            "dropped_subscribers": self.dropped_subscribers,
+            "buffered_bytes": [s.buffered for s in self.subscribers],
+        }
+
+    def close(self, timeout=1.0):
+        """Sends what is still queued (for up to timeout seconds each) and stops serving."""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wake()
+        self._thread.join()
+        self._thread = None
+        for subscriber in self.subscribers:
+            try:
+                subscriber.sock.settimeout(timeout)
+                if subscriber.frames and not subscriber.dropped:
+                    subscriber.sock.sendall(memoryview(subscriber.frames.popleft())[subscriber.sent:])
+                    for frame in subscriber.frames:
+                        subscriber.sock.sendall(frame)
+            except OSError:
+                pass
+            subscriber.sock.close()
+        self.subscribers = []
+        for sock in (self._listener, self._wake_r, self._wake_w):
+            sock.close()
+        family, sockaddr = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.remove(sockaddr)
+        print(f"Stopped publishing on {self.address}")
+
+
+class LiveSubscriber:
+    """
+    Receives the live data of a running acquisition from a LivePublisher:
+
+        with LiveSubscriber("127.0.0.1:5760") as live:
+            for kind, data in live:
+                if kind == "samples":
+                    print(data["timestamp"], data["raw"])
+                else:
+                    timestamp_ns, comment = data
+
+    metadata holds the run's channels, instrument name and start time,
+    and samples arrive as structured arrays of dtype (see record_dtype).
+    Iteration ends when the run stops.
+    """
+    def __init__(self, address="127.0.0.1:5760", timeout=None):
+        family, sockaddr = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout) # For connecting and every read
+        self.sock.connect(sockaddr)
+        self._file = self.sock.makefile('rb')
+        kind, payload = self._read_frame()
+        if kind != HELLO:
+            raise ConnectionError(f"Not a DacDAQ publisher: {address}")
+        self.metadata = json.loads(payload)
+        self.dtype = header_dtype(self.metadata)
+        self.channels = self.metadata.get("channels")
+
+    def _read_exact(self, n):
+        data = self._file.read(n)
+        if len(data) < n:
+            raise EOFError("Publisher closed the connection")
+        return data
+
+    def _read_frame(self):
+        kind, size = FRAME.unpack(self._read_exact(FRAME.size))
+        return kind, self._read_exact(size)
+
+    def receive(self):
+        """
+        The next frame, as ("samples", records) or ("event",
+        (timestamp_ns, comment)). Raises EOFError once the run ends.
+        """
+        while True:
+            kind, payload = self._read_frame()
+            if kind == SAMPLES:
+                return "samples", np.frombuffer(payload, dtype=self.dtype)
+            if kind == EVENT:
+                (timestamp,) = EVENT_TIME.unpack_from(payload)
+                return "event", (timestamp, payload[EVENT_TIME.size:].decode())
+            # Skip kinds added by newer publishers
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.receive()
+        except EOFError:
+            return
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,168 @@
+import json
+import os
+import numpy as np
+from dacdaq.core.clock import default_clock, format_iso
+
+MANIFEST_VERSION = 1
+
+
+def segment_path_for(filepath, index):
+    """'run.csv', 3 -> 'run.000003.csv'"""
+    base, ext = filepath.rsplit('.', 1)
+    return f"{base}.{index:06d}.{ext}"
+
+
+def manifest_path_for(filepath):
+    """'run.csv' -> 'run.manifest.json'"""
+    return f"{filepath.rsplit('.', 1)[0]}.manifest.json"
+
+
+class RotatingSink:
+    """
+    Splits a sink's output into segment files, starting a new one once
+    the current one reaches max_bytes or covers max_seconds of samples.
+
+    Each segment is a complete file of its own (header included), made by
+    make_sink() and written as <segment>.partial; it is fsync'd and
+    renamed to its final name when it is committed, so a crash never
+    leaves a half-written file under a final name. After every commit the
+    manifest (run.manifest.json for run.csv) is rewritten, atomically,
+    listing every segment with its time range and row count, so readers
+    can open only the segments they need (see runs.load_run()).
+
+    Wraps CsvSink (write_block) and EventSink (write_event) alike; data
+    blocks are split exactly at max_seconds boundaries.
+    """
+    def __init__(self, make_sink, filepath, max_bytes=None, max_seconds=None,
+                 clock=default_clock):
+        self.make_sink = make_sink
+        self.filepath = filepath # The un-rotated name, e.g. run.csv
+        self.manifest_path = manifest_path_for(filepath)
+        self.max_bytes = max_bytes
+        self.max_ns = None if max_seconds is None else round(max_seconds * 1e9)
+        self.clock = clock
+        self.sink = None
+        self.segments = [] # Committed segments, as written to the manifest
+        self.index = 0
+        self.rows = 0
+        self.first_ns = None
+        self.last_ns = None
+
+    @property
+    def file_handle(self):
+        return self.sink.file_handle if self.sink else None
+
+    def open(self):
+        """Starts the first segment."""
+        self.segments = []
+        self.index = 0
+        return self._start_segment()
+
+    def _start_segment(self):
+        self.sink = self.make_sink()
+        self.sink.filepath = f"{segment_path_for(self.filepath, self.index)}.partial"
+        self.rows = 0
+        self.first_ns = self.last_ns = None
+        return self.sink.open()
+
+    def _commit_segment(self):
+        """Closes the current segment under its final name and updates the manifest."""
+        partial = self.sink.filepath
+        final = partial[:-len(".partial")]
+        self.sink.flush(fsync=True)
+        self.sink.close()
+        self.sink = None
+        os.replace(partial, final)
+        self.segments.append({
+            "file": os.path.basename(final),
+            "rows": self.rows,
+            "first_timestamp_ns": self.first_ns,
+            "last_timestamp_ns": self.last_ns,
+            "start_time": None if self.first_ns is None else str(format_iso(self.first_ns)),
+            "end_time": None if self.last_ns is None else str(format_iso(self.last_ns)),
+        })
+        self.index += 1
+        self._write_manifest(complete=False)
+
+    def _write_manifest(self, complete):
+        # Write then rename, like BinarySink's header
+        with open(f"{self.manifest_path}.tmp", 'w') as f:
+            json.dump({
+                "format_version": MANIFEST_VERSION,
+                "file": os.path.basename(self.filepath),
+                "complete": complete,
+                "segments": self.segments,
+            }, f, indent=4)
+        os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+
+    def _rotate(self):
+        self._commit_segment()
+        if not self._start_segment():
+            raise IOError(f"Could not open segment {self.sink.filepath}")
+
+    def _record(self, first_ns, last_ns, rows):
+        if self.first_ns is None:
+            self.first_ns = int(first_ns)
+        self.last_ns = int(last_ns)
+        self.rows += rows
+
+    def _full(self):
+        return (self.max_bytes is not None
+                and self.sink.file_handle.tell() >= self.max_bytes)
+
+    def _boundary(self):
+        """Timestamp at which the current segment has to end, or None."""
+        if self.max_ns is None or self.first_ns is None:
+            return None
+        return self.first_ns + self.max_ns
+
+    def write_block(self, timestamps, raw_data, filtered_data):
+        """Writes a block, splitting it across segments where needed."""
+        timestamps = np.asarray(timestamps)
+        raw_data = np.asarray(raw_data)
+        filtered_data = np.asarray(filtered_data)
+        while len(timestamps):
+            boundary = self._boundary()
+            n = len(timestamps)
+            if boundary is not None:
+                n = int(np.searchsorted(timestamps, boundary, side='left'))
+                if n == 0:
+                    self._rotate()
+                    continue
+            self.sink.write_block(timestamps[:n], raw_data[:n], filtered_data[:n])
+            self._record(timestamps[0], timestamps[n - 1], n)
+            timestamps, raw_data, filtered_data = timestamps[n:], raw_data[n:], filtered_data[n:]
+            if len(timestamps) or self._full():
+                self._rotate()
+
+    def write(self, raw_data, filtered_data):
+        """Writes a single sample, timestamped now."""
+        self.write_block([self.clock.now_ns()], [raw_data], [filtered_data])
+
+    def write_event(self, comment, timestamp_ns=None):
+        """Writes an event to the current segment, rotating first if it is due."""
+        now = self.clock.now_ns() if timestamp_ns is None else timestamp_ns
+        boundary = self._boundary()
+        if boundary is not None and now >= boundary:
+            self._rotate()
+        self.sink.write_event(comment, timestamp_ns=now)
+        self._record(now, now, 1)
+        if self._full():
+            self._rotate()
+
+    def flush(self, fsync=False):
+        if self.sink:
+            self.sink.flush(fsync=fsync)
+
+    def close(self):
+        """Commits the last segment (unless it is an empty extra one) and completes the manifest."""
+        if self.sink is None:
+            return
+        if self.rows or not self.segments:
+            self._commit_segment()
+        else:
+            partial = self.sink.filepath
+            self.sink.close()
+            self.sink = None
+            os.remove(partial)
+        self._write_manifest(complete=True)
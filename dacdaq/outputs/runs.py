@@ -0,0 +1,334 @@
+import json
+import os
+import shutil
+import numpy as np
+from dacdaq.core.clock import to_local_datetime64
+from .binary_sink import BinaryRun, csv_to_binary, iter_csv_blocks, record_dtype
+from .compressed_sink import CompressedRun
+from .event_sink import events_path_for, read_events
+from .rotation import manifest_path_for
+
+SOURCE_NAME = "source.json" # Signature of the CSV a cache was made from
+
+class CsvRun:
+    """
+    A CsvSink file loaded into memory, with the same read interface as
+    BinaryRun, so analysis and viewing code doesn't care which format a
+    run was recorded in.
+    """
+    def __init__(self, csv_path, block_rows=100_000):
+        self.run_path = csv_path
+        self.source_path = csv_path
+        self.header = {}
+        parts = []
+        for metadata, timestamps, raw, filtered in iter_csv_blocks(csv_path, block_rows):
+            self.header = metadata
+            block = np.empty(len(timestamps), dtype=record_dtype(metadata.get("channels")))
+            block["timestamp"] = timestamps
+            block["raw"] = raw
+            block["filtered"] = filtered
+            parts.append(block)
+        self.channels = self.header.get("channels")
+        self.dtype = record_dtype(self.channels)
+        self._records = np.concatenate(parts) if parts else np.empty(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self._records)
+
+    def read(self, start=0, stop=None):
+        """Returns records start..stop as a structured array view."""
+        return self._records[start:stop]
+
+    @property
+    def records(self):
+        return self._records
+
+    @property
+    def timestamps(self):
+        """Timestamps as datetime64[ns]."""
+        return self._records["timestamp"].view("datetime64[ns]")
+
+    @property
+    def raw(self):
+        return self._records["raw"]
+
+    @property
+    def filtered(self):
+        return self._records["filtered"]
+
+
+def cache_path_for(csv_path):
+    """Where the binary cache of a CSV run goes: next to it, as <csv>.cache.dqrun."""
+    return f"{csv_path}.cache.dqrun"
+
+
+def cached_binary_run(csv_path, rebuild=False):
+    """
+    A CsvSink file as a BinaryRun, from its binary sidecar cache.
+
+    The first call converts the CSV (see csv_to_binary) and records the
+    CSV's size and modification time next to the records; later calls
+    just memory-map the cache, unless the CSV has changed since.
+    """
+    cache_path = cache_path_for(csv_path)
+    signature = run_signature(csv_path)
+    if not rebuild:
+        try:
+            with open(os.path.join(cache_path, SOURCE_NAME)) as f:
+                if json.load(f) == signature:
+                    return BinaryRun(cache_path)
+        except (OSError, ValueError):
+            pass
+
+    # Convert to a temporary name, so a crash never leaves a half-built cache
+    tmp_path = f"{csv_path}.cache.tmp.dqrun"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    csv_to_binary(csv_path, tmp_path)
+    with open(os.path.join(tmp_path, SOURCE_NAME), 'w') as f:
+        json.dump(signature, f)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+    return BinaryRun(cache_path)
+
+
+def is_manifest(path):
+    return path.endswith(".manifest.json")
+
+
+def read_manifest(manifest_path):
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def segments_between(manifest, start_ns=None, stop_ns=None):
+    """The manifest's segments holding any samples from start_ns..stop_ns."""
+    return [
+        segment for segment in manifest["segments"]
+        if segment["rows"]
+        and (start_ns is None or segment["last_timestamp_ns"] >= start_ns)
+        and (stop_ns is None or segment["first_timestamp_ns"] <= stop_ns)
+    ]
+
+
+class SegmentedRun:
+    """
+    A run written in segments by RotatingSink, read through its manifest
+    with the same interface as BinaryRun.
+
+    Only the segments overlapping start_ns..stop_ns are opened (each
+    through open_run, so through its own binary cache), which makes
+    reading an hour of a week-long run cost about an hour of data.
+    """
+    def __init__(self, manifest_path, start_ns=None, stop_ns=None, cache=True):
+        self.run_path = manifest_path
+        self.source_path = manifest_path
+        self.manifest = read_manifest(manifest_path)
+        directory = os.path.dirname(manifest_path)
+        self.segments = [
+            open_run(os.path.join(directory, segment["file"]), cache=cache)
+            for segment in segments_between(self.manifest, start_ns, stop_ns)
+        ]
+        self.header = self.segments[0].header if self.segments else {}
+        self.channels = self.header.get("channels")
+        self.dtype = record_dtype(self.channels)
+        self._offsets = np.cumsum([0] + [len(s) for s in self.segments])
+
+    def __len__(self):
+        return int(self._offsets[-1])
+
+    def read(self, start=0, stop=None):
+        """Returns records start..stop, counted across the opened segments."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = max(0, min(start, stop))
+        parts = []
+        for segment, offset in zip(self.segments, self._offsets):
+            lo = max(start - offset, 0)
+            hi = min(stop - offset, len(segment))
+            if lo < hi:
+                parts.append(segment.read(lo, hi))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, dtype=self.dtype)
+        return np.concatenate(parts)
+
+    @property
+    def records(self):
+        return self.read()
+
+    @property
+    def timestamps(self):
+        """Timestamps as datetime64[ns]."""
+        return self.records["timestamp"].view("datetime64[ns]")
+
+    @property
+    def raw(self):
+        return self.records["raw"]
+
+    @property
+    def filtered(self):
+        return self.records["filtered"]
+
+
+def open_run(path, cache=True, start_ns=None, stop_ns=None):
+    """
+    Opens a recorded run: a .dqrun or .dqz directory, a CsvSink .csv
+    file or the manifest of a rotated run. A .csv name that was rotated opens its
+    manifest. CSV runs are read through their binary cache (see
+    cached_binary_run), or parsed into memory with cache=False or if the
+    cache can't be written. start_ns/stop_ns limit which segments of a
+    rotated run are opened. run.source_path is the path that was opened.
+    """
+    path = path.rstrip(os.sep)
+    if not os.path.exists(path) and os.path.exists(manifest_path_for(path)):
+        path = manifest_path_for(path)
+    if is_manifest(path):
+        return SegmentedRun(path, start_ns, stop_ns, cache=cache)
+    if path.endswith(".dqz"):
+        return CompressedRun(path)
+    if os.path.isdir(path):
+        run = BinaryRun(path)
+    elif cache:
+        try:
+            run = cached_binary_run(path)
+        except OSError as e:
+            print(f"Could not cache {path}, reading it directly: {e}")
+            return CsvRun(path)
+    else:
+        return CsvRun(path)
+    run.source_path = path
+    return run
+
+
+class LoadedRun:
+    """
+    A recorded run's samples as NumPy arrays, with its metadata and the
+    comments from its event log.
+
+    timestamps and event_timestamps are int64 nanoseconds since the
+    epoch. raw and filtered have one column per channel for
+    multi-channel runs. For big runs the arrays are memory-mapped
+    from the binary cache rather than loaded.
+    """
+    def __init__(self, run, events=None, records=None):
+        self.path = run.source_path
+        self.metadata = run.header
+        self.channels = run.channels
+        records = run.records if records is None else records
+        self.timestamps = records["timestamp"]
+        self.raw = records["raw"]
+        self.filtered = records["filtered"]
+        self.event_timestamps, self.event_comments = events or (np.empty(0, dtype=np.int64), [])
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def to_dataframe(self):
+        """The samples as a DataFrame indexed by local time, with the CsvSink column names."""
+        import pandas as pd
+        from .csv_sink import column_names
+
+        names = column_names(self.channels)
+        n = len(self)
+        table = np.empty((n, len(names) - 1))
+        table[:, 0::2] = np.asarray(self.raw).reshape(n, -1)
+        table[:, 1::2] = np.asarray(self.filtered).reshape(n, -1)
+        return pd.DataFrame(table, columns=names[1:], index=_local_index(self.timestamps))
+
+    def events_dataframe(self):
+        """The event comments as a DataFrame indexed by local time."""
+        import pandas as pd
+
+        return pd.DataFrame({"Event_Comment": self.event_comments},
+                            index=_local_index(self.event_timestamps))
+
+
+def _local_index(timestamps):
+    """Local wall-clock times, matching the CSV's timestamp column."""
+    import pandas as pd
+
+    return pd.DatetimeIndex(to_local_datetime64(timestamps), name="Timestamp")
+
+
+def read_run_events(path, start_ns=None, stop_ns=None):
+    """
+    The event log of the run at path (as opened by open_run), or None if
+    it has none. Rotated event logs are read from the segments covering
+    start_ns..stop_ns.
+    """
+    if is_manifest(path):
+        path = os.path.join(os.path.dirname(path), read_manifest(path)["file"])
+    events_path = events_path_for(path)
+    if os.path.exists(events_path):
+        return read_events(events_path)
+    manifest_path = manifest_path_for(events_path)
+    if not os.path.exists(manifest_path):
+        return None
+    directory = os.path.dirname(manifest_path)
+    times, comments = [np.empty(0, dtype=np.int64)], []
+    for segment in segments_between(read_manifest(manifest_path), start_ns, stop_ns):
+        segment_times, segment_comments = read_events(os.path.join(directory, segment["file"]))
+        times.append(segment_times)
+        comments += segment_comments
+    return np.concatenate(times), comments
+
+
+def _in_range(timestamps, start_ns, stop_ns):
+    """The slice of sorted timestamps within start_ns..stop_ns."""
+    first = 0 if start_ns is None else int(np.searchsorted(timestamps, start_ns, side='left'))
+    last = len(timestamps) if stop_ns is None else int(np.searchsorted(timestamps, stop_ns, side='right'))
+    return slice(first, last)
+
+
+def load_run(path, as_dataframe=False, cache=True, start_ns=None, stop_ns=None):
+    """
+    Loads a recorded run (CsvSink .csv, .dqrun, .dqz or a rotated run's
+    manifest) and its events.
+
+    Returns a LoadedRun of NumPy arrays, or with as_dataframe=True a
+    (samples, events) pair of DataFrames. CSV files are converted to a
+    binary sidecar cache on first load, so later loads take
+    milliseconds; see cached_binary_run. start_ns/stop_ns (int64
+    nanoseconds since the epoch) keep only that time range; for a
+    rotated run only the segments it touches are read.
+    """
+    run = open_run(path, cache=cache, start_ns=start_ns, stop_ns=stop_ns)
+    events = read_run_events(run.source_path, start_ns, stop_ns)
+    records = None
+    if start_ns is not None or stop_ns is not None:
+        if isinstance(run, CompressedRun):
+            # Only decompress the blocks in range
+            records = run.read_time(np.iinfo(np.int64).min if start_ns is None else start_ns,
+                                    np.iinfo(np.int64).max if stop_ns is None else stop_ns)
+        else:
+            records = run.records
+            records = records[_in_range(records["timestamp"], start_ns, stop_ns)]
+        if events:
+            keep = _in_range(events[0], start_ns, stop_ns)
+            events = (events[0][keep], events[1][keep])
+    loaded = LoadedRun(run, events, records)
+    if as_dataframe:
+        return loaded.to_dataframe(), loaded.events_dataframe()
+    return loaded
+
+
+def run_files(path):
+    """
+    The files a run is stored in, for telling whether it changed since
+    something was derived from it.
+    """
+    if not os.path.isdir(path):
+        return [path] # A rotated run's manifest changes with every segment
+    return sorted(
+        os.path.join(path, name) for name in os.listdir(path)
+        if name in ("header.json", "blocks.bin", "index.npy") or name.startswith("chunk_")
+    )
+
+
+def run_signature(path):
+    """(name, size, mtime_ns) of each of the run's files."""
+    signature = []
+    for file_path in run_files(path):
+        stat = os.stat(file_path)
+        signature.append([os.path.basename(file_path), stat.st_size, stat.st_mtime_ns])
+    return signature
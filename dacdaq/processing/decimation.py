@@ -0,0 +1,50 @@
+import numpy as np
+
+def minmax_indices(values, n_bins):
+    """
+    Picks the indices of the minimum and maximum of each of n_bins
+    equal-width bins, in the order they occur.
+
+    Plotting only these points (two per screen pixel) draws the same
+    envelope as plotting every sample, so single-sample glitches stay
+    visible however far the plot is zoomed out. Returns all indices when
+    there are fewer than 2 * n_bins values.
+
+    For values shaped (n, channels) every channel is decimated at once
+    and the indices come back shaped (m, channels), one column per
+    channel; pick the points with np.take_along_axis(values, indices, 0).
+    """
+    n = len(values)
+    n_bins = max(1, int(n_bins))
+    channels = np.shape(values)[1:]
+    if n <= 2 * n_bins:
+        indices = np.arange(n)
+        return np.repeat(indices[:, None], channels[0], axis=1) if channels else indices
+
+    bin_size = -(-n // n_bins) # ceil division
+    n_full = n // bin_size
+    full = values[:n_full * bin_size].reshape((n_full, bin_size) + channels)
+    offsets = (np.arange(n_full) * bin_size).reshape((n_full,) + (1,) * len(channels))
+    lo = [full.argmin(axis=1) + offsets]
+    hi = [full.argmax(axis=1) + offsets]
+
+    # The last, partial bin
+    if n_full * bin_size < n:
+        tail = values[n_full * bin_size:]
+        lo.append(tail.argmin(axis=0)[None] + n_full * bin_size)
+        hi.append(tail.argmax(axis=0)[None] + n_full * bin_size)
+
+    lo = np.concatenate(lo)
+    hi = np.concatenate(hi)
+    # Emit each bin's two points in time order so the trace stays monotonic
+    pairs = np.stack((np.minimum(lo, hi), np.maximum(lo, hi)), axis=1)
+    return pairs.reshape((-1,) + channels)
+
+
+def minmax_decimate(x, y, n_bins):
+    """
+    Reduces (x, y) to the min/max points of n_bins bins of y.
+    See minmax_indices().
+    """
+    indices = minmax_indices(y, n_bins)
+    return x[indices], y[indices]
@@ -1,26 +1,549 @@
+import bisect
+import math
+from collections import deque
 import numpy as np
 
-class MovingAverageFilter:
+class StreamingFilter:
+    """
+    Base class for filters that keep their state between calls.
+
+    process() takes one sample and process_block() takes an array of
+    samples along axis 0; both give the same results, so a stream can be
+    fed in any mix of single values and blocks. Extra trailing axes are
+    treated as independent channels.
+    """
+    def process(self, new_value):
+        """Adds one value and returns the filtered value."""
+        return self.process_block(np.asarray(new_value, dtype=np.float64)[np.newaxis])[0]
+
+    def process_block(self, values):
+        """Adds an array of values and returns the filtered array."""
+        raise NotImplementedError
+
+    def reset(self):
+        """Forgets all previous input."""
+        raise NotImplementedError
+
+
+class MovingAverageFilter(StreamingFilter):
     """
     A simple moving average filter.
+
+    Keeps a running sum, so each sample costs O(1) whatever the window
+    size. Until the window has filled, the output is the mean of the
+    samples seen so far rather than being pulled towards zero. A NaN
+    sample (a failed read) makes the output NaN only while it is in the
+    window; the running sum skips it and counts it separately.
     """
     def __init__(self, window_size=5):
         self.window_size = int(window_size)
         if self.window_size < 1:
             self.window_size = 1
-        # Create a buffer for the window
-        self.buffer = np.zeros(self.window_size)
+        self.reset()
+
+    def reset(self):
+        self.buffer = None # Created on first input, shaped like it
         self.pointer = 0 # To track where in the buffer we are
-    
+        self.count = 0 # Valid samples in the buffer
+        self.total = 0.0 # Sum of the non-NaN samples in the buffer
+        self.nans = 0 # NaN samples in the buffer, per channel
+        self.nan_samples = 0 # Samples in the buffer with a NaN in any channel
+
+    def _ensure_buffer(self, shape):
+        if self.buffer is None:
+            self.buffer = np.zeros((self.window_size,) + shape)
+            self.total = np.zeros(shape)
+            self.nans = np.zeros(shape, dtype=np.int64)
+
+    def _average(self, total, nans, count):
+        return np.where(nans > 0, np.nan, total / count)
+
     def process(self, new_value):
         """
         Adds a new value to the filter and returns the new average.
         """
-        # Add the new value to the buffer
+        new_value = np.asarray(new_value, dtype=np.float64)
+        self._ensure_buffer(new_value.shape)
+
+        # Swap the oldest value for the new one in the running sum. NaNs
+        # are counted instead of summed, and only looked for when present.
+        missing = np.isnan(new_value)
+        if self.count == self.window_size:
+            oldest = self.buffer[self.pointer]
+            if self.nan_samples:
+                gone = np.isnan(oldest)
+                if np.count_nonzero(gone):
+                    self.nan_samples -= 1
+                    self.nans = self.nans - gone
+                    oldest = np.where(gone, 0.0, oldest)
+            self.total = self.total - oldest
+        else:
+            self.count += 1
         self.buffer[self.pointer] = new_value
-        
+        if np.count_nonzero(missing):
+            self.nan_samples += 1
+            self.nans = self.nans + missing
+            new_value = np.where(missing, 0.0, new_value)
+        self.total = self.total + new_value
+
         # Increment the pointer, wrapping around if necessary
         self.pointer = (self.pointer + 1) % self.window_size
-        
-        # Calculate and return the mean of the buffer
-        return np.mean(self.buffer)
\ No newline at end of file
+        if self.pointer == 0:
+            # Once per window, rebuild the sum to stop rounding errors piling up
+            if self.nan_samples:
+                self.total = np.nansum(self.buffer, axis=0)
+            else:
+                self.total = self.buffer.sum(axis=0)
+
+        if self.nan_samples:
+            return self._average(self.total, self.nans, self.count)[()]
+        return self.total / self.count
+
+    def process_block(self, values):
+        """
+        Adds an array of values and returns the average after each one.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return values.copy()
+        self._ensure_buffer(values.shape[1:])
+
+        # Valid window contents oldest-to-newest, followed by the new values
+        if self.count < self.window_size:
+            history = self.buffer[:self.count]
+        else:
+            history = np.roll(self.buffer, -self.pointer, axis=0)
+        extended = np.concatenate((history, values))
+
+        # Separate running sums of the non-NaN values and of the NaN count,
+        # so a NaN only reaches the windows that contain it
+        missing = np.isnan(extended)
+        zero = np.zeros((1,) + values.shape[1:])
+        cumulative = np.concatenate(
+            (zero, np.cumsum(np.where(missing, 0.0, extended), axis=0))
+        )
+        cumulative_nans = np.concatenate(
+            (zero.astype(np.int64), np.cumsum(missing, axis=0))
+        )
+
+        # Output i averages extended[start:end] for end = len(history) + i + 1
+        w = self.window_size
+        end = len(history) + np.arange(1, n + 1)
+        start = np.maximum(end - w, 0)
+        counts = (end - start).reshape((n,) + (1,) * (values.ndim - 1))
+        averages = self._average(
+            cumulative[end] - cumulative[start],
+            cumulative_nans[end] - cumulative_nans[start],
+            counts,
+        )
+
+        # Keep the newest window for the next call
+        kept = extended[-w:]
+        self.count = len(kept)
+        self.buffer[:self.count] = kept
+        self.pointer = self.count % w
+        self.total = np.nansum(kept, axis=0)
+        self.nans = np.isnan(kept).sum(axis=0)
+        self.nan_samples = int(np.isnan(kept).reshape(len(kept), -1).any(axis=1).sum())
+        return averages
+
+
+class AllPoleSection:
+    """
+    The recursion y[n] = v[n] - a[1] y[n-1] - ... - a[p] y[n-p], run over
+    whole blocks with NumPy.
+
+    A block is cut into segments of `segment` samples. Within a segment
+    the output is a fixed linear function of the input and of the last p
+    outputs before it, so every segment is computed with two small matrix
+    products and only the p-sample state is carried forward in Python.
+    """
+    def __init__(self, a, segment=256):
+        self.a = np.asarray(a, dtype=np.float64)
+        self.order = len(self.a)
+        L = self.segment = int(segment)
+
+        # Impulse response of the recursion, truncated to one segment
+        h = np.zeros(L)
+        h[0] = 1.0
+        for i in range(1, L):
+            k = min(i, self.order)
+            h[i] = -np.dot(self.a[:k], h[i - 1::-1][:k])
+        # Zero-state response: H[i, j] = h[i - j]
+        index = np.arange(L)[:, None] - np.arange(L)[None, :]
+        self.H = np.where(index >= 0, h[np.clip(index, 0, L - 1)], 0.0)
+
+        # Zero-input response to each of the p previous outputs (oldest first)
+        self.G = np.zeros((L, self.order))
+        for j in range(self.order):
+            history = np.zeros(self.order)
+            history[j] = 1.0
+            self.G[:, j] = self._run_scalar(np.zeros(L), history)
+        self.history = None
+
+    def _run_scalar(self, v, history):
+        history = list(history)
+        out = np.empty(len(v))
+        for i, x in enumerate(v):
+            y = x - np.dot(self.a, history[::-1][:self.order])
+            history = history[1:] + [y]
+            out[i] = y
+        return out
+
+    def reset(self, history=None):
+        """Sets the previous p outputs, oldest first (zeros if None)."""
+        self.history = history
+
+    def step(self, v):
+        """Runs the recursion for one input value."""
+        v = np.asarray(v, dtype=np.float64)
+        if self.history is None:
+            self.history = np.zeros((self.order,) + v.shape)
+        y = v - np.tensordot(self.a[::-1], self.history, axes=1)
+        self.history = np.concatenate((self.history[1:], y[np.newaxis]))
+        return y
+
+    def run(self, v):
+        """Runs the recursion over a block along axis 0."""
+        v = np.asarray(v, dtype=np.float64)
+        n = len(v)
+        trailing = v.shape[1:]
+        if self.history is None:
+            self.history = np.zeros((self.order,) + trailing)
+        if n == 0:
+            return v.copy()
+
+        # A NaN makes every later output NaN, as step() would; zero it for
+        # the matrix products so it can't leak into earlier outputs too
+        poisoned = np.logical_or.accumulate(np.isnan(v), axis=0)
+
+        L = self.segment
+        m = -(-n // L)
+        padded = np.zeros((m * L,) + trailing)
+        padded[:n] = np.where(poisoned, 0.0, v)
+        segments = padded.reshape((m, L) + trailing)
+        zero_state = np.einsum('ij,mj...->mi...', self.H, segments)
+
+        history = self.history
+        for k in range(m):
+            zero_state[k] += np.tensordot(self.G, history, axes=1)
+            history = zero_state[k, L - self.order:]
+        y = zero_state.reshape((m * L,) + trailing)[:n]
+        y[poisoned] = np.nan
+
+        # Padding only affects outputs after the real ones, but the state
+        # must come from real outputs
+        self.history = np.concatenate((self.history, y))[-self.order:]
+        return y
+
+
+class ExponentialMovingAverageFilter(StreamingFilter):
+    """
+    An exponential moving average, y += alpha * (x - y).
+
+    Give either alpha (0 < alpha <= 1) or span, with alpha = 2 / (span + 1)
+    as in pandas. The output starts at the first input instead of zero.
+    """
+    def __init__(self, alpha=None, span=None):
+        if alpha is None:
+            alpha = 2.0 / (float(span if span is not None else 10) + 1.0)
+        self.alpha = float(np.clip(alpha, 1e-12, 1.0))
+        self.section = AllPoleSection([-(1.0 - self.alpha)])
+        self.reset()
+
+    def reset(self):
+        self.started = False
+        self.section.reset()
+
+    def _start(self, first_value):
+        if not self.started:
+            self.section.reset(np.asarray(first_value, dtype=np.float64)[np.newaxis])
+            self.started = True
+
+    def process(self, new_value):
+        self._start(new_value)
+        return self.section.step(self.alpha * np.asarray(new_value, dtype=np.float64))
+
+    def process_block(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values.copy()
+        self._start(values[0])
+        return self.section.run(self.alpha * values)
+
+
+class FilterChain(StreamingFilter):
+    """
+    Runs several filters one after another. An empty chain passes
+    values through unchanged.
+    """
+    def __init__(self, filters=()):
+        self.filters = list(filters)
+
+    def reset(self):
+        for f in self.filters:
+            f.reset()
+
+    def process(self, new_value):
+        value = np.asarray(new_value, dtype=np.float64)
+        for f in self.filters:
+            value = f.process(value)
+        return value
+
+    def process_block(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        for f in self.filters:
+            values = f.process_block(values)
+        return values
+
+
+class RunningMedianFilter(StreamingFilter):
+    """
+    A running median over the last window_size samples.
+
+    process() keeps each channel's window as a sorted list, so a new
+    sample costs one binary search plus a memmove instead of a sort.
+    process_block() instead takes np.median of all full windows at once,
+    which is faster for whole blocks than stepping the sorted lists; the
+    two give the same results. Until the window has filled, the output is
+    the median of the samples seen so far. While a NaN sample (a failed
+    read) is in the window the output is NaN, as np.median gives; NaNs
+    are counted rather than stored in the sorted lists, since they can't
+    be ordered.
+    """
+    def __init__(self, window_size=5):
+        self.window_size = max(1, int(window_size))
+        self.reset()
+
+    def reset(self):
+        self.window = deque() # Chronological, one entry per sample
+        self.sorted = None # One sorted list per channel, rebuilt lazily
+        self.nans = None # NaNs in the window per channel, kept out of the lists
+
+    def _rebuild_sorted(self, shape):
+        n_channels = int(np.prod(shape))
+        history = np.array(self.window, dtype=np.float64).reshape(-1, n_channels)
+        self.sorted = [
+            sorted(v for v in channel if not math.isnan(v)) for channel in history.T.tolist()
+        ]
+        self.nans = np.isnan(history).sum(axis=0).tolist()
+
+    @staticmethod
+    def _median(sorted_values):
+        n = len(sorted_values)
+        mid = n // 2
+        if n % 2:
+            return sorted_values[mid]
+        return 0.5 * (sorted_values[mid - 1] + sorted_values[mid])
+
+    def process(self, new_value):
+        new_value = np.asarray(new_value, dtype=np.float64)
+        if self.sorted is None:
+            self._rebuild_sorted(new_value.shape)
+        if len(self.window) == self.window_size:
+            oldest = np.ravel(self.window.popleft())
+            for c, (values, old) in enumerate(zip(self.sorted, oldest.tolist())):
+                if math.isnan(old):
+                    self.nans[c] -= 1
+                else:
+                    del values[bisect.bisect_left(values, old)]
+        self.window.append(new_value)
+
+        medians = []
+        for c, (values, new) in enumerate(zip(self.sorted, np.ravel(new_value).tolist())):
+            if math.isnan(new):
+                self.nans[c] += 1
+            else:
+                bisect.insort(values, new)
+            medians.append(math.nan if self.nans[c] else self._median(values))
+        return np.array(medians).reshape(new_value.shape)[()]
+
+    def process_block(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if n == 0:
+            return values.copy()
+        w = self.window_size
+        history = np.array(self.window, dtype=np.float64).reshape((-1,) + values.shape[1:])
+        extended = np.concatenate((history, values))
+        out = np.empty_like(values)
+
+        # Outputs before the window has filled see fewer samples
+        n_short = max(0, min(n, w - 1 - len(history)))
+        for i in range(n_short):
+            out[i] = np.median(extended[:len(history) + i + 1], axis=0)
+
+        # Everything else is a full window
+        if n_short < n:
+            windows = np.lib.stride_tricks.sliding_window_view(extended, w, axis=0)
+            out[n_short:] = np.median(windows[len(windows) - (n - n_short):], axis=-1)
+
+        self.window = deque(extended[-w:])
+        self.sorted = None
+        return out
+
+
+class FIRFilter(StreamingFilter):
+    """
+    A finite impulse response filter, y[n] = sum_k taps[k] * x[n - k].
+
+    initial="zeros" starts from silence, like a textbook FIR;
+    initial="edge" pretends the first sample had been there forever,
+    which avoids a start-up transient for smoothing filters.
+    """
+    def __init__(self, taps, initial="zeros"):
+        self.taps = np.asarray(taps, dtype=np.float64)
+        if self.taps.ndim != 1 or len(self.taps) == 0:
+            raise ValueError("FIR taps must be a non-empty 1-D list")
+        self.initial = initial
+        self.reset()
+
+    def reset(self):
+        self.history = None # The last len(taps) - 1 inputs, oldest first
+
+    def _ensure_history(self, first_value):
+        if self.history is None:
+            fill = first_value if self.initial == "edge" else np.zeros_like(first_value)
+            self.history = np.repeat(fill[np.newaxis], len(self.taps) - 1, axis=0)
+
+    def process(self, new_value):
+        new_value = np.asarray(new_value, dtype=np.float64)
+        self._ensure_history(new_value)
+        window = np.concatenate((self.history, new_value[np.newaxis]))
+        self.history = window[1:]
+        return np.tensordot(self.taps[::-1], window, axes=1)[()]
+
+    def process_block(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values.copy()
+        self._ensure_history(values[0])
+        extended = np.concatenate((self.history, values))
+        windows = np.lib.stride_tricks.sliding_window_view(extended, len(self.taps), axis=0)
+        self.history = extended[len(extended) - (len(self.taps) - 1):]
+        return windows @ self.taps[::-1]
+
+
+class SavitzkyGolayFilter(FIRFilter):
+    """
+    A causal Savitzky-Golay smoother: fits a polynomial of degree
+    polyorder to the last window_size samples and returns its value
+    (or its deriv-th derivative, per sample) at the newest sample.
+
+    Being causal it adds no delay, at the cost of a little more noise than
+    the centred version. It is a fixed FIR filter, started with "edge"
+    history so the first outputs aren't pulled towards zero.
+    """
+    def __init__(self, window_size=11, polyorder=2, deriv=0):
+        window_size = int(window_size)
+        polyorder = int(polyorder)
+        if polyorder >= window_size:
+            raise ValueError("polyorder must be less than window_size")
+        self.window_size = window_size
+        self.polyorder = polyorder
+        self.deriv = int(deriv)
+
+        # Least-squares fit over positions -(w-1)..0; evaluating the fit
+        # (or its derivative) at 0 picks out one coefficient of the solution.
+        positions = np.arange(-(window_size - 1), 1, dtype=np.float64)
+        design = positions[:, np.newaxis] ** np.arange(polyorder + 1)
+        coefficients = np.linalg.pinv(design)[self.deriv] * math.factorial(self.deriv)
+        # coefficients[i] weights position i (oldest first); taps run newest first
+        super().__init__(coefficients[::-1], initial="edge")
+
+
+class BiquadFilter(StreamingFilter):
+    """
+    A second-order IIR section,
+    y[n] = b0 x[n] + b1 x[n-1] + b2 x[n-2] - a1 y[n-1] - a2 y[n-2].
+
+    b and a are the usual coefficient lists; a is normalised so a[0] = 1.
+    The lowpass(), highpass() and notch() constructors use the standard
+    audio-EQ cookbook designs.
+    """
+    def __init__(self, b, a=(1.0, 0.0, 0.0)):
+        b = np.asarray(b, dtype=np.float64)
+        a = np.asarray(a, dtype=np.float64)
+        if len(b) != 3 or len(a) != 3:
+            raise ValueError("A biquad needs exactly three b and three a coefficients")
+        self.b = b / a[0]
+        self.a = a / a[0]
+        self.fir = FIRFilter(self.b)
+        self.section = AllPoleSection(self.a[1:])
+
+    def reset(self):
+        self.fir.reset()
+        self.section.reset()
+
+    def process(self, new_value):
+        return self.section.step(self.fir.process(new_value))[()]
+
+    def process_block(self, values):
+        return self.section.run(self.fir.process_block(values))
+
+    @staticmethod
+    def _cookbook(cutoff, sample_rate, q):
+        w0 = 2.0 * np.pi * float(cutoff) / float(sample_rate)
+        return np.cos(w0), np.sin(w0) / (2.0 * float(q))
+
+    @classmethod
+    def lowpass(cls, cutoff, sample_rate, q=0.7071):
+        cos_w0, alpha = cls._cookbook(cutoff, sample_rate, q)
+        b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+        return cls(b, [1 + alpha, -2 * cos_w0, 1 - alpha])
+
+    @classmethod
+    def highpass(cls, cutoff, sample_rate, q=0.7071):
+        cos_w0, alpha = cls._cookbook(cutoff, sample_rate, q)
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        return cls(b, [1 + alpha, -2 * cos_w0, 1 - alpha])
+
+    @classmethod
+    def notch(cls, cutoff, sample_rate, q=30.0):
+        """A narrow notch, e.g. for 50/60 Hz mains pickup."""
+        cos_w0, alpha = cls._cookbook(cutoff, sample_rate, q)
+        b = [1.0, -2 * cos_w0, 1.0]
+        return cls(b, [1 + alpha, -2 * cos_w0, 1 - alpha])
+
+
+class SosFilter(FilterChain):
+    """
+    A general IIR filter as cascaded second-order sections. Each row of
+    sos is [b0, b1, b2, a0, a1, a2], the same layout SciPy uses, so
+    designs made elsewhere can be pasted into a config file.
+    """
+    def __init__(self, sos):
+        super().__init__([BiquadFilter(row[:3], row[3:]) for row in sos])
+
+
+# Filter types usable in the "filters" config key
+FILTER_TYPES = {
+    "moving_average": MovingAverageFilter,
+    "ema": ExponentialMovingAverageFilter,
+    "median": RunningMedianFilter,
+    "savgol": SavitzkyGolayFilter,
+    "fir": FIRFilter,
+    "biquad": BiquadFilter,
+    "lowpass": BiquadFilter.lowpass,
+    "highpass": BiquadFilter.highpass,
+    "notch": BiquadFilter.notch,
+    "sos": SosFilter,
+}
+
+DEFAULT_FILTERS = [{"type": "moving_average", "window_size": 10}]
+
+
+def build_filter_chain(specs):
+    """
+    Builds a FilterChain from a config list such as
+    [{"type": "moving_average", "window_size": 10}, {"type": "ema", "span": 5}].
+    """
+    filters = []
+    for spec in specs:
+        spec = dict(spec)
+        filter_type = spec.pop("type")
+        if filter_type not in FILTER_TYPES:
+            raise ValueError(f"Unknown filter type: {filter_type}")
+        filters.append(FILTER_TYPES[filter_type](**spec))
+    return FilterChain(filters)
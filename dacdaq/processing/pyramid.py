@@ -0,0 +1,174 @@
+import json
+import os
+import shutil
+import numpy as np
+from dacdaq.outputs.runs import run_signature
+
+FORMAT_VERSION = 1
+HEADER_NAME = "header.json"
+FIELDS = ("raw", "filtered")
+
+
+def level_dtype(value_dtype):
+    """
+    The record layout of a pyramid level for a run with records of
+    value_dtype: each bin's first timestamp, its sample count, and the
+    min, max and mean of raw and filtered (one per channel).
+    """
+    shape = value_dtype["raw"].shape
+    fields = [("timestamp", "<i8"), ("count", "<i8")]
+    for field in FIELDS:
+        for stat in ("min", "max", "mean"):
+            fields.append((f"{field}_{stat}", "<f8", shape))
+    return np.dtype(fields)
+
+
+def reduce_bins(bins, factor, dtype):
+    """
+    Combines every factor consecutive bins into one. NaN (a missing
+    reading) is ignored unless a whole bin is NaN.
+    """
+    n = len(bins)
+    starts = np.arange(0, n, factor)
+    out = np.empty(len(starts), dtype=dtype)
+    if n == 0:
+        return out
+    # reduceat over each group is several times faster than reducing a
+    # reshaped (groups, factor) array along its short axis
+    out["timestamp"] = bins["timestamp"][starts]
+    counts = bins["count"]
+    out["count"] = np.add.reduceat(counts, starts)
+    for field in FIELDS:
+        for stat, reduce in (("min", np.fmin), ("max", np.fmax)):
+            out[f"{field}_{stat}"] = reduce.reduceat(bins[f"{field}_{stat}"], starts, axis=0)
+        means = bins[f"{field}_mean"]
+        weights = counts.reshape(counts.shape + (1,) * (means.ndim - 1)) * ~np.isnan(means)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[f"{field}_mean"] = (np.add.reduceat(np.nan_to_num(means) * weights, starts, axis=0)
+                                    / np.add.reduceat(weights, starts, axis=0))
+    return out
+
+
+def records_to_bins(records, dtype):
+    """Turns raw records into level-0 bins of one sample each."""
+    bins = np.empty(len(records), dtype=dtype)
+    bins["timestamp"] = records["timestamp"]
+    bins["count"] = 1
+    for field in FIELDS:
+        for stat in ("min", "max", "mean"):
+            bins[f"{field}_{stat}"] = records[field]
+    return bins
+
+
+def pyramid_path_for(run_path):
+    """Where the pyramid of a run is cached: next to it, as <run>.lod."""
+    return f"{run_path.rstrip(os.sep)}.lod"
+
+
+class MinMaxPyramid:
+    """
+    A level-of-detail index of a recorded run, for drawing any time range
+    at screen resolution without touching every sample.
+
+    Level 0 is the run itself. Level k has one bin per factor**k samples,
+    holding the first timestamp, sample count, and min/max/mean of raw
+    and filtered. Levels are built once, streaming over the run, and
+    cached next to it as .npy files in a .lod directory, which are
+    memory-mapped when opened. The cache is rebuilt when the run's files
+    change.
+    """
+    def __init__(self, run, levels, factor):
+        self.run = run
+        self.levels = levels # Level 1 upwards
+        self.factor = factor
+
+    @classmethod
+    def build(cls, run, factor=16, min_bins=1024, block_bins=65536):
+        """Builds the levels of run in memory, reading it block_bins bins at a time."""
+        dtype = level_dtype(run.dtype)
+        block_rows = block_bins * factor
+        parts = [
+            reduce_bins(records_to_bins(run.read(start, start + block_rows), dtype), factor, dtype)
+            for start in range(0, len(run), block_rows)
+        ]
+        levels = [np.concatenate(parts) if parts else np.empty(0, dtype=dtype)]
+        while len(levels[-1]) > min_bins:
+            levels.append(reduce_bins(levels[-1], factor, dtype))
+        return cls(run, levels, factor)
+
+    def save(self, path, signature):
+        """Writes the levels to a .lod directory, replacing any old one."""
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for k, level in enumerate(self.levels, start=1):
+            np.save(os.path.join(tmp_path, f"level_{k:02d}.npy"), level)
+        with open(os.path.join(tmp_path, HEADER_NAME), 'w') as f:
+            json.dump({
+                "format_version": FORMAT_VERSION,
+                "factor": self.factor,
+                "levels": len(self.levels),
+                "source": signature,
+            }, f, indent=4)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, run, path, signature=None):
+        """
+        Opens a cached pyramid, memory-mapped. Returns None if there is
+        none, or it doesn't match signature.
+        """
+        try:
+            with open(os.path.join(path, HEADER_NAME)) as f:
+                header = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if header.get("format_version") != FORMAT_VERSION:
+            return None
+        if signature is not None and header.get("source") != signature:
+            return None
+        levels = [
+            np.load(os.path.join(path, f"level_{k:02d}.npy"), mmap_mode='r')
+            for k in range(1, header["levels"] + 1)
+        ]
+        return cls(run, levels, header["factor"])
+
+    @classmethod
+    def for_run(cls, run, rebuild=False):
+        """The run's cached pyramid, built and saved first if it is missing or stale."""
+        path = pyramid_path_for(run.source_path)
+        signature = run_signature(run.source_path)
+        pyramid = None if rebuild else cls.load(run, path, signature)
+        if pyramid is None:
+            pyramid = cls.build(run)
+            try:
+                pyramid.save(path, signature)
+            except OSError as e:
+                print(f"Could not cache pyramid at {path}: {e}")
+        return pyramid
+
+    def query(self, start_ns, stop_ns, max_points):
+        """
+        The finest data covering start_ns..stop_ns in at most about
+        max_points rows, plus one row either side so lines run off the
+        edges. Returns (level, records): level 0 gives run records,
+        higher levels give bins of level_dtype.
+        """
+        if not self.levels or len(self.levels[0]) == 0:
+            return 0, self.run.read()
+        first, last = self._bin_range(self.levels[0], start_ns, stop_ns)
+        if (last - first) * self.factor <= max_points:
+            return 0, self.run.read(first * self.factor, last * self.factor)
+        for k, level in enumerate(self.levels, start=1):
+            first, last = self._bin_range(level, start_ns, stop_ns)
+            if last - first <= max_points or k == len(self.levels):
+                return k, level[first:last]
+
+    @staticmethod
+    def _bin_range(level, start_ns, stop_ns):
+        """Indices of the bins overlapping start_ns..stop_ns, widened by one each side."""
+        times = level["timestamp"]
+        first = max(0, int(np.searchsorted(times, start_ns, side='right')) - 2)
+        last = min(len(level), int(np.searchsorted(times, stop_ns, side='right')) + 1)
+        return first, last
@@ -0,0 +1,169 @@
+import threading
+import numpy as np
+from dacdaq.core.stages import BoundedQueue, concatenate_blocks
+
+class WelchPSD:
+    """
+    A Welch power spectral density estimate, updated as samples arrive.
+
+    The stream is cut into segments of nperseg samples overlapping by
+    overlap (a fraction), each with its mean removed and a Hann window
+    applied; their one-sided periodograms (V**2/Hz, scaled as
+    scipy.signal.welch does) are averaged. With averages=None every
+    segment since reset() counts equally; with averages=N the oldest
+    fade out, so the estimate follows the last N or so segments. All the
+    complete segments in a block are transformed in one rfft call.
+
+    Extra trailing axes are treated as independent channels.
+    """
+    def __init__(self, sample_rate, nperseg=4096, overlap=0.5, averages=32):
+        self.sample_rate = float(sample_rate)
+        self.nperseg = max(2, int(nperseg))
+        self.step = max(1, int(round(self.nperseg * (1 - overlap))))
+        self.averages = None if averages is None else max(1, int(averages))
+        # Periodic Hann window, as scipy.signal.get_window("hann", nperseg)
+        self.window = 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.nperseg) / self.nperseg)
+        self.scale = 1.0 / (self.sample_rate * (self.window ** 2).sum())
+        self.frequencies = np.fft.rfftfreq(self.nperseg, 1.0 / self.sample_rate)
+        self.reset()
+
+    def reset(self):
+        """Forgets all previous input and the average so far."""
+        self.tail = None # Samples not yet in a complete segment
+        self.average = None
+        self.segments = 0
+
+    def restart(self):
+        """Starts the next segment afresh after a gap in the stream, keeping the average."""
+        self.tail = None
+
+    def update(self, values):
+        """Adds a block of samples; returns the number of new segments averaged."""
+        values = np.asarray(values, dtype=np.float64)
+        if self.tail is not None:
+            values = np.concatenate((self.tail, values))
+        n_segments = (len(values) - self.nperseg) // self.step + 1 if len(values) >= self.nperseg else 0
+        self.tail = values[n_segments * self.step:]
+        if n_segments == 0:
+            return 0
+
+        # (segment, sample, channels...) views, without copying
+        segments = np.lib.stride_tricks.sliding_window_view(values, self.nperseg, axis=0)
+        segments = np.moveaxis(segments[:n_segments * self.step:self.step], -1, 1)
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        window = self.window.reshape((-1,) + (1,) * (values.ndim - 1))
+        power = np.abs(np.fft.rfft(segments * window, axis=1)) ** 2 * self.scale
+        # One-sided: fold the negative frequencies onto the positive ones
+        power[:, 1:-1 if self.nperseg % 2 == 0 else None] *= 2
+
+        if self.average is None:
+            self.average = np.zeros_like(power[0])
+        if self.averages:
+            # Exponential average, one segment at a time
+            for periodogram in power:
+                self.segments += 1
+                self.average += (periodogram - self.average) / min(self.segments, self.averages)
+        else:
+            self.segments += n_segments
+            self.average += (power.mean(axis=0) - self.average) * (n_segments / self.segments)
+        return n_segments
+
+    def psd(self):
+        """(frequencies, psd), or None until the first segment is complete."""
+        if self.average is None:
+            return None
+        return self.frequencies, self.average.copy()
+
+
+class SpectrumStage(threading.Thread):
+    """
+    Computes a WelchPSD of the raw samples on its own thread, so the FFTs
+    never hold up acquisition or the GUI.
+
+    write_block() only queues the block (dropping the oldest queued
+    blocks if this thread falls behind) and latest() returns the newest
+    estimate. The sample rate is sample_rate, or measured from the first
+    block's timestamps. A jump in the timestamps of more than gap_factor
+    sample periods (a pause, or dropped blocks) starts the next segment
+    afresh instead of joining unrelated samples.
+    """
+    def __init__(self, sample_rate=None, nperseg=4096, overlap=0.5, averages=32,
+                 max_blocks=256, gap_factor=3.0):
+        super().__init__(name="spectrum", daemon=True)
+        self.sample_rate = sample_rate
+        self.settings = {"nperseg": nperseg, "overlap": overlap, "averages": averages}
+        self.gap_factor = gap_factor
+        self.queue = BoundedQueue(max_blocks, overflow="drop_oldest")
+        self.psd = None # WelchPSD, once the sample rate is known
+        self.version = 0 # Bumped with every new estimate
+        self.error = None
+        self._latest = None
+        self._last_timestamp = None
+        self._reset = False
+        self._lock = threading.Lock()
+
+    def write_block(self, timestamps, raw_data, filtered_data=None):
+        """Queues raw samples for the spectrum. Never blocks."""
+        if len(timestamps):
+            self.queue.put((np.asarray(timestamps), np.asarray(raw_data)), len(timestamps))
+
+    def reset(self):
+        """Starts a new average (and measures the sample rate again, if it was measured)."""
+        self._reset = True
+
+    def latest(self):
+        """(frequencies, psd, segments averaged, sample rate) of the newest estimate, or None."""
+        with self._lock:
+            return self._latest
+
+    def run(self):
+        try:
+            while True:
+                batch = self.queue.get_batch(timeout=0.1)
+                if not batch:
+                    if self.queue.finished:
+                        break
+                    continue
+                if self._reset:
+                    self._reset = False
+                    self.psd = None
+                    self._last_timestamp = None
+                    with self._lock:
+                        self._latest = None
+                timestamps, raw = concatenate_blocks(batch)
+                self._update(timestamps, raw)
+        except Exception as e:
+            print(f"Error in spectrum thread: {e}")
+            self.error = e
+
+    def _update(self, timestamps, raw):
+        if self.psd is None:
+            sample_rate = self.sample_rate
+            if sample_rate is None:
+                if len(timestamps) < 2:
+                    return
+                sample_rate = 1e9 / np.median(np.diff(timestamps))
+            self.psd = WelchPSD(sample_rate, **self.settings)
+
+        # Split the block at gaps, so no segment spans one
+        previous = timestamps[0] if self._last_timestamp is None else self._last_timestamp
+        gaps = np.diff(timestamps, prepend=previous) > self.gap_factor * 1e9 / self.psd.sample_rate
+        bounds = np.concatenate(([0], np.flatnonzero(gaps), [len(raw)]))
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            if gaps[start]:
+                self.psd.restart()
+            self._feed(raw[start:stop])
+        self._last_timestamp = timestamps[-1]
+
+    def _feed(self, raw):
+        if self.psd.update(raw):
+            frequencies, psd = self.psd.psd()
+            with self._lock:
+                self._latest = (frequencies, psd, self.psd.segments, self.psd.sample_rate)
+                self.version += 1
+
+    def close(self):
+        """Stops the thread once what is queued has been processed."""
+        self.queue.close()
+        if self.is_alive():
+            self.join()
@@ -1,17 +1,11 @@
 import json # <-- 1. IMPORT JSON
 from PyQt6.QtWidgets import (
     QDialog, QVBoxLayout, QFormLayout, QLineEdit, QComboBox,
-    QDialogButtonBox, QFileDialog, QTextEdit, QPushButton, QHBoxLayout
+    QDialogButtonBox, QFileDialog, QTextEdit, QPushButton, QHBoxLayout,
+    QSpinBox, QCheckBox, QDoubleSpinBox
 )
-from dacdaq.inputs.simulated import SimulatedInstrument
-from dacdaq.inputs.keithley2000 import Keithley2000
-
-AVAILABLE_INSTRUMENTS = {
-    SimulatedInstrument().get_name(): SimulatedInstrument,
-    Keithley2000().get_name(): Keithley2000,
-}
-# Create a reverse map for loading
-INSTRUMENT_CLASS_TO_NAME = {v: k for k, v in AVAILABLE_INSTRUMENTS.items()}
+from PyQt6.QtCore import Qt
+from dacdaq.inputs import AVAILABLE_INSTRUMENTS
 
 
 class ConfigDialog(QDialog):
@@ -19,12 +13,20 @@ class ConfigDialog(QDialog):
     A dialog to configure the acquisition.
     Now supports saving and loading configurations.
     """
+    # Config keys edited by the dialog's own widgets
+    WIDGET_KEYS = ("instrument_name", "output_file", "comments", "plot_fps", "plot_window",
+                   "profile", "sample_rate")
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Configure New Acquisition")
         self.setMinimumWidth(400)
         
         self.config = {}
+        # Settings without widgets (instrument_settings, writer_settings, ...)
+        # round-trip unchanged through saved config files
+        self.extra_config = {}
+        self.settings_instrument = None # The instrument instrument_settings were saved for
 
         layout = QVBoxLayout(self)
         
@@ -45,7 +47,17 @@ class ConfigDialog(QDialog):
         form_layout = QFormLayout()
 
         self.instrument_combo = QComboBox()
-        self.instrument_combo.addItems(AVAILABLE_INSTRUMENTS.keys())
+        # Only the selected driver gets imported, when OK is pressed
+        for name in AVAILABLE_INSTRUMENTS:
+            entry = AVAILABLE_INSTRUMENTS.entry(name)
+            tooltip = entry.description
+            # Plugins that don't declare capabilities would have to be imported
+            if entry.declared_capabilities is not None:
+                tooltip += f"\nCapabilities: {', '.join(entry.declared_capabilities)}"
+            self.instrument_combo.addItem(name)
+            self.instrument_combo.setItemData(
+                self.instrument_combo.count() - 1, tooltip.strip(), Qt.ItemDataRole.ToolTipRole
+            )
         form_layout.addRow("Instrument:", self.instrument_combo)
 
         self.file_path_edit = QLineEdit()
@@ -58,6 +70,34 @@ class ConfigDialog(QDialog):
         file_layout.addWidget(self.browse_button)
         form_layout.addRow("Output File (CSV):", file_layout)
         
+        self.sample_rate_spin = QDoubleSpinBox()
+        self.sample_rate_spin.setRange(0, 1_000_000)
+        self.sample_rate_spin.setDecimals(3)
+        self.sample_rate_spin.setSuffix(" samples/s")
+        self.sample_rate_spin.setSpecialValueText("As fast as the instrument")
+        form_layout.addRow("Sample Rate:", self.sample_rate_spin)
+
+        self.plot_fps_spin = QSpinBox()
+        self.plot_fps_spin.setRange(1, 120)
+        self.plot_fps_spin.setValue(30)
+        self.plot_fps_spin.setSuffix(" fps")
+        form_layout.addRow("Plot Refresh Rate:", self.plot_fps_spin)
+
+        self.plot_window_spin = QSpinBox()
+        self.plot_window_spin.setRange(100, 50_000_000)
+        self.plot_window_spin.setValue(10000)
+        self.plot_window_spin.setSingleStep(1000)
+        self.plot_window_spin.setSuffix(" samples")
+        form_layout.addRow("Live Plot Window:", self.plot_window_spin)
+
+        self.profile_check = QCheckBox("Capture cProfile and tracemalloc (slower)")
+        self.profile_check.setToolTip(
+            "Profiles the reader, processing and writer threads and saves "
+            "<output>.prof, <output>.<stage>.prof and <output>.tracemalloc.txt "
+            "when the run ends"
+        )
+        form_layout.addRow("Profiling:", self.profile_check)
+
         self.comments_edit = QTextEdit()
         self.comments_edit.setPlaceholderText("Enter details: setup, who is present, goals...")
         form_layout.addRow("Comments:", self.comments_edit)
@@ -81,14 +121,30 @@ class ConfigDialog(QDialog):
             self.file_path_edit.setText(file_name)
             self.ok_button.setEnabled(True)
 
+    def _extra_config_for(self, instrument_name):
+        """
+        The settings without widgets, leaving out instrument_settings if
+        they were saved for a different instrument than instrument_name.
+        """
+        extra = dict(self.extra_config)
+        if "instrument_settings" in extra and instrument_name != self.settings_instrument:
+            print(f"Not using the instrument settings saved for {self.settings_instrument}")
+            del extra["instrument_settings"]
+        return extra
+
     def accept(self):
         # ... (unchanged)
         instrument_name = self.instrument_combo.currentText()
         self.config = {
+            **self._extra_config_for(instrument_name),
             "instrument_name": instrument_name,
             "instrument_class": AVAILABLE_INSTRUMENTS[instrument_name],
             "output_file": self.file_path_edit.text(),
-            "comments": self.comments_edit.toPlainText()
+            "comments": self.comments_edit.toPlainText(),
+            "plot_fps": self.plot_fps_spin.value(),
+            "plot_window": self.plot_window_spin.value(),
+            "profile": self.profile_check.isChecked(),
+            "sample_rate": self.sample_rate_spin.value() or None,
         }
         super().accept()
 
@@ -113,6 +169,15 @@ class ConfigDialog(QDialog):
             self.instrument_combo.setCurrentText(config_data.get("instrument_name", ""))
             self.file_path_edit.setText(config_data.get("output_file", ""))
             self.comments_edit.setPlainText(config_data.get("comments", ""))
+            self.plot_fps_spin.setValue(config_data.get("plot_fps", 30))
+            self.plot_window_spin.setValue(config_data.get("plot_window", 10000))
+            self.profile_check.setChecked(config_data.get("profile", False))
+            self.sample_rate_spin.setValue(config_data.get("sample_rate") or 0)
+            self.extra_config = {
+                key: value for key, value in config_data.items()
+                if key not in self.WIDGET_KEYS
+            }
+            self.settings_instrument = config_data.get("instrument_name")
             
             # Enable OK button if a file path was loaded
             if self.file_path_edit.text():
@@ -133,10 +198,16 @@ class ConfigDialog(QDialog):
             return
 
         # Create config data from current fields
+        instrument_name = self.instrument_combo.currentText()
         config_data = {
-            "instrument_name": self.instrument_combo.currentText(),
+            **self._extra_config_for(instrument_name),
+            "instrument_name": instrument_name,
             "output_file": self.file_path_edit.text(),
             "comments": self.comments_edit.toPlainText(),
+            "plot_fps": self.plot_fps_spin.value(),
+            "plot_window": self.plot_window_spin.value(),
+            "profile": self.profile_check.isChecked(),
+            "sample_rate": self.sample_rate_spin.value() or None,
         }
         
         try:
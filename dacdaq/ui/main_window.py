@@ -1,10 +1,17 @@
+import time
 import numpy as np
 import pyqtgraph as pg
 from PyQt6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QLineEdit, QCheckBox, QDoubleSpinBox
+    QPushButton, QLabel, QLineEdit, QCheckBox, QDoubleSpinBox, QGroupBox
 )
-from PyQt6.QtCore import QThread, Qt
+from PyQt6.QtCore import QThread, QTimer, Qt
+from PyQt6.QtGui import QFontDatabase
+from dacdaq.core.history import HistoryStore
+from dacdaq.core.ring_buffer import SampleRingBuffer
+from dacdaq.core.sources import channel_labels
+from dacdaq.processing.decimation import minmax_indices
+from dacdaq.processing.spectrum import SpectrumStage
 from dacdaq.core.worker import AcquisitionWorker
 
 class DacDaqWindow(QMainWindow):
@@ -18,9 +25,35 @@ class DacDaqWindow(QMainWindow):
         self.setWindowTitle(f"DacDAQ - Logging to: {config['output_file']}")
         self.setGeometry(100, 100, 800, 750) 
 
-        # Buffers
-        self.raw_data_buffer = np.zeros(500)
-        self.filtered_data_buffer = np.zeros(500)
+        # One channel, or one per instrument channel (see channel_labels)
+        try:
+            self.channel_labels = channel_labels(config)
+        except Exception as e:
+            # e.g. instrument_settings the instrument doesn't accept; the
+            # run fails with the same error and shows it when it starts
+            print(f"Error reading the instrument's channels: {e}")
+            self.channel_labels = None
+        n_channels = len(self.channel_labels) if self.channel_labels else 1
+
+        # The whole run, for panning back; the live view follows the
+        # newest plot_window samples
+        self.plot_window = max(100, int(config.get("plot_window", 10000)))
+        self.history = HistoryStore(
+            channels=self.channel_labels,
+            memory_budget=int(config.get("history_memory_mb", 256) * 2**20)
+        )
+        self.n_channels = n_channels
+
+        # The worker writes into this; we drain it once per frame
+        self.plot_buffer = SampleRingBuffer(
+            n_channels=len(self.channel_labels) if self.channel_labels else None
+        )
+        self.plot_fps = max(1, int(config.get("plot_fps", 30)))
+        self.frame_timer = QTimer(self)
+        self.frame_timer.setInterval(int(1000 / self.plot_fps))
+        self.frame_timer.timeout.connect(self.refresh_plots)
+        self.last_frame_time = None
+        self.dropped_frames = 0
         
         # --- Plot Widget ---
         pg.setConfigOption("background", "w")
@@ -31,17 +64,36 @@ class DacDaqWindow(QMainWindow):
         self.plot_widget.setLabel("bottom", "Time (samples)")
         self.plot_widget.showGrid(x=True, y=True, alpha=0.5)
         
-        self.raw_plot_curve = self.plot_widget.plot(
-            pen=pg.mkPen('k', width=1, style=Qt.PenStyle.DotLine), 
-            name="Raw Data"
-        )
-        self.filtered_plot_curve = self.plot_widget.plot(
-            pen=pg.mkPen('r', width=2), 
-            name="Filtered Data"
-        )
+        if self.channel_labels is None:
+            self.raw_plot_curves = [self.plot_widget.plot(
+                pen=pg.mkPen('k', width=1, style=Qt.PenStyle.DotLine), 
+                name="Raw Data"
+            )]
+            self.filtered_plot_curves = [self.plot_widget.plot(
+                pen=pg.mkPen('r', width=2), 
+                name="Filtered Data"
+            )]
+        else:
+            # A colour per channel: dotted raw, solid filtered
+            self.raw_plot_curves = []
+            self.filtered_plot_curves = []
+            for i, label in enumerate(self.channel_labels):
+                color = pg.intColor(i, hues=max(n_channels, 2))
+                self.raw_plot_curves.append(self.plot_widget.plot(
+                    pen=pg.mkPen(color, width=1, style=Qt.PenStyle.DotLine),
+                    name=f"{label} (raw)"
+                ))
+                self.filtered_plot_curves.append(self.plot_widget.plot(
+                    pen=pg.mkPen(color, width=2), name=label
+                ))
+        for curve in self.raw_plot_curves + self.filtered_plot_curves:
+            curve.setClipToView(True)
+        # Re-decimate for the new range when the user pans or zooms
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.on_view_range_changed)
 
         self.acquisition_thread = None
         self.acquisition_worker = None
+        self.last_error = None # Kept on screen once the run has stopped
 
         # --- Main Layout ---
         self.central_widget = QWidget()
@@ -51,6 +103,52 @@ class DacDaqWindow(QMainWindow):
 
         self.status_label = QLabel(f"Instrument: {config['instrument_name']}")
         main_layout.addWidget(self.status_label)
+
+        self.plot_stats_label = QLabel()
+        main_layout.addWidget(self.plot_stats_label)
+
+        # --- Collapsible Performance Panel ---
+        self.perf_group = QGroupBox("Performance statistics")
+        self.perf_group.setCheckable(True)
+        self.perf_group.setChecked(False)
+        perf_layout = QVBoxLayout(self.perf_group)
+        self.perf_label = QLabel("No acquisition running.")
+        self.perf_label.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        self.perf_label.setVisible(False)
+        perf_layout.addWidget(self.perf_label)
+        self.perf_group.toggled.connect(self.toggle_perf_panel)
+        main_layout.addWidget(self.perf_group)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.setInterval(500)
+        self.perf_timer.timeout.connect(self.refresh_perf_panel)
+
+        # --- Collapsible Spectrum Panel ---
+        self.spectrum = None # SpectrumStage, while the panel is open
+        self.spectrum_version = -1
+        self.spectrum_group = QGroupBox("Spectrum (Welch PSD of raw data)")
+        self.spectrum_group.setCheckable(True)
+        self.spectrum_group.setChecked(False)
+        spectrum_layout = QVBoxLayout(self.spectrum_group)
+        self.spectrum_widget = pg.PlotWidget()
+        self.spectrum_widget.setLogMode(x=False, y=True)
+        self.spectrum_widget.setLabel("left", "PSD (V²/Hz)")
+        self.spectrum_widget.setLabel("bottom", "Frequency (Hz)")
+        self.spectrum_widget.showGrid(x=True, y=True, alpha=0.5)
+        self.spectrum_widget.setMinimumHeight(200)
+        self.spectrum_curves = [
+            self.spectrum_widget.plot(pen=pg.mkPen(
+                'k' if self.channel_labels is None else pg.intColor(i, hues=max(n_channels, 2)),
+                width=1
+            ))
+            for i in range(n_channels)
+        ]
+        self.spectrum_label = QLabel("Waiting for data...")
+        for widget in (self.spectrum_widget, self.spectrum_label):
+            widget.setVisible(False)
+            spectrum_layout.addWidget(widget)
+        self.spectrum_group.toggled.connect(self.toggle_spectrum_panel)
+        self.spectrum_group.setChecked(bool(config.get("show_spectrum", False)))
+        main_layout.addWidget(self.spectrum_group)
         
         # --- Event Log Layout ---
         event_layout = QHBoxLayout()
@@ -119,15 +217,23 @@ class DacDaqWindow(QMainWindow):
         self.acquisition_thread = QThread()
         self.acquisition_worker = AcquisitionWorker(
             self.config["instrument_class"], 
-            self.config
+            self.config,
+            plot_buffer=self.plot_buffer
         )
         self.acquisition_worker.moveToThread(self.acquisition_thread)
         self.acquisition_thread.started.connect(self.acquisition_worker.run_acquisition)
-        self.acquisition_worker.data_ready.connect(self.update_raw_plot)
-        self.acquisition_worker.processed_data_ready.connect(self.update_filtered_plot)
         self.acquisition_worker.finished.connect(self.on_acquisition_finished)
         self.acquisition_worker.error.connect(self.on_acquisition_error)
+        self.acquisition_worker.warning.connect(self.on_acquisition_warning)
 
+        self.plot_buffer.clear()
+        self.last_error = None
+        if self.spectrum:
+            self.spectrum.reset()
+        self.dropped_frames = 0
+        self.last_frame_time = None
+        self.frame_timer.start()
+        self.perf_timer.start()
         self.acquisition_thread.start()
         
         self.start_button.setEnabled(False)
@@ -154,37 +260,173 @@ class DacDaqWindow(QMainWindow):
         if self.acquisition_thread:
             self.acquisition_thread.quit()
             self.acquisition_thread.wait()
-        
+
+        # Keep the final numbers on screen
+        self.perf_timer.stop()
+        self.refresh_perf_panel()
         self.acquisition_thread = None
         self.acquisition_worker = None
+
+        # Show whatever arrived after the last frame
+        self.frame_timer.stop()
+        self.refresh_plots()
         
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
         self.pause_button.setEnabled(False)
         self.pause_button.setText("Pause")
-        self.status_label.setText("Acquisition Stopped. Ready to start again.")
+        if self.last_error:
+            self.status_label.setText(f"ERROR: {self.last_error}")
+        else:
+            self.status_label.setText("Acquisition Stopped. Ready to start again.")
         
         self.event_entry_box.setEnabled(False)
         self.add_event_button.setEnabled(False)
         
+    def on_acquisition_warning(self, msg):
+        self.status_label.setText(f"WARNING: {msg}")
+
     def on_acquisition_error(self, err_msg):
-        self.status_label.setText(f"ERROR: {err_msg}")
+        self.last_error = err_msg
         self.on_acquisition_finished() 
 
-    def update_raw_plot(self, voltage):
-        self.raw_data_buffer = np.roll(self.raw_data_buffer, -1)
-        self.raw_data_buffer[-1] = voltage
-        self.raw_plot_curve.setData(self.raw_data_buffer)
+    def refresh_plots(self):
+        """
+        Drains everything the worker wrote since the last frame and
+        redraws both curves once. Runs on frame_timer.
+        """
+        now = time.perf_counter()
+        if self.last_frame_time is not None:
+            # Count frames we missed because the GUI thread was busy
+            interval = self.frame_timer.interval() / 1000.0
+            late_frames = int((now - self.last_frame_time) / interval) - 1
+            if late_frames > 0:
+                self.dropped_frames += late_frames
+        self.last_frame_time = now
+
+        queue_depth = self.plot_buffer.depth
+        timestamps, raw, filtered = self.plot_buffer.drain()
+        if len(raw):
+            newest = len(self.history)
+            self.history.append(timestamps, raw, filtered)
+            # Nothing on screen changes while the user looks at older data
+            view_box = self.plot_widget.getViewBox()
+            if view_box.autoRangeEnabled()[0] or view_box.viewRange()[0][1] >= newest:
+                self.redraw_plots()
+            if self.spectrum:
+                self.spectrum.write_block(timestamps, raw) # Computed on its own thread
+        if self.spectrum and self.spectrum.version != self.spectrum_version:
+            self.redraw_spectrum()
+
+        self.plot_stats_label.setText(
+            f"Queue depth: {queue_depth} | "
+            f"Dropped frames: {self.dropped_frames} | "
+            f"Dropped samples: {self.plot_buffer.dropped_samples} | "
+            f"History: {len(self.history)} samples "
+            f"({self.history.spilled_bytes / 2**20:.0f} MiB on disk)"
+        )
+
+    def toggle_perf_panel(self, expanded):
+        self.perf_label.setVisible(expanded)
+        if expanded:
+            self.refresh_perf_panel()
+
+    def toggle_spectrum_panel(self, expanded):
+        """Runs the spectrum thread only while the panel is open."""
+        self.spectrum_widget.setVisible(expanded)
+        self.spectrum_label.setVisible(expanded)
+        if expanded and self.spectrum is None:
+            self.spectrum = SpectrumStage(
+                sample_rate=self.config.get("sample_rate"),
+                **self.config.get("spectrum_settings", {})
+            )
+            self.spectrum.start()
+            self.spectrum_version = -1
+            self.spectrum_label.setText("Waiting for data...")
+        elif not expanded and self.spectrum is not None:
+            self.spectrum.close()
+            self.spectrum = None
+
+    def redraw_spectrum(self):
+        """Draws the spectrum thread's newest estimate."""
+        self.spectrum_version = self.spectrum.version
+        latest = self.spectrum.latest()
+        if latest is None:
+            return
+        frequencies, psd, segments, sample_rate = latest
+        psd = psd.reshape(len(frequencies), -1)
+        # Skip DC, which the mean removal leaves at ~0 and log scale can't show
+        for i, curve in enumerate(self.spectrum_curves):
+            curve.setData(frequencies[1:], psd[1:, i])
+        self.spectrum_label.setText(
+            f"{sample_rate:g} samples/s | "
+            f"Resolution: {frequencies[1]:.3g} Hz | "
+            f"Segments averaged: {segments}"
+        )
+
+    def refresh_perf_panel(self):
+        """Shows the worker's per-stage timings. Runs on perf_timer."""
+        if self.acquisition_worker and self.perf_group.isChecked():
+            self.perf_label.setText(self.acquisition_worker.perf_summary())
+
+    def on_view_range_changed(self):
+        # Auto-ranging follows our own setData calls; only react to the user
+        if not self.plot_widget.getViewBox().autoRangeEnabled()[0]:
+            self.redraw_plots()
+
+    def redraw_plots(self):
+        """
+        Draws the visible part of the history, reduced to min/max pairs
+        per horizontal pixel, so the draw cost follows the screen width
+        rather than the history length.
+
+        While the x axis auto-ranges the plot follows the newest
+        plot_window samples; once the user pans or zooms, whatever part of
+        the run is on screen is read back from the history. Ranges of more
+        than summary_factor samples per pixel are drawn from the history's
+        min/max summaries instead of its samples.
+        """
+        count = len(self.history)
+        start, stop = max(0, count - self.plot_window), count
+        view_box = self.plot_widget.getViewBox()
+        if not view_box.autoRangeEnabled()[0]:
+            # Only decimate what is on screen
+            x_min, x_max = view_box.viewRange()[0]
+            start = int(np.clip(np.floor(x_min), 0, count))
+            stop = int(np.clip(np.ceil(x_max) + 1, start, count))
+        n_pixels = max(1, self.plot_widget.width())
+
+        if stop - start > self.history.summary_factor * n_pixels:
+            positions, bins = self.history.summary(start, stop, n_pixels)
+            n = len(bins)
+            # Each bin's min and max, in the order a trace would pass them
+            points = np.empty((2 * n, 2 * self.n_channels))
+            points[0::2] = np.hstack((bins["raw_min"].reshape(n, -1),
+                                      bins["filtered_min"].reshape(n, -1)))
+            points[1::2] = np.hstack((bins["raw_max"].reshape(n, -1),
+                                      bins["filtered_max"].reshape(n, -1)))
+            x = np.repeat(positions, 2)
+            for i, curve in enumerate(self.raw_plot_curves + self.filtered_plot_curves):
+                curve.setData(x, points[:, i])
+            return
 
-    def update_filtered_plot(self, voltage):
-        self.filtered_data_buffer = np.roll(self.filtered_data_buffer, -1)
-        self.filtered_data_buffer[-1] = voltage
-        self.filtered_plot_curve.setData(self.filtered_data_buffer)
+        records = self.history.read(start, stop)
+        # Every raw and filtered channel side by side, decimated in one pass
+        values = np.hstack((records["raw"].reshape(len(records), -1),
+                            records["filtered"].reshape(len(records), -1)))
+        indices = minmax_indices(values, n_pixels)
+        points = np.take_along_axis(values, indices, axis=0)
+        x = start + indices
+        for i, curve in enumerate(self.raw_plot_curves + self.filtered_plot_curves):
+            curve.setData(x[:, i], points[:, i])
 
     def closeEvent(self, event):
         self.stop_acquisition()
         if self.acquisition_thread:
             self.acquisition_thread.wait()
+        self.history.close() # Deletes any spill files
+        if self.spectrum:
+            self.spectrum.close()
         event.accept()
 
     def toggle_pause(self):
@@ -201,11 +443,11 @@ class DacDaqWindow(QMainWindow):
             self.status_label.setText("Acquisition running...")
 
     def clear_plot(self):
-        print("Clearing plot buffers.")
-        self.raw_data_buffer.fill(0)
-        self.filtered_data_buffer.fill(0)
-        self.raw_plot_curve.setData(self.raw_data_buffer)
-        self.filtered_plot_curve.setData(self.filtered_data_buffer)
+        print("Clearing plot history.")
+        self.history.clear()
+        if self.spectrum:
+            self.spectrum.reset()
+        self.redraw_plots()
 
     def log_event(self):
         comment = self.event_entry_box.text()
@@ -0,0 +1,124 @@
+import os
+import numpy as np
+import pyqtgraph as pg
+from PyQt6.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QLabel
+from PyQt6.QtCore import Qt
+from dacdaq.outputs.runs import open_run, read_run_events
+from dacdaq.processing.pyramid import MinMaxPyramid
+
+class RunViewerWindow(QMainWindow):
+    """
+    Browses a recorded run (CSV, .dqrun or a rotated run's manifest)
+    from the whole run down to single samples.
+
+    Each redraw asks the run's MinMaxPyramid for the coarsest level that
+    still gives about two points per pixel of the visible time range, so
+    only that much data is read. Raw data is drawn as its min/max
+    envelope and filtered data as its mean; once zoomed in far enough the
+    samples themselves are drawn. Comments from the run's .events.csv are
+    shown as labelled vertical lines.
+    """
+    def __init__(self, run_path, rebuild=False):
+        super().__init__()
+        self.run_path = run_path
+        self.setWindowTitle(f"DacDAQ - {os.path.basename(run_path.rstrip(os.sep))}")
+        self.setGeometry(100, 100, 1000, 650)
+
+        self.run = open_run(run_path)
+        self.pyramid = MinMaxPyramid.for_run(self.run, rebuild=rebuild)
+        self.channel_labels = self.run.channels
+        n_channels = len(self.channel_labels) if self.channel_labels else 1
+
+        # --- Plot Widget ---
+        pg.setConfigOption("background", "w")
+        pg.setConfigOption("foreground", "k")
+        self.plot_widget = pg.PlotWidget(axisItems={"bottom": pg.DateAxisItem()})
+        self.plot_widget.addLegend()
+        self.plot_widget.setLabel("left", "Voltage (V)")
+        self.plot_widget.showGrid(x=True, y=True, alpha=0.5)
+
+        if self.channel_labels is None:
+            self.raw_plot_curves = [self.plot_widget.plot(
+                pen=pg.mkPen('k', width=1, style=Qt.PenStyle.DotLine),
+                name="Raw Data"
+            )]
+            self.filtered_plot_curves = [self.plot_widget.plot(
+                pen=pg.mkPen('r', width=2),
+                name="Filtered Data"
+            )]
+        else:
+            self.raw_plot_curves = []
+            self.filtered_plot_curves = []
+            for i, label in enumerate(self.channel_labels):
+                color = pg.intColor(i, hues=max(n_channels, 2))
+                self.raw_plot_curves.append(self.plot_widget.plot(
+                    pen=pg.mkPen(color, width=1, style=Qt.PenStyle.DotLine),
+                    name=f"{label} (raw)"
+                ))
+                self.filtered_plot_curves.append(self.plot_widget.plot(
+                    pen=pg.mkPen(color, width=2), name=label
+                ))
+        self.n_channels = n_channels
+        self.add_event_markers()
+        self.plot_widget.getViewBox().sigXRangeChanged.connect(self.redraw_plots)
+
+        # --- Main Layout ---
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        main_layout = QVBoxLayout(central_widget)
+        main_layout.addWidget(self.plot_widget)
+        self.status_label = QLabel()
+        main_layout.addWidget(self.status_label)
+
+        self.show_whole_run()
+
+    def add_event_markers(self):
+        """Draws each comment of the run's event log as a labelled line."""
+        events = read_run_events(self.run.source_path)
+        if events is None:
+            return
+        timestamps, comments = events
+        for timestamp, comment in zip(timestamps, comments):
+            self.plot_widget.addItem(pg.InfiniteLine(
+                pos=timestamp / 1e9, angle=90, movable=False,
+                pen=pg.mkPen((0, 100, 200), width=1, style=Qt.PenStyle.DashLine),
+                label=comment, labelOpts={"position": 0.95, "color": (0, 100, 200)}
+            ))
+
+    def show_whole_run(self):
+        if len(self.run) == 0:
+            self.status_label.setText("This run has no samples.")
+            return
+        first = self.run.read(0, 1)["timestamp"][0]
+        last = self.run.read(len(self.run) - 1)["timestamp"][0]
+        self.plot_widget.setXRange(first / 1e9, last / 1e9, padding=0.02)
+        self.redraw_plots()
+
+    def redraw_plots(self):
+        """Draws the visible time range from the matching pyramid level."""
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        n_pixels = max(1, self.plot_widget.width())
+        level, records = self.pyramid.query(int(x_min * 1e9), int(x_max * 1e9), 2 * n_pixels)
+        n = len(records)
+        times = records["timestamp"] / 1e9
+
+        if level == 0:
+            raw = records["raw"].reshape(n, -1)
+            filtered = records["filtered"].reshape(n, -1)
+            raw_x = times
+        else:
+            # Each bin's min and max, in the order a trace would pass them
+            lo = records["raw_min"].reshape(n, -1)
+            hi = records["raw_max"].reshape(n, -1)
+            raw = np.empty((2 * n, self.n_channels))
+            raw[0::2], raw[1::2] = lo, hi
+            raw_x = np.repeat(times, 2)
+            filtered = records["filtered_mean"].reshape(n, -1)
+        for i in range(self.n_channels):
+            self.raw_plot_curves[i].setData(raw_x, raw[:, i])
+            self.filtered_plot_curves[i].setData(times, filtered[:, i])
+
+        detail = "samples" if level == 0 else f"level {level} ({self.pyramid.factor ** level} samples/bin)"
+        self.status_label.setText(
+            f"{len(self.run)} samples | Showing {n} points at {detail}"
+        )